@@ -24,6 +24,7 @@ const STATUS_ACTIONS = {
 export default function Requests() {
     const { user } = useAuth()
     const [requests, setRequests] = useState([])
+    const [shard, setShard] = useState(null)
     const [loading, setLoading] = useState(true)
     const [filter, setFilter] = useState('new')
     const [selectedRequest, setSelectedRequest] = useState(null)
@@ -38,6 +39,7 @@ export default function Requests() {
             const params = filter !== 'all' ? { status: filter } : {}
             const response = await api.get('/requests', { params })
             setRequests(response.data.items || [])
+            setShard(response.data.shard)
         } catch (err) {
             console.error(err)
         } finally {
@@ -62,7 +64,7 @@ export default function Requests() {
     const handleCancel = async (requestId) => {
         if (!confirm('Отменить заявку?')) return
         try {
-            await api.post(`/superadmin/requests/${requestId}/cancel`)
+            await api.post(`/superadmin/requests/${requestId}/cancel`, null, { params: { shard } })
             setSelectedRequest(null)
             loadRequests()
         } catch (err) {
@@ -64,7 +64,7 @@ export default function Houses() {
         e.preventDefault()
         try {
             if (editingHouse) {
-                await api.patch(`/superadmin/houses/${editingHouse.id}`, formData)
+                await api.patch(`/superadmin/houses/${editingHouse.id}`, formData, { params: { shard: editingHouse.shard } })
             } else {
                 await api.post('/superadmin/houses', formData)
             }
@@ -77,10 +77,10 @@ export default function Houses() {
         }
     }
 
-    const handleDelete = async (id) => {
+    const handleDelete = async (house) => {
         if (!window.confirm('Вы уверены? Это удалит дом и отвяжет жильцов!')) return
         try {
-            await api.delete(`/superadmin/houses/${id}`)
+            await api.delete(`/superadmin/houses/${house.id}`, { params: { shard: house.shard } })
             fetchHouses()
         } catch (error) {
             console.error('Failed to delete house:', error)
@@ -184,7 +184,7 @@ export default function Houses() {
                     </thead>
                     <tbody>
                         {filteredHouses.map(house => (
-                            <tr key={house.id}>
+                            <tr key={`${house.shard}:${house.id}`}>
                                 <td className="text-muted">#{house.id}</td>
                                 <td>
                                     <div style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
@@ -218,7 +218,7 @@ export default function Houses() {
                                         </button>
                                         <button
                                             className="btn btn-danger btn-icon"
-                                            onClick={() => handleDelete(house.id)}
+                                            onClick={() => handleDelete(house)}
                                             title="Удалить"
                                         >
                                             <Trash2 size={16} />
@@ -74,7 +74,7 @@ export default function Users() {
                 apartment: formData.apartment || null
             }
 
-            await api.patch(`/superadmin/users/${editingUser.id}`, payload)
+            await api.patch(`/superadmin/users/${editingUser.id}`, payload, { params: { shard: editingUser.shard } })
             fetchData()
             closeModal()
         } catch (error) {
@@ -84,10 +84,10 @@ export default function Users() {
         }
     }
 
-    const handleDelete = async (id) => {
+    const handleDelete = async (user) => {
         if (!window.confirm('Вы уверены? Пользователь будет удален безвозвратно!')) return
         try {
-            await api.delete(`/superadmin/users/${id}`)
+            await api.delete(`/superadmin/users/${user.id}`, { params: { shard: user.shard } })
             fetchData()
         } catch (error) {
             console.error('Failed to delete user:', error)
@@ -183,7 +183,7 @@ export default function Users() {
                     </thead>
                     <tbody>
                         {filteredUsers.map(user => (
-                            <tr key={user.id}>
+                            <tr key={`${user.shard}:${user.id}`}>
                                 <td>
                                     <div style={{ display: 'flex', alignItems: 'center', gap: 12 }}>
                                         <div style={{
@@ -243,7 +243,7 @@ export default function Users() {
                                         </button>
                                         <button
                                             className="btn btn-danger btn-icon"
-                                            onClick={() => handleDelete(user.id)}
+                                            onClick={() => handleDelete(user)}
                                             title="Удалить"
                                         >
                                             <Trash2 size={16} />
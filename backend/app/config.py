@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict
 import os
 
 
@@ -10,9 +11,70 @@ class Settings(BaseSettings):
         "DATABASE_URL", 
         "sqlite+aiosqlite:///./uk_requests.db"
     ).replace("postgres://", "postgresql+asyncpg://").replace("postgresql://", "postgresql+asyncpg://")
+    # Дополнительные шарды (app/database.py): имя -> URL БД; DATABASE_URL - шард "default".
+    # Размещение УК на шардах - таблица company_shards в шарде default.
+    shards: Dict[str, str] = {}
     
     # Telegram
     telegram_bot_token: str = ""
+    telegram_api_url: str = "https://api.telegram.org"
+    telegram_global_rate: float = 25.0  # сообщений в секунду на бота (лимит Telegram ~30)
+    telegram_chat_rate: float = 1.0     # сообщений в секунду в один чат
+    # Сколько процессов отправляют сообщения этого бота: global_rate делится между ними
+    # (gunicorn.conf.py задаёт число воркеров, если воркер фоновых задач встроен в API)
+    telegram_senders: int = 1
+    notify_coalesce_seconds: int = 15   # переходы статуса за это время - одно уведомление
+    
+    # Массовые аварии (app/utils/incidents.py)
+    incident_window_minutes: int = 120   # заявка присоединяется к инциденту с заявками не старше этого
+    incident_min_similarity: float = 0.5  # доля общих слов в заголовках
+    
+    # SLA-эскалации (app/utils/sla.py): таймеры в памяти API-процесса
+    sla_enabled: bool = True
+    
+    # Idempotency-Key (app/utils/idempotency.py): "memory" - LRU в процессе, "db" - общий для всех процессов
+    idempotency_backend: str = "memory"
+    idempotency_ttl_seconds: int = 86400
+    idempotency_max_keys: int = 100000  # размер LRU для backend=memory
+    
+    # Лимиты запросов (app/utils/rate_limit.py), скользящее окно.
+    # Ключ - "МЕТОД /префикс" или "/префикс", значение - "область:число/период; ...",
+    # область: ip, user (telegram_id), company (УК сотрудника); действует самое точное правило.
+    # rate_limit_backend: "memory" - счётчики в каждом процессе, "redis" - общие (redis_url, пакет redis);
+    # "redis" включает и второй уровень кэша ответов справочников (app/utils/cache.py)
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    # Прокси, которым верим X-Forwarded-For ("*" - любому, иначе IP/подсети через запятую).
+    # За прокси PaaS (Railway и т.п.) без этого все клиенты имеют один IP прокси
+    forwarded_allow_ips: str = "127.0.0.1"
+    rate_limits: Dict[str, str] = {
+        "POST /api/auth/telegram": "ip:30/minute",
+        "POST /api/auth/admin-login": "ip:10/minute",
+        "GET /api/houses": "ip:120/minute",
+        "/api": "user:600/minute; company:6000/minute; ip:1200/minute",
+    }
+    
+    # SQLite (app/utils/sqlite.py): WAL, одна пишущая connection на процесс и пул читающих.
+    # sqlite_read_connections = 0 - без WAL и пулов, как раньше
+    sqlite_read_connections: int = 4
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size_kb: int = 65536
+    sqlite_mmap_size_mb: int = 256
+    sqlite_busy_timeout_ms: int = 30000
+    
+    # Кэш ответов справочников (app/utils/cache.py)
+    cache_ttl_seconds: int = 300
+    cache_max_entries: int = 10000
+    
+    # Инвалидация кэшей между процессами (app/utils/invalidation.py): "memory" - один процесс,
+    # "db" - события через таблицу cache_events, для нескольких воркеров gunicorn или контейнеров
+    invalidation_backend: str = "memory"
+    invalidation_poll_seconds: float = 1.0
+    
+    # Схлопывание одинаковых одновременных чтений (app/utils/coalesce.py)
+    coalesce_enabled: bool = True
+    coalesce_max_wait_seconds: float = 2.0
     
     # JWT
     jwt_secret_key: str = "super-secret-key-change-me"
@@ -22,6 +84,15 @@ class Settings(BaseSettings):
     # App
     app_url: str = "http://localhost:3000"
     debug: bool = True
+    migrate_on_startup: bool = True  # create_all и миграции в lifespan; gunicorn.conf.py делает их в мастере
+    
+    # Background jobs (app/worker)
+    worker_embedded: bool = True  # запускать воркер внутри API-процесса
+    worker_concurrency: int = 10  # одновременно выполняемых задач на процесс
+    worker_poll_interval: float = 1.0
+    rollup_interval_seconds: int = 60  # 0 = не обновлять сводки
+    archive_after_days: int = 180  # закрытые заявки старше - в архив; 0 = не архивировать
+    history_partitions_ahead: int = 3  # PostgreSQL: на сколько месяцев вперёд создавать секции request_history
     
     class Config:
         env_file = ".env"
@@ -1,39 +1,236 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException, Query, Request, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.config import settings
+from app.utils.sqlite import apply_pragmas, is_file_database, routing_session_class
+
+# Шард с БД из DATABASE_URL: в нём таблица размещения company_shards и все УК без явного размещения
+DEFAULT_SHARD = "default"
+
+T = TypeVar("T")
+
+
+def _async_url(url: str) -> str:
+    # Ensure we use asyncpg driver for PostgreSQL
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://") and "+asyncpg" not in url:
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def _create_engine(url: str) -> Tuple[AsyncEngine, Optional[AsyncEngine]]:
+    """Движок шарда и, для SQLite в файле, отдельный движок читателей (app/utils/sqlite.py)"""
+    url = _async_url(url)
+    if not (is_file_database(url) and settings.sqlite_read_connections > 0):
+        shard_engine = create_async_engine(
+            url,
+            echo=settings.debug,
+            future=True
+        )
+        if shard_engine.dialect.name == "sqlite":
+            # SQLite не проверяет внешние ключи (и не выполняет ON DELETE) без этой настройки
+            apply_pragmas(shard_engine.sync_engine)
+        return shard_engine, None
+
+    writer = create_async_engine(url, echo=settings.debug, pool_size=1, max_overflow=0, pool_timeout=60)
+    reader = create_async_engine(
+        url, echo=settings.debug, pool_size=settings.sqlite_read_connections, max_overflow=0, pool_timeout=60
+    )
+    apply_pragmas(writer.sync_engine, wal=True)
+    apply_pragmas(reader.sync_engine, read_only=True, wal=True)
+    return writer, reader
+
+
+def _sessionmaker(shard_engine: AsyncEngine, shard: str, reader: Optional[AsyncEngine] = None) -> async_sessionmaker:
+    options = {"sync_session_class": routing_session_class(reader.sync_engine)} if reader else {}
+    return async_sessionmaker(
+        shard_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+        # db.info["shard"] - для ключей кэшей в памяти: id домов и пользователей в разных шардах совпадают
+        info={"shard": shard},
+        **options
+    )
+
+
+class ShardRouter:
+    """
+    Маршрутизация по УК: company_id -> шард (отдельная БД).
+    Шарды задаются в settings.shards (имя -> URL), размещение УК - таблица
+    company_shards в шарде default; УК без строки там живут в default.
+    Размещение читается в память при старте (load_placements) и меняется через place().
+    """
+
+    def __init__(self, default_url: str, extra: Dict[str, str]):
+        # engines - основной (для SQLite - пишущий) движок шарда, readers - читатели SQLite
+        self.engines: Dict[str, AsyncEngine] = {}
+        self.readers: Dict[str, AsyncEngine] = {}
+        urls = {DEFAULT_SHARD: default_url, **{name: url for name, url in extra.items() if name != DEFAULT_SHARD}}
+        for name, url in urls.items():
+            self.engines[name], reader = _create_engine(url)
+            if reader:
+                self.readers[name] = reader
+        self.sessionmakers = {
+            name: _sessionmaker(e, name, self.readers.get(name)) for name, e in self.engines.items()
+        }
+        self.placements: Dict[int, str] = {}
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.engines)
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.engines) > 1
+
+    def session(self, shard: str = DEFAULT_SHARD) -> AsyncSession:
+        return self.sessionmakers[shard]()
+
+    def shard_for_company(self, company_id: Optional[int]) -> str:
+        shard = self.placements.get(company_id, DEFAULT_SHARD) if company_id else DEFAULT_SHARD
+        # Размещение на шард, которого нет в настройках, не должно ронять запросы УК
+        return shard if shard in self.engines else DEFAULT_SHARD
+
+    async def load_placements(self):
+        async with self.engines[DEFAULT_SHARD].connect() as conn:
+            result = await conn.execute(text("SELECT company_id, shard FROM company_shards"))
+            self.placements = {company_id: shard for company_id, shard in result.all()}
+
+    async def place(self, company_id: int, shard: str):
+        """Разместить УК на шарде (запись в company_shards шарда default)"""
+        if shard not in self.engines:
+            raise ValueError(f"unknown shard: {shard}")
+        async with self.session() as db:
+            await db.execute(
+                text("INSERT INTO company_shards (company_id, shard) VALUES (:company_id, :shard)"),
+                {"company_id": company_id, "shard": shard},
+            )
+            await db.commit()
+        self.placements[company_id] = shard
+
+    async def forget(self, company_id: int):
+        """Убрать размещение удалённой УК и её строку-справочник в шарде default"""
+        async with self.session() as db:
+            await db.execute(text("DELETE FROM company_shards WHERE company_id = :id"), {"id": company_id})
+            await db.execute(text("DELETE FROM companies WHERE id = :id"), {"id": company_id})
+            await db.commit()
+        self.placements.pop(company_id, None)
 
-# Ensure we use asyncpg driver for PostgreSQL
-db_url = settings.database_url
-if db_url.startswith("postgres://"):
-    db_url = db_url.replace("postgres://", "postgresql+asyncpg://", 1)
-elif db_url.startswith("postgresql://") and "+asyncpg" not in db_url:
-    db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
-
-engine = create_async_engine(
-    db_url,
-    echo=settings.debug,
-    future=True
-)
-
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False
-)
+    async def fan_out(self, fn: Callable[[AsyncSession], Awaitable[T]]) -> List[Tuple[str, T]]:
+        """Выполнить fn(сессия) на всех шардах одновременно; [(шард, результат)] в порядке names"""
+        async def run(shard: str):
+            async with self.session(shard) as db:
+                return await fn(db)
+
+        results = await asyncio.gather(*(run(shard) for shard in self.names))
+        return list(zip(self.names, results))
+
+    async def shard_for_user(self, telegram_id: int) -> str:
+        """Шард, где хранится пользователь (вход по Telegram ID, пока токена нет)"""
+        if not self.sharded:
+            return DEFAULT_SHARD
+
+        async def find(db: AsyncSession):
+            result = await db.execute(
+                text("SELECT 1 FROM users WHERE telegram_id = :telegram_id"), {"telegram_id": telegram_id}
+            )
+            return result.first() is not None
+
+        found = [shard for shard, exists in await self.fan_out(find) if exists]
+        return found[0] if found else DEFAULT_SHARD
+
+    async def dispose(self):
+        await asyncio.gather(*(e.dispose() for e in [*self.engines.values(), *self.readers.values()]))
+
+
+shards = ShardRouter(settings.database_url, settings.shards)
+
+# Шард default; модули, которым не нужна маршрутизация (миграции, воркер по умолчанию), работают с ним
+engine = shards.engines[DEFAULT_SHARD]
+AsyncSessionLocal = shards.sessionmakers[DEFAULT_SHARD]
 
 Base = declarative_base()
 
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
+def request_shard(request: Request) -> str:
+    """Шард запроса по claim tenant_id токена (УК сотрудника или УК дома жильца)"""
+    if not shards.sharded:
+        return DEFAULT_SHARD
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return DEFAULT_SHARD
+    from app.utils.auth import decode_access_token
+    payload = decode_access_token(token) or {}
+    return shards.shard_for_company(payload.get("tenant_id"))
+
+
+def _track(request: Request, session: AsyncSession) -> AsyncSession:
+    """Запомнить сессию запроса для end_request_transactions"""
+    if not hasattr(request.state, "db_sessions"):
+        request.state.db_sessions = []
+    request.state.db_sessions.append(session)
+    return session
+
+
+async def end_request_transactions(request: Request):
+    """
+    Откатить незавершённые транзакции сессий запроса. Сессии зависимостей
+    закрываются только после отправки ответа, а на SQLite незакоммиченная
+    запись держит единственную пишущую connection (app/utils/sqlite.py):
+    код, который пишет своей сессией после обработчика, вызывает это до записи.
+    """
+    for session in getattr(request.state, "db_sessions", ()):
+        if session.in_transaction():
+            await session.rollback()
+
+
+async def get_db(request: Request):
+    async with shards.session(request_shard(request)) as session:
         try:
-            yield session
+            yield _track(request, session)
         finally:
             await session.close()
 
 
+async def get_company_db(company_id: int, request: Request):
+    """Сессия шарда УК из пути запроса (операции суперадмина над конкретной УК)"""
+    async with shards.session(shards.shard_for_company(company_id)) as session:
+        yield _track(request, session)
+
+
+def resolve_shard(shard: Optional[str]) -> str:
+    """
+    Шард записи из параметра ?shard= (поле shard в списках суперадмина).
+    id домов, пользователей и заявок в разных шардах совпадают, поэтому
+    при нескольких шардах без него запись не определить.
+    """
+    if shard is None:
+        if shards.sharded:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="id записей в разных шардах совпадают: укажите шард (?shard=)"
+            )
+        return DEFAULT_SHARD
+    if shard not in shards.names:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Неизвестный шард: {shard}")
+    return shard
+
+
+async def get_shard_db(request: Request, shard: Optional[str] = Query(None, description="Шард записи (поле shard в списках)")):
+    """Сессия шарда из ?shard= (операции суперадмина над записью по id)"""
+    async with shards.session(resolve_shard(shard)) as session:
+        yield _track(request, session)
+
+
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    for shard_engine in shards.engines.values():
+        async with shard_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    await shards.load_placements()
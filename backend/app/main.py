@@ -1,21 +1,60 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.config import settings
-from app.database import init_db, AsyncSessionLocal
-from app.routers import auth, companies, houses, requests, superadmin
+from app.database import shards, AsyncSessionLocal
+from app.routers import auth, broadcasts, companies, houses, incidents, requests, sla, stats, superadmin
 from app.models import Company, House, User, UserRole
-from app.utils.migration import run_auto_migration
+from app.utils.migration import ensure_schema
+from app.utils.address_index import load_address_index
+from app.worker.runner import Worker
+from app.utils.telegram import notifier
+from app.utils.sla import sla_scheduler
+from app.utils.rate_limit import RateLimitMiddleware
+from app.utils.invalidation import bus
+
+
+async def warm_up():
+    """
+    Кэши процесса, которые читают из БД всё целиком: после старта, не задерживая
+    приём запросов. Пока индекс адресов строится, подсказки идут запросом к БД.
+    """
+    try:
+        await load_address_index()
+    except Exception as e:
+        print(f"ADDRESS INDEX: load failed, suggestions use the database: {e}")
+    if settings.sla_enabled:
+        sla_scheduler.start()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: создаем таблицы и накатываем миграции
-    await init_db()
-    await run_auto_migration()
+    # Startup: создаем таблицы и накатываем миграции, если версия схемы в БД устарела
+    # (под gunicorn - один раз в мастере, см. gunicorn.conf.py)
+    if settings.migrate_on_startup:
+        await ensure_schema()
+    else:
+        await shards.load_placements()
+    await bus.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    
+    # Встроенный воркер фоновых задач (отключается, если запущен python -m app.worker)
+    workers, worker_tasks = [], []
+    if settings.worker_embedded:
+        workers = [Worker(shard=shard) for shard in shards.names]
+        worker_tasks = [asyncio.create_task(worker.run()) for worker in workers]
+    
     yield
     # Shutdown
+    warm_up_task.cancel()
+    await sla_scheduler.stop()
+    await bus.stop()
+    for worker in workers:
+        worker.stop()
+    await asyncio.gather(*worker_tasks)
+    await notifier.close()
 
 
 app = FastAPI(
@@ -25,6 +64,16 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Лимиты запросов: до маршрутизации и открытия сессии БД
+if settings.rate_limit_enabled:
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=settings.rate_limits,
+        backend=settings.rate_limit_backend,
+        redis_url=settings.redis_url,
+        forwarded_allow_ips=settings.forwarded_allow_ips,
+    )
+
 # CORS для фронтенда - разрешаем все origins для упрощения
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +81,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Новый токен после смены дома (PATCH /api/auth/me)
+    expose_headers=["X-Access-Token"],
 )
 
 # Подключаем роутеры
@@ -39,6 +90,10 @@ app.include_router(auth.router, prefix="/api")
 app.include_router(companies.router, prefix="/api")
 app.include_router(houses.router, prefix="/api")
 app.include_router(requests.router, prefix="/api")
+app.include_router(incidents.router, prefix="/api")
+app.include_router(stats.router, prefix="/api")
+app.include_router(sla.router, prefix="/api")
+app.include_router(broadcasts.router, prefix="/api")
 app.include_router(superadmin.router, prefix="/api")
 
 
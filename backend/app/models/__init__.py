@@ -2,6 +2,16 @@ from app.models.user import User, UserRole
 from app.models.company import Company
 from app.models.house import House
 from app.models.request import Request, RequestStatus, RequestCategory, RequestHistory
+from app.models.incident import Incident
+from app.models.archive import ArchivedRequest, ArchivedRequestHistory
+from app.models.sla import SlaPolicy
+from app.models.job import Job, JobStatus
+from app.models.broadcast import Broadcast, BroadcastStatus, BroadcastDelivery
+from app.models.idempotency import IdempotencyKey
+from app.models.shard import CompanyShard
+from app.models.cache_event import CacheEvent
+from app.models.schema_version import SchemaVersion
+from app.models.rollup import RequestRollupHourly, RequestRollupDaily, RollupWatermark
 
 __all__ = [
     "User",
@@ -12,4 +22,20 @@ __all__ = [
     "RequestStatus",
     "RequestCategory",
     "RequestHistory",
+    "ArchivedRequest",
+    "ArchivedRequestHistory",
+    "Incident",
+    "SlaPolicy",
+    "RequestRollupHourly",
+    "RequestRollupDaily",
+    "RollupWatermark",
+    "Job",
+    "JobStatus",
+    "Broadcast",
+    "BroadcastStatus",
+    "BroadcastDelivery",
+    "IdempotencyKey",
+    "CompanyShard",
+    "CacheEvent",
+    "SchemaVersion",
 ]
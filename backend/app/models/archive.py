@@ -0,0 +1,64 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Index, func
+from sqlalchemy.orm import relationship
+from app.database import Base
+from app.models.request import RequestStatus, RequestCategory
+
+
+class ArchivedRequest(Base):
+    """
+    Закрытая заявка, перенесённая из requests (app/utils/archive.py).
+    Колонки повторяют Request: перенос идёт INSERT ... SELECT по именам колонок requests.
+    """
+    __tablename__ = "requests_archive"
+    __table_args__ = (
+        Index("ix_requests_archive_user", "user_id"),
+        Index("ix_requests_archive_company_created", "company_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="SET NULL"), nullable=True)
+    house_id = Column(Integer, nullable=True)
+    assignee_id = Column(Integer, nullable=True)
+    
+    category = Column(Enum(RequestCategory), nullable=False)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    
+    status = Column(Enum(RequestStatus), nullable=False)
+    status_changed_at = Column(DateTime(timezone=True), nullable=True)
+    priority = Column(Integer, default=0, nullable=False)
+    escalated_at = Column(DateTime(timezone=True), nullable=True)
+    incident_id = Column(Integer, nullable=True)
+    
+    is_paid = Column(Integer, default=0)
+    payment_status = Column(String(50), nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    user = relationship("User")
+    history = relationship("ArchivedRequestHistory", passive_deletes=True, order_by="ArchivedRequestHistory.created_at")
+    
+    def __repr__(self):
+        return f"<ArchivedRequest(id={self.id}, status={self.status}, category={self.category})>"
+
+
+class ArchivedRequestHistory(Base):
+    """История архивной заявки (колонки повторяют RequestHistory)"""
+    __tablename__ = "request_history_archive"
+    
+    id = Column(Integer, primary_key=True)
+    request_id = Column(Integer, ForeignKey("requests_archive.id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    old_status = Column(Enum(RequestStatus), nullable=True)
+    new_status = Column(Enum(RequestStatus), nullable=False)
+    comment = Column(Text, nullable=True)
+    changed_by = Column(Integer, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<ArchivedRequestHistory(request_id={self.request_id}, {self.old_status} -> {self.new_status})>"
@@ -0,0 +1,41 @@
+import enum
+from sqlalchemy import Column, Integer, BigInteger, Boolean, Text, DateTime, ForeignKey, Enum, func
+from app.database import Base
+
+
+class BroadcastStatus(str, enum.Enum):
+    """Статусы рассылки"""
+    PENDING = "pending"    # Ожидает разбиения на пачки
+    SENDING = "sending"    # Пачки отправляются
+    DONE = "done"          # Все сообщения обработаны
+
+
+class Broadcast(Base):
+    """Рассылка сообщения жильцам дома или всей УК"""
+    __tablename__ = "broadcasts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False, index=True)
+    house_id = Column(Integer, ForeignKey("houses.id", ondelete="CASCADE"), nullable=True)  # None = вся УК
+    text = Column(Text, nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    
+    status = Column(Enum(BroadcastStatus), default=BroadcastStatus.PENDING, nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    sent = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<Broadcast(id={self.id}, status={self.status}, sent={self.sent}/{self.total})>"
+
+
+class BroadcastDelivery(Base):
+    """Получатель рассылки, которому отправка уже выполнена: повтор пачки его пропускает"""
+    __tablename__ = "broadcast_deliveries"
+    
+    broadcast_id = Column(Integer, ForeignKey("broadcasts.id", ondelete="CASCADE"), primary_key=True)
+    chat_id = Column(BigInteger, primary_key=True)
+    delivered = Column(Boolean, nullable=False)  # False - Bot API отказал (бот заблокирован и т.п.)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, func
+from app.database import Base
+
+
+class CacheEvent(Base):
+    """Событие инвалидации кэша для других процессов API (см. app/utils/invalidation.py)"""
+    __tablename__ = "cache_events"
+    
+    id = Column(Integer, primary_key=True)
+    origin = Column(String(255), nullable=False)  # процесс-отправитель, свои события он пропускает
+    channel = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    
+    def __repr__(self):
+        return f"<CacheEvent(id={self.id}, channel='{self.channel}')>"
@@ -17,7 +17,8 @@ class Company(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    houses = relationship("House", back_populates="company", cascade="all, delete-orphan")
+    # passive_deletes: дома и их зависимые строки удаляет БД (ON DELETE), без загрузки в сессию
+    houses = relationship("House", back_populates="company", cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<Company(id={self.id}, name='{self.name}')>"
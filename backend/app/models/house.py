@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -6,6 +6,10 @@ from app.database import Base
 class House(Base):
     """Дом, обслуживаемый УК"""
     __tablename__ = "houses"
+    __table_args__ = (
+        # Ключ для upsert при массовом импорте; он же индекс для выборки домов УК по company_id
+        UniqueConstraint("company_id", "address", name="uq_houses_company_address"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
@@ -15,7 +19,7 @@ class House(Base):
     
     # Relationships
     company = relationship("Company", back_populates="houses")
-    residents = relationship("User", back_populates="house")
+    residents = relationship("User", back_populates="house", passive_deletes=True)
     
     def __repr__(self):
         return f"<House(id={self.id}, address='{self.address}')>"
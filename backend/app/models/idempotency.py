@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, func
+from app.database import Base
+
+
+class IdempotencyKey(Base):
+    """Сохранённый ответ на запрос с заголовком Idempotency-Key (см. app/utils/idempotency.py)"""
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String(64), primary_key=True)  # sha256(токен, метод, путь, ключ клиента)
+    fingerprint = Column(String(64), nullable=False)  # sha256 тела запроса
+    
+    # status_code = NULL - запрос ещё выполняется
+    status_code = Column(Integer, nullable=True)
+    content_type = Column(String(255), nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<IdempotencyKey(key={self.key[:12]}, status_code={self.status_code})>"
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index, func
+from sqlalchemy.orm import relationship
+from app.database import Base
+from app.models.request import RequestStatus, RequestCategory
+
+
+class Incident(Base):
+    """Массовая авария: похожие заявки жильцов одного дома (см. app/utils/incidents.py)"""
+    __tablename__ = "incidents"
+    __table_args__ = (
+        # Поиск открытого инцидента для новой заявки: дом + категория + окно по времени
+        Index("ix_incidents_cluster", "house_id", "category", "last_request_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    house_id = Column(Integer, ForeignKey("houses.id", ondelete="CASCADE"), nullable=False)
+    category = Column(Enum(RequestCategory), nullable=False)
+    title = Column(String(255), nullable=False)  # заголовок первой заявки
+    
+    status = Column(Enum(RequestStatus), default=RequestStatus.NEW, nullable=False)
+    request_count = Column(Integer, default=1, nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_request_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Relationships
+    house = relationship("House")
+    requests = relationship("Request", back_populates="incident", passive_deletes=True, order_by="Request.id")
+    
+    def __repr__(self):
+        return f"<Incident(id={self.id}, house_id={self.house_id}, category={self.category}, requests={self.request_count})>"
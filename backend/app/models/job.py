@@ -0,0 +1,41 @@
+import enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, JSON, Index, func
+from app.database import Base
+
+
+class JobStatus(str, enum.Enum):
+    """Статусы фоновой задачи"""
+    PENDING = "pending"    # Ожидает выполнения
+    RUNNING = "running"    # Выполняется воркером
+    DONE = "done"          # Выполнена
+    FAILED = "failed"      # Исчерпаны попытки
+
+
+class Job(Base):
+    """Фоновая задача в очереди (см. app/worker)"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    
+    status = Column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    run_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    locked_by = Column(String(255), nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    
+    # Защита от повторной постановки (например, периодических задач несколькими воркерами)
+    dedupe_key = Column(String(255), unique=True, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<Job(id={self.id}, type={self.type}, status={self.status})>"
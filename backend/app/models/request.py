@@ -1,5 +1,6 @@
 import enum
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, func
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Index, func, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -28,6 +29,10 @@ class RequestCategory(str, enum.Enum):
     OTHER = "other"              # Другое
 
 
+# Частичный индекс очереди диспетчеров: свободные новые заявки УК по приоритету и времени создания
+CLAIM_INDEX_WHERE = "assignee_id IS NULL AND status = 'NEW'"
+
+
 # FSM: допустимые переходы статусов
 STATUS_TRANSITIONS = {
     RequestStatus.NEW: [RequestStatus.ACCEPTED, RequestStatus.REJECTED, RequestStatus.CANCELLED],
@@ -44,15 +49,35 @@ STATUS_TRANSITIONS = {
 class Request(Base):
     """Заявка от жильца"""
     __tablename__ = "requests"
+    __table_args__ = (
+        # Список заявок жильца и заявок УК (user_id IN жильцы домов УК), новые сначала
+        Index("ix_requests_user_created", "user_id", "created_at"),
+        # Фильтр по статусу без ограничения по УК (суперадмин, статистика)
+        Index("ix_requests_status_created", "status", "created_at"),
+        # Сортировка и выборка по периоду (список суперадмина, выгрузка, аналитика)
+        Index("ix_requests_created", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     
+    # УК и дом жильца на момент создания (жилец может переехать) и назначенный диспетчер
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="SET NULL"), nullable=True)
+    house_id = Column(Integer, ForeignKey("houses.id", ondelete="SET NULL"), nullable=True)
+    assignee_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    
     category = Column(Enum(RequestCategory), nullable=False)
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     
     status = Column(Enum(RequestStatus), default=RequestStatus.NEW, nullable=False)
+    status_changed_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # SLA (app/utils/sla.py): эскалация повышает приоритет, сбрасывается сменой статуса
+    priority = Column(Integer, default=0, server_default="0", nullable=False)
+    escalated_at = Column(DateTime(timezone=True), nullable=True)
+    
+    incident_id = Column(Integer, ForeignKey("incidents.id", ondelete="SET NULL"), nullable=True, index=True)
     
     # Для платных услуг (заглушка)
     is_paid = Column(Integer, default=0)  # 0 = бесплатно, >0 = цена в копейках
@@ -62,20 +87,42 @@ class Request(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    user = relationship("User", back_populates="requests")
-    history = relationship("RequestHistory", back_populates="request", cascade="all, delete-orphan", order_by="RequestHistory.created_at")
+    user = relationship("User", back_populates="requests", foreign_keys=[user_id])
+    history = relationship("RequestHistory", back_populates="request", cascade="all, delete-orphan", passive_deletes=True, order_by="RequestHistory.created_at")
+    incident = relationship("Incident", back_populates="requests")
     
     def can_transition_to(self, new_status: RequestStatus) -> bool:
         """Проверка допустимости перехода в новый статус"""
         return new_status in STATUS_TRANSITIONS.get(self.status, [])
     
+    def set_status(self, new_status: RequestStatus):
+        """Сменить статус (без проверки FSM), перезапуская отсчёт SLA"""
+        self.status = new_status
+        self.status_changed_at = datetime.now(timezone.utc)
+        self.escalated_at = None
+    
     def __repr__(self):
         return f"<Request(id={self.id}, status={self.status}, category={self.category})>"
 
 
+Index(
+    "ix_requests_queue", Request.company_id, Request.priority.desc(), Request.created_at,
+    postgresql_where=text(CLAIM_INDEX_WHERE),
+    sqlite_where=text(CLAIM_INDEX_WHERE),
+)
+
+
 class RequestHistory(Base):
-    """История изменений заявки"""
+    """
+    История изменений заявки.
+    В PostgreSQL таблица секционирована по месяцам created_at (см. utils/migration.py),
+    первичный ключ там - (id, created_at).
+    """
     __tablename__ = "request_history"
+    __table_args__ = (
+        # selectinload(Request.history): WHERE request_id IN (...) ORDER BY created_at
+        Index("ix_request_history_request", "request_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     request_id = Column(Integer, ForeignKey("requests.id", ondelete="CASCADE"), nullable=False)
@@ -85,7 +132,7 @@ class RequestHistory(Base):
     comment = Column(Text, nullable=True)
     changed_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
     request = relationship("Request", back_populates="history")
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Index
+from app.database import Base
+from app.models.request import RequestStatus, RequestCategory
+
+
+class _RequestRollupMixin:
+    """
+    Количество переходов в статус за интервал времени (bucket).
+    Заполняется фоновой задачей из request_history, см. app/utils/rollups.py.
+    Неизвестные УК/дом хранятся как 0, чтобы ключ оставался первичным.
+    """
+    company_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    house_id = Column(Integer, primary_key=True)
+    category = Column(Enum(RequestCategory), primary_key=True)
+    status = Column(Enum(RequestStatus), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class RequestRollupHourly(_RequestRollupMixin, Base):
+    """Почасовая сводка по заявкам"""
+    __tablename__ = "request_rollup_hourly"
+    __table_args__ = (Index("ix_request_rollup_hourly_bucket", "bucket"),)
+
+
+class RequestRollupDaily(_RequestRollupMixin, Base):
+    """Посуточная сводка по заявкам"""
+    __tablename__ = "request_rollup_daily"
+    __table_args__ = (Index("ix_request_rollup_daily_bucket", "bucket"),)
+
+
+class RollupWatermark(Base):
+    """Последняя обработанная запись request_history для каждой сводки"""
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String(50), primary_key=True)
+    last_history_id = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, func
+from app.database import Base
+
+
+class SchemaVersion(Base):
+    """Версия схемы шарда после create_all и миграций (см. ensure_schema в app/utils/migration.py)"""
+    __tablename__ = "schema_version"
+    
+    id = Column(Integer, primary_key=True)  # одна строка, id = 1
+    version = Column(String(64), nullable=False)
+    
+    applied_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<SchemaVersion(version='{self.version}')>"
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, func
+from app.database import Base
+
+
+class CompanyShard(Base):
+    """Размещение УК на шарде (см. ShardRouter в app/database.py); читается только из шарда default"""
+    __tablename__ = "company_shards"
+    
+    # Без внешнего ключа: на шарде default строки УК может не быть, если её данные живут на другом шарде
+    company_id = Column(Integer, primary_key=True)
+    shard = Column(String(64), nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<CompanyShard(company_id={self.company_id}, shard='{self.shard}')>"
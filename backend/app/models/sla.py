@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, Boolean, DateTime, ForeignKey, Enum, UniqueConstraint, func
+from app.database import Base
+from app.models.request import RequestStatus, RequestCategory
+
+
+class SlaPolicy(Base):
+    """
+    Срок, дольше которого заявка не должна оставаться в статусе, и действия
+    при его нарушении. company_id/category = NULL - правило для всех УК/категорий.
+    """
+    __tablename__ = "sla_policies"
+    __table_args__ = (
+        UniqueConstraint("company_id", "category", "status", name="uq_sla_policies_scope"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=True)
+    category = Column(Enum(RequestCategory), nullable=True)
+    status = Column(Enum(RequestStatus), nullable=False)
+    deadline_minutes = Column(Integer, nullable=False)
+    
+    # Действия при эскалации
+    notify = Column(Boolean, default=True, nullable=False)           # сообщение сотрудникам УК
+    reassign = Column(Boolean, default=False, nullable=False)        # снять исполнителя, вернуть в очередь
+    raise_priority = Column(Boolean, default=False, nullable=False)  # поднять в очереди диспетчеров
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<SlaPolicy(company_id={self.company_id}, category={self.category}, status={self.status}, {self.deadline_minutes} min)>"
@@ -24,19 +24,20 @@ class User(Base):
     phone = Column(String(20), nullable=True)
     
     # Привязка к дому
-    house_id = Column(Integer, ForeignKey("houses.id", ondelete="SET NULL"), nullable=True)
+    house_id = Column(Integer, ForeignKey("houses.id", ondelete="SET NULL"), nullable=True, index=True)
     apartment = Column(String(20), nullable=True)  # Номер квартиры
     
     # Роль и привязка к УК (для сотрудников)
     role = Column(Enum(UserRole), default=UserRole.RESIDENT, nullable=False)
-    company_id = Column(Integer, ForeignKey("companies.id", ondelete="SET NULL"), nullable=True)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="SET NULL"), nullable=True, index=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     house = relationship("House", back_populates="residents")
-    requests = relationship("Request", back_populates="user", cascade="all, delete-orphan")
+    company = relationship("Company")
+    requests = relationship("Request", back_populates="user", cascade="all, delete-orphan", passive_deletes=True, foreign_keys="Request.user_id")
     
     @property
     def full_name(self) -> str:
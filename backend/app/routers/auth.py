@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
 
-from app.database import get_db
-from app.models.user import User
+from app.database import get_db, shards
+from app.models.user import User, UserRole
+from app.models.house import House
+from app.models.request import Request
 from app.schemas.user import UserResponse, UserUpdate, TokenResponse
-from app.utils.auth import verify_telegram_data, create_access_token, get_current_user
+from app.utils.auth import verify_telegram_data, create_access_token, get_current_user, get_login_db, token_claims
 
 router = APIRouter(prefix="/auth", tags=["Авторизация"])
 
@@ -13,7 +16,7 @@ router = APIRouter(prefix="/auth", tags=["Авторизация"])
 @router.post("/telegram", response_model=TokenResponse)
 async def auth_telegram(
     init_data: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_login_db)
 ):
     """
     Авторизация через Telegram Mini App
@@ -59,7 +62,7 @@ async def auth_telegram(
         await db.refresh(user)
     
     # Создаем токен
-    access_token = create_access_token({"telegram_id": telegram_id})
+    access_token = create_access_token(await token_claims(db, user))
     
     return TokenResponse(
         access_token=access_token,
@@ -70,7 +73,7 @@ async def auth_telegram(
 @router.post("/demo", response_model=TokenResponse)
 async def auth_demo(
     telegram_id: int = 123456789,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_login_db)
 ):
     """
     Демо-авторизация для тестирования (только в режиме debug)
@@ -93,7 +96,7 @@ async def auth_demo(
         await db.commit()
         await db.refresh(user)
     
-    access_token = create_access_token({"telegram_id": telegram_id})
+    access_token = create_access_token(await token_claims(db, user))
     
     return TokenResponse(
         access_token=access_token,
@@ -104,7 +107,7 @@ async def auth_demo(
 @router.post("/admin-login", response_model=TokenResponse)
 async def admin_login(
     telegram_id: int,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_login_db)
 ):
     """
     Вход для сотрудников УК по Telegram ID
@@ -132,7 +135,7 @@ async def admin_login(
             detail=f"Доступ разрешён только сотрудникам УК (Ваша роль: {user_role_val})"
         )
     
-    access_token = create_access_token({"telegram_id": telegram_id})
+    access_token = create_access_token(await token_claims(db, user))
     
     return TokenResponse(
         access_token=access_token,
@@ -149,26 +152,110 @@ async def get_me(user: User = Depends(get_current_user)):
 @router.patch("/me", response_model=UserResponse)
 async def update_me(
     data: UserUpdate,
+    response: Response,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Обновить данные текущего пользователя"""
+    """
+    Обновить данные текущего пользователя.
+    
+    Дом выбирается вместе с его УК (house_company_id): id домов в разных шардах
+    совпадают, а дом другой УК может быть в другом шарде - тогда жилец
+    переносится в шард этой УК. Если от этого изменился токен (УК жильца),
+    новый токен возвращается в заголовке X-Access-Token.
+    """
     update_data = data.model_dump(exclude_unset=True)
+    house_company_id = update_data.pop("house_company_id", None)
+    claims = await token_claims(db, user)
     
-    for field, value in update_data.items():
-        setattr(user, field, value)
+    shard = db.info["shard"]
+    if update_data.get("house_id") and house_company_id:
+        shard = shards.shard_for_company(house_company_id)
     
-    await db.commit()
-    await db.refresh(user)
+    if shard == db.info["shard"]:
+        for field, value in update_data.items():
+            setattr(user, field, value)
+        
+        await db.commit()
+        await db.refresh(user)
+        new_claims = await token_claims(db, user)
+    else:
+        user, new_claims = await _move_resident(db, user, shard, house_company_id, update_data)
+    
+    if new_claims != claims:
+        response.headers["X-Access-Token"] = create_access_token(new_claims)
     
     return UserResponse.model_validate(user)
 
 
+async def _move_resident(db: AsyncSession, user: User, shard: str, company_id: int, update_data: dict):
+    """
+    Перенести жильца в шард УК выбранного дома: строка пользователя создаётся
+    в новом шарде, затем удаляется из текущего (если удаление не удалось, копия
+    убирается). Заявки остаются в БД своей УК, поэтому жильца с заявками не переносим.
+    """
+    if user.role != UserRole.RESIDENT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="К дому другой УК может привязаться только жилец"
+        )
+    requests = (await db.execute(select(func.count(Request.id)).where(Request.user_id == user.id))).scalar()
+    if requests:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Нельзя выбрать дом этой УК, пока у вас есть заявки в текущей УК"
+        )
+    
+    async with shards.session(shard) as target:
+        result = await target.execute(
+            select(House.id).where(House.id == update_data["house_id"], House.company_id == company_id)
+        )
+        if not result.scalar_one_or_none():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Дом не найден"
+            )
+        
+        # Сначала строка в новом шарде: если её запись упадёт, жилец остаётся в старом.
+        # Пока старая строка не удалена, telegram_id есть в двух шардах - вход в это
+        # мгновение найдёт любую из двух одинаковых строк
+        profile = {
+            "telegram_id": user.telegram_id,
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "phone": user.phone,
+            "apartment": user.apartment,
+        }
+        moved = User(**dict(profile, **update_data))
+        target.add(moved)
+        try:
+            await target.commit()
+        except IntegrityError:
+            await target.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Не удалось перенести профиль в УК выбранного дома"
+            )
+        await target.refresh(moved)
+        
+        try:
+            await db.delete(user)
+            await db.commit()
+        except Exception:
+            # Компенсация: убираем копию, жилец остаётся в старом шарде
+            await db.rollback()
+            await target.delete(moved)
+            await target.commit()
+            raise
+        return moved, await token_claims(target, moved)
+
+
 @router.post("/make-admin")
 async def make_admin(
     telegram_id: int = 123456789,
     company_id: int = 1,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_login_db)
 ):
     """
     Сделать пользователя админом УК по telegram_id (только в debug режиме)
@@ -0,0 +1,114 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+
+from app.database import get_db
+from app.models.user import User, UserRole
+from app.models.house import House
+from app.models.company import Company
+from app.models.broadcast import Broadcast
+from app.schemas.broadcast import BroadcastCreate, BroadcastResponse, BroadcastListResponse
+from app.utils.auth import require_role
+from app.utils.broadcasts import queue_broadcast
+from app.utils.idempotency import IdempotentRoute
+
+router = APIRouter(prefix="/broadcasts", tags=["Рассылки"], route_class=IdempotentRoute)
+
+require_admin = require_role(UserRole.ADMIN, UserRole.SUPER_ADMIN)
+
+
+def _check_access(user: User, company_id: int):
+    if user.role != UserRole.SUPER_ADMIN and user.company_id != company_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Рассылка не найдена"
+        )
+
+
+@router.post("", response_model=BroadcastResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_broadcast(
+    data: BroadcastCreate,
+    user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Разослать сообщение жильцам дома (house_id) или всей УК.
+    Отправка идёт в фоне; прогресс - GET /api/broadcasts/{id}.
+    """
+    company_id = data.company_id if user.role == UserRole.SUPER_ADMIN else user.company_id
+
+    if data.house_id:
+        result = await db.execute(select(House).where(House.id == data.house_id))
+        house = result.scalar_one_or_none()
+        if not house or (company_id and house.company_id != company_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Дом не найден"
+            )
+        company_id = house.company_id
+
+    if not company_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите дом или УК"
+        )
+    if not await db.get(Company, company_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="УК не найдена"
+        )
+
+    broadcast = Broadcast(
+        company_id=company_id,
+        house_id=data.house_id,
+        text=data.text,
+        created_by=user.id,
+    )
+    db.add(broadcast)
+    await queue_broadcast(db, broadcast)
+    await db.commit()
+    await db.refresh(broadcast)
+
+    return BroadcastResponse.model_validate(broadcast)
+
+
+@router.get("", response_model=BroadcastListResponse)
+async def get_broadcasts(
+    skip: int = 0,
+    limit: int = 50,
+    user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Рассылки УК (для суперадмина - все), новые сначала"""
+    query = select(Broadcast)
+    count_query = select(func.count(Broadcast.id))
+
+    if user.role != UserRole.SUPER_ADMIN:
+        query = query.where(Broadcast.company_id == user.company_id)
+        count_query = count_query.where(Broadcast.company_id == user.company_id)
+
+    total = (await db.execute(count_query)).scalar()
+    result = await db.execute(query.order_by(Broadcast.id.desc()).offset(skip).limit(limit))
+
+    return BroadcastListResponse(
+        items=[BroadcastResponse.model_validate(b) for b in result.scalars().all()],
+        total=total
+    )
+
+
+@router.get("/{broadcast_id}", response_model=BroadcastResponse)
+async def get_broadcast(
+    broadcast_id: int,
+    user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Статус и статистика доставки рассылки"""
+    broadcast = await db.get(Broadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Рассылка не найдена"
+        )
+    _check_access(user, broadcast.company_id)
+
+    return BroadcastResponse.model_validate(broadcast)
@@ -1,48 +1,72 @@
+import asyncio
+from collections import defaultdict
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, delete, func
 
-from app.database import get_db
+from app.database import get_db, shards
 from app.models.company import Company
 from app.models.house import House
 from app.schemas.company import CompanyCreate, CompanyUpdate, CompanyResponse, CompanyListResponse
+from app.utils.address_index import address_index
+from app.utils.cache import response_cache, json_response, COMPANIES, HOUSES
 
 router = APIRouter(prefix="/companies", tags=["Управляющие компании"])
 
 
+async def _house_counts(company_ids) -> dict:
+    """Число домов УК; дома лежат в шарде своей УК, поэтому считаем в каждом шарде по его УК"""
+    by_shard = defaultdict(list)
+    for company_id in company_ids:
+        by_shard[shards.shard_for_company(company_id)].append(company_id)
+    
+    async def count(shard: str, ids) -> dict:
+        async with shards.session(shard) as db:
+            result = await db.execute(
+                select(House.company_id, func.count(House.id))
+                .where(House.company_id.in_(ids))
+                .group_by(House.company_id)
+            )
+            return dict(result.all())
+    
+    counts = {}
+    for shard_counts in await asyncio.gather(*(count(shard, ids) for shard, ids in by_shard.items())):
+        counts.update(shard_counts)
+    return counts
+
+
 @router.get("", response_model=CompanyListResponse)
 async def get_companies(
     skip: int = 0,
     limit: int = 100,
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить список всех УК"""
-    # Считаем общее количество
-    count_result = await db.execute(select(func.count(Company.id)))
-    total = count_result.scalar()
-    
-    # Получаем компании с количеством домов
-    result = await db.execute(
-        select(Company)
-        .offset(skip)
-        .limit(limit)
-        .order_by(Company.name)
-    )
-    companies = result.scalars().all()
-    
-    items = []
-    for company in companies:
-        # Считаем дома
-        house_count_result = await db.execute(
-            select(func.count(House.id)).where(House.company_id == company.id)
+    """Получить список всех УК (из кэша ответов)"""
+    async def load() -> bytes:
+        # Считаем общее количество
+        count_result = await db.execute(select(func.count(Company.id)))
+        total = count_result.scalar()
+        
+        result = await db.execute(
+            select(Company)
+            .offset(skip)
+            .limit(limit)
+            .order_by(Company.name)
         )
-        house_count = house_count_result.scalar()
+        companies = result.scalars().all()
         
-        response = CompanyResponse.model_validate(company)
-        response.house_count = house_count
-        items.append(response)
+        # Количество домов - одним запросом на страницу
+        house_counts = await _house_counts([c.id for c in companies])
+        items = []
+        for company in companies:
+            response = CompanyResponse.model_validate(company)
+            response.house_count = house_counts.get(company.id, 0)
+            items.append(response)
+        
+        return CompanyListResponse(items=items, total=total).model_dump_json().encode()
     
-    return CompanyListResponse(items=items, total=total)
+    return json_response(await response_cache.get_or_load(COMPANIES, ("list", db.info["shard"], skip, limit), load))
 
 
 @router.get("/{company_id}", response_model=CompanyResponse)
@@ -51,24 +75,21 @@ async def get_company(
     db: AsyncSession = Depends(get_db)
 ):
     """Получить УК по ID"""
-    result = await db.execute(select(Company).where(Company.id == company_id))
-    company = result.scalar_one_or_none()
-    
-    if not company:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="УК не найдена"
-        )
-    
-    # Считаем дома
-    house_count_result = await db.execute(
-        select(func.count(House.id)).where(House.company_id == company.id)
-    )
-    house_count = house_count_result.scalar()
+    async def load() -> bytes:
+        result = await db.execute(select(Company).where(Company.id == company_id))
+        company = result.scalar_one_or_none()
+        
+        if not company:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="УК не найдена"
+            )
+        
+        response = CompanyResponse.model_validate(company)
+        response.house_count = (await _house_counts([company.id])).get(company.id, 0)
+        return response.model_dump_json().encode()
     
-    response = CompanyResponse.model_validate(company)
-    response.house_count = house_count
-    return response
+    return json_response(await response_cache.get_or_load(COMPANIES, ("get", db.info["shard"], company_id), load))
 
 
 @router.post("", response_model=CompanyResponse, status_code=status.HTTP_201_CREATED)
@@ -81,6 +102,7 @@ async def create_company(
     db.add(company)
     await db.commit()
     await db.refresh(company)
+    await response_cache.invalidate(COMPANIES)
     
     response = CompanyResponse.model_validate(company)
     response.house_count = 0
@@ -109,6 +131,7 @@ async def update_company(
     
     await db.commit()
     await db.refresh(company)
+    await response_cache.invalidate(COMPANIES)
     
     return CompanyResponse.model_validate(company)
 
@@ -118,15 +141,15 @@ async def delete_company(
     company_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    """Удалить УК"""
-    result = await db.execute(select(Company).where(Company.id == company_id))
-    company = result.scalar_one_or_none()
+    """Удалить УК (дома и их данные удаляет БД каскадом)"""
+    result = await db.execute(delete(Company).where(Company.id == company_id))
     
-    if not company:
+    if not result.rowcount:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="УК не найдена"
         )
     
-    await db.delete(company)
     await db.commit()
+    address_index.remove_company(company_id)
+    await response_cache.invalidate(COMPANIES, HOUSES)
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import IntegrityError
 
-from app.database import get_db
+from app.database import get_db, shards
 from app.models.house import House
 from app.models.company import Company
-from app.schemas.house import HouseCreate, HouseUpdate, HouseResponse, HouseListResponse
+from app.schemas.house import HouseCreate, HouseUpdate, HouseResponse, HouseListResponse, HouseSuggestion
+from app.utils.address_index import address_index, suggest_from_db
+from app.utils.cache import response_cache, json_response, COMPANIES, HOUSES
 
 router = APIRouter(prefix="/houses", tags=["Дома"])
 
@@ -14,29 +18,63 @@ router = APIRouter(prefix="/houses", tags=["Дома"])
 async def get_houses(
     company_id: int = None,
     skip: int = 0,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    limit: int = 100
 ):
-    """Получить список домов (опционально фильтр по УК)"""
-    query = select(House)
-    count_query = select(func.count(House.id))
-    
-    if company_id:
-        query = query.where(House.company_id == company_id)
-        count_query = count_query.where(House.company_id == company_id)
-    
-    count_result = await db.execute(count_query)
-    total = count_result.scalar()
+    """
+    Получить список домов (опционально фильтр по УК, из кэша ответов).
+    С company_id дома читаются из шарда УК, без него - со всех шардов:
+    список публичный, жилец выбирает дом до того, как его шард известен.
+    """
+    async def page(db: AsyncSession, offset: int, size: int):
+        query = select(House)
+        count_query = select(func.count(House.id))
+        
+        if company_id:
+            query = query.where(House.company_id == company_id)
+            count_query = count_query.where(House.company_id == company_id)
+        
+        count_result = await db.execute(count_query)
+        total = count_result.scalar()
+        
+        result = await db.execute(
+            query.offset(offset).limit(size).order_by(House.address)
+        )
+        return total, result.scalars().all()
     
-    result = await db.execute(
-        query.offset(skip).limit(limit).order_by(House.address)
-    )
-    houses = result.scalars().all()
+    async def load() -> bytes:
+        if company_id or not shards.sharded:
+            async with shards.session(shards.shard_for_company(company_id)) as db:
+                total, houses = await page(db, skip, limit)
+        else:
+            # Страница объединения: с каждого шарда первые skip + limit домов по адресу
+            results = [result for _, result in await shards.fan_out(lambda db: page(db, 0, skip + limit))]
+            total = sum(count for count, _ in results)
+            houses = sorted((h for _, rows in results for h in rows), key=lambda h: h.address)[skip:skip + limit]
+        
+        return HouseListResponse(
+            items=[HouseResponse.model_validate(h) for h in houses],
+            total=total
+        ).model_dump_json().encode()
     
-    return HouseListResponse(
-        items=[HouseResponse.model_validate(h) for h in houses],
-        total=total
-    )
+    return json_response(await response_cache.get_or_load(HOUSES, ("list", company_id, skip, limit), load))
+
+
+@router.get("/suggest", response_model=List[HouseSuggestion])
+async def suggest_houses(
+    q: str = Query(..., min_length=1, max_length=200),
+    company_id: Optional[int] = None,
+    limit: int = Query(10, ge=1, le=50)
+):
+    """Автодополнение адреса дома (поиск по in-memory индексу, без обращения к БД)"""
+    if address_index.ready:
+        houses = address_index.suggest(q, company_id, limit)
+    else:
+        # Индекс строится фоном после старта процесса
+        houses = await suggest_from_db(q, company_id, limit)
+    return [
+        HouseSuggestion(id=house_id, company_id=house_company_id, address=address, shard=shard)
+        for shard, house_id, house_company_id, address in houses
+    ]
 
 
 @router.get("/{house_id}", response_model=HouseResponse)
@@ -45,16 +83,19 @@ async def get_house(
     db: AsyncSession = Depends(get_db)
 ):
     """Получить дом по ID"""
-    result = await db.execute(select(House).where(House.id == house_id))
-    house = result.scalar_one_or_none()
+    async def load() -> bytes:
+        result = await db.execute(select(House).where(House.id == house_id))
+        house = result.scalar_one_or_none()
+        
+        if not house:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Дом не найден"
+            )
+        
+        return HouseResponse.model_validate(house).model_dump_json().encode()
     
-    if not house:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Дом не найден"
-        )
-    
-    return HouseResponse.model_validate(house)
+    return json_response(await response_cache.get_or_load(HOUSES, ("get", db.info["shard"], house_id), load))
 
 
 @router.post("", response_model=HouseResponse, status_code=status.HTTP_201_CREATED)
@@ -73,8 +114,17 @@ async def create_house(
     
     house = House(**data.model_dump())
     db.add(house)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Дом с таким адресом в этой УК уже существует"
+        )
     await db.refresh(house)
+    address_index.add(db.info["shard"], house.id, house.company_id, house.address)
+    await response_cache.invalidate(HOUSES, COMPANIES)
     
     return HouseResponse.model_validate(house)
 
@@ -99,8 +149,17 @@ async def update_house(
     for field, value in update_data.items():
         setattr(house, field, value)
     
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Дом с таким адресом в этой УК уже существует"
+        )
     await db.refresh(house)
+    address_index.add(db.info["shard"], house.id, house.company_id, house.address)
+    await response_cache.invalidate(HOUSES, COMPANIES)
     
     return HouseResponse.model_validate(house)
 
@@ -110,15 +169,15 @@ async def delete_house(
     house_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    """Удалить дом"""
-    result = await db.execute(select(House).where(House.id == house_id))
-    house = result.scalar_one_or_none()
+    """Удалить дом (жильцы отвязываются в БД через ON DELETE SET NULL)"""
+    result = await db.execute(delete(House).where(House.id == house_id))
     
-    if not house:
+    if not result.rowcount:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Дом не найден"
         )
     
-    await db.delete(house)
     await db.commit()
+    address_index.remove(db.info["shard"], house_id)
+    await response_cache.invalidate(HOUSES, COMPANIES)
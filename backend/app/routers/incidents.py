@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from sqlalchemy.orm import selectinload
+from typing import Optional
+
+from app.database import get_db
+from app.models.user import User, UserRole
+from app.models.house import House
+from app.models.request import Request, RequestStatus, RequestCategory, STATUS_TRANSITIONS
+from app.models.incident import Incident
+from app.schemas.request import STATUS_LABELS
+from app.schemas.incident import IncidentStatusUpdate, IncidentResponse, IncidentDetailResponse, IncidentListResponse
+from app.utils.auth import require_role
+from app.utils.incidents import set_incident_status
+from app.utils.sla import sla_scheduler
+from app.routers.requests import request_to_response
+from app.utils.idempotency import IdempotentRoute
+
+router = APIRouter(prefix="/incidents", tags=["Инциденты"], route_class=IdempotentRoute)
+
+require_staff = require_role(UserRole.ADMIN, UserRole.DISPATCHER, UserRole.SUPER_ADMIN)
+
+
+def incident_to_response(incident: Incident) -> IncidentResponse:
+    response = IncidentResponse.model_validate(incident)
+    response.house_address = incident.house.address
+    return response
+
+
+async def get_incident_or_404(db: AsyncSession, incident_id: int, user: User) -> Incident:
+    result = await db.execute(
+        select(Incident)
+        .options(
+            selectinload(Incident.house),
+            selectinload(Incident.requests).selectinload(Request.user).selectinload(User.house),
+            selectinload(Incident.requests).selectinload(Request.history),
+        )
+        .where(Incident.id == incident_id)
+        .execution_options(populate_existing=True)
+    )
+    incident = result.scalar_one_or_none()
+
+    if not incident or (user.role != UserRole.SUPER_ADMIN and incident.house.company_id != user.company_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Инцидент не найден"
+        )
+    return incident
+
+
+@router.get("", response_model=IncidentListResponse)
+async def get_incidents(
+    status_filter: Optional[RequestStatus] = Query(None, alias="status"),
+    category: Optional[RequestCategory] = None,
+    house_id: Optional[int] = None,
+    min_requests: int = 2,
+    skip: int = 0,
+    limit: int = 50,
+    user: User = Depends(require_staff),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Инциденты (группы похожих заявок одного дома), новые сначала.
+    По умолчанию только группы из двух и более заявок.
+    """
+    query = select(Incident).join(House).where(Incident.request_count >= min_requests)
+
+    if user.role != UserRole.SUPER_ADMIN:
+        query = query.where(House.company_id == user.company_id)
+    if status_filter:
+        query = query.where(Incident.status == status_filter)
+    if category:
+        query = query.where(Incident.category == category)
+    if house_id:
+        query = query.where(Incident.house_id == house_id)
+
+    total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar()
+    result = await db.execute(
+        query.options(selectinload(Incident.house))
+        .order_by(Incident.last_request_at.desc())
+        .offset(skip).limit(limit)
+    )
+
+    return IncidentListResponse(
+        items=[incident_to_response(i) for i in result.scalars().all()],
+        total=total
+    )
+
+
+@router.get("/{incident_id}", response_model=IncidentDetailResponse)
+async def get_incident(
+    incident_id: int,
+    user: User = Depends(require_staff),
+    db: AsyncSession = Depends(get_db)
+):
+    """Инцидент со всеми заявками"""
+    incident = await get_incident_or_404(db, incident_id, user)
+
+    response = IncidentDetailResponse.model_validate(incident_to_response(incident), from_attributes=True)
+    response.requests = [request_to_response(r) for r in incident.requests]
+    return response
+
+
+@router.post("/{incident_id}/status", response_model=IncidentDetailResponse)
+async def update_incident_status(
+    incident_id: int,
+    data: IncidentStatusUpdate,
+    user: User = Depends(require_staff),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Изменить статус инцидента. Статус получают все его заявки, для которых
+    переход допустим по FSM (заявки, которые жилец уже отменил, не меняются).
+    """
+    incident = await get_incident_or_404(db, incident_id, user)
+
+    if data.status not in STATUS_TRANSITIONS.get(incident.status, []):
+        allowed_labels = [STATUS_LABELS[s] for s in STATUS_TRANSITIONS.get(incident.status, [])]
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Невозможно изменить статус. Допустимые переходы: {', '.join(allowed_labels) or 'нет'}"
+        )
+
+    await set_incident_status(db, incident, data.status, data.comment, user)
+
+    response = await get_incident(incident_id, user, db)
+    for request in incident.requests:
+        sla_scheduler.track(db.info["shard"], request)
+    return response
@@ -1,21 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, update, func, literal
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Literal, Optional
 import traceback
 
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.models.request import Request, RequestStatus, RequestCategory, RequestHistory, STATUS_TRANSITIONS
 from app.models.house import House
+from app.models.archive import ArchivedRequest
 from app.schemas.request import (
     RequestCreate, RequestUpdate, RequestStatusUpdate,
     RequestResponse, RequestListResponse, CATEGORY_LABELS, STATUS_LABELS
 )
 from app.utils.auth import get_current_user, require_role
+from app.utils.search import request_search
+from app.utils.export import stream_csv, stream_xlsx
+from app.utils.notifications import queue_status_notification
+from app.utils.incidents import attach_to_incident
+from app.utils.sla import sla_scheduler
+from app.utils.idempotency import IdempotentRoute
+from app.utils.coalesce import coalesce
 
-router = APIRouter(prefix="/requests", tags=["Заявки"])
+router = APIRouter(prefix="/requests", tags=["Заявки"], route_class=IdempotentRoute)
 
 
 def request_to_response(request: Request, user: User = None) -> RequestResponse:
@@ -32,12 +42,88 @@ def request_to_response(request: Request, user: User = None) -> RequestResponse:
     return response
 
 
+def scope_requests(query, user: User, model=Request):
+    """Ограничить выборку заявок областью видимости пользователя"""
+    if user.role == UserRole.RESIDENT:
+        return query.where(model.user_id == user.id)
+    if user.role in [UserRole.ADMIN, UserRole.DISPATCHER]:
+        # Заявки от жильцов домов этой УК
+        if user.company_id:
+            subquery = select(User.id).join(House).where(House.company_id == user.company_id)
+            return query.where(model.user_id.in_(subquery))
+    return query
+
+
+def request_scope_key(user: User) -> tuple:
+    """Ключ области видимости: у пользователей с одинаковым ключом одинаковая выборка scope_requests"""
+    if user.role == UserRole.RESIDENT:
+        return ("user", user.id)
+    if user.role in [UserRole.ADMIN, UserRole.DISPATCHER] and user.company_id:
+        return ("company", user.company_id)
+    return ("all",)
+
+
+def list_queries(model, user: User, status, category, q, dialect: str):
+    """
+    Запрос списка заявок (уже отсортированный), запрос количества и выражение
+    релевантности поиска (None без поиска). model - Request или ArchivedRequest.
+    """
+    query = select(model).options(
+        selectinload(model.user).selectinload(User.house),
+        selectinload(model.history)
+    )
+    count_query = select(func.count(model.id))
+    
+    # Фильтрация по роли
+    query = scope_requests(query, user, model)
+    count_query = scope_requests(count_query, user, model)
+    
+    # Фильтры
+    if status:
+        query = query.where(model.status == status)
+        count_query = count_query.where(model.status == status)
+    
+    if category:
+        query = query.where(model.category == category)
+        count_query = count_query.where(model.category == category)
+    
+    order_by = [model.created_at.desc()]
+    rank = None
+    search = request_search(q, dialect, model) if q else None
+    if search is not None:
+        condition, rank = search
+        query = query.join(User, model.user_id == User.id).where(condition)
+        count_query = count_query.select_from(model).join(User, model.user_id == User.id).where(condition)
+        order_by.insert(0, rank.desc())
+    
+    return query.order_by(*order_by), count_query, rank
+
+
+async def list_with_archive(db: AsyncSession, user: User, status, category, q, skip: int, limit: int):
+    """
+    Страница заявок из requests и архива: из каждой таблицы берутся первые
+    skip + limit строк, затем они сливаются в том же порядке сортировки.
+    """
+    rows = []
+    total = 0
+    for model in (Request, ArchivedRequest):
+        query, count_query, rank = list_queries(model, user, status, category, q, db.bind.dialect.name)
+        total += (await db.execute(count_query)).scalar()
+        result = await db.execute(query.add_columns(rank if rank is not None else literal(0.0)).limit(skip + limit))
+        rows.extend(result.all())
+    
+    rows.sort(key=lambda row: (row[1], row[0].created_at), reverse=True)
+    return [row[0] for row in rows[skip:skip + limit]], total
+
+
 @router.get("", response_model=RequestListResponse)
 async def get_requests(
     status: Optional[RequestStatus] = None,
     category: Optional[RequestCategory] = None,
+    q: Optional[str] = Query(None, max_length=200),
     skip: int = 0,
     limit: int = 50,
+    include_archived: bool = False,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -45,44 +131,81 @@ async def get_requests(
     Получить список заявок.
     Жильцы видят только свои заявки.
     Сотрудники УК видят заявки домов своей УК.
+    Параметр q - поиск по тексту заявки, имени жильца и номеру квартиры,
+    результаты сортируются по релевантности.
+    Старые закрытые заявки в архиве попадают в список только с include_archived=true.
+    Одинаковые одновременные запросы в одной области видимости
+    выполняются одним обращением к БД.
     """
-    query = select(Request).options(
-        selectinload(Request.user).selectinload(User.house),
-        selectinload(Request.history)
-    )
-    count_query = select(func.count(Request.id))
+    async def load() -> RequestListResponse:
+        if include_archived:
+            requests, total = await list_with_archive(db, user, status, category, q, skip, limit)
+        else:
+            query, count_query, _ = list_queries(Request, user, status, category, q, db.bind.dialect.name)
+            
+            count_result = await db.execute(count_query)
+            total = count_result.scalar()
+            
+            result = await db.execute(query.offset(skip).limit(limit))
+            requests = result.scalars().all()
+        
+        return RequestListResponse(
+            items=[request_to_response(r) for r in requests],
+            total=total,
+            shard=db.info["shard"]
+        )
     
-    # Фильтрация по роли
-    if user.role == UserRole.RESIDENT:
-        query = query.where(Request.user_id == user.id)
-        count_query = count_query.where(Request.user_id == user.id)
-    elif user.role in [UserRole.ADMIN, UserRole.DISPATCHER]:
-        # Заявки от жильцов домов этой УК
-        if user.company_id:
-            subquery = select(User.id).join(House).where(House.company_id == user.company_id)
-            query = query.where(Request.user_id.in_(subquery))
-            count_query = count_query.where(Request.user_id.in_(subquery))
+    key = ("requests", db.info["shard"], request_scope_key(user), status, category, q, skip, limit, include_archived)
+    return await coalesce(key, load)
+
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+@router.get("/export")
+async def export_requests(
+    format: Literal["csv", "xlsx"] = "csv",
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    status: Optional[RequestStatus] = None,
+    category: Optional[RequestCategory] = None,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Выгрузить заявки с историей статусов в CSV или XLSX.
+    Видимость заявок такая же, как в списке заявок.
+    """
+    query = scope_requests(
+        select(Request).options(
+            selectinload(Request.user).selectinload(User.house),
+            selectinload(Request.history)
+        ),
+        user
+    )
     
-    # Фильтры
+    if date_from:
+        query = query.where(Request.created_at >= date_from)
+    if date_to:
+        query = query.where(Request.created_at < date_to)
     if status:
         query = query.where(Request.status == status)
-        count_query = count_query.where(Request.status == status)
-    
     if category:
         query = query.where(Request.category == category)
-        count_query = count_query.where(Request.category == category)
     
-    count_result = await db.execute(count_query)
-    total = count_result.scalar()
+    query = query.order_by(Request.created_at, Request.id)
+    # Выгрузка читает в своей сессии, но в шарде пользователя: id жильцов и УК в шардах совпадают
+    shard = db.info["shard"]
+    stream = stream_csv(query, shard) if format == "csv" else stream_xlsx(query, shard)
+    filename = f"requests_{datetime.now():%Y%m%d_%H%M%S}.{format}"
     
-    result = await db.execute(
-        query.offset(skip).limit(limit).order_by(Request.created_at.desc())
-    )
-    requests = result.scalars().all()
-    
-    return RequestListResponse(
-        items=[request_to_response(r) for r in requests],
-        total=total
+    return StreamingResponse(
+        stream,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 
@@ -107,19 +230,24 @@ async def get_statuses():
 @router.get("/{request_id}", response_model=RequestResponse)
 async def get_request(
     request_id: int,
+    include_archived: bool = False,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить заявку по ID"""
-    result = await db.execute(
-        select(Request)
-        .options(
-            selectinload(Request.user).selectinload(User.house),
-            selectinload(Request.history)
+    """Получить заявку по ID (заявку из архива - с include_archived=true)"""
+    request = None
+    for model in (Request, ArchivedRequest) if include_archived else (Request,):
+        result = await db.execute(
+            select(model)
+            .options(
+                selectinload(model.user).selectinload(User.house),
+                selectinload(model.history)
+            )
+            .where(model.id == request_id)
         )
-        .where(Request.id == request_id)
-    )
-    request = result.scalar_one_or_none()
+        request = result.scalar_one_or_none()
+        if request:
+            break
     
     if not request:
         raise HTTPException(
@@ -151,12 +279,15 @@ async def create_request(
             detail="Сначала укажите свой адрес в профиле"
         )
     
+    company_id = (await db.execute(select(House.company_id).where(House.id == user.house_id))).scalar()
     request = Request(
         user_id=user.id,
+        company_id=company_id,
+        house_id=user.house_id,
         **data.model_dump()
     )
     db.add(request)
-    await db.commit()
+    await db.flush()
     
     # Создаем запись в истории
     history = RequestHistory(
@@ -167,7 +298,12 @@ async def create_request(
         changed_by=user.id
     )
     db.add(history)
+    await db.flush()
+    
+    # Похожие заявки соседей по дому объединяются в инцидент
+    await attach_to_incident(db, request, user.house_id, user)
     await db.commit()
+    sla_scheduler.track(db.info["shard"], request)
     
     await db.refresh(request)
     
@@ -185,6 +321,73 @@ async def create_request(
     return request_to_response(request)
 
 
+# Сколько раз повторить захват, если заявку перехватил другой диспетчер (SQLite без SKIP LOCKED)
+CLAIM_ATTEMPTS = 5
+
+
+@router.post("/claim-next", response_model=RequestResponse)
+async def claim_next_request(
+    category: Optional[RequestCategory] = None,
+    user: User = Depends(require_role(UserRole.ADMIN, UserRole.DISPATCHER)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Взять в работу самую старую свободную новую заявку своей УК
+    (заявки с повышенным после эскалации SLA приоритетом - первыми).
+    Строки, которые сейчас захватывают другие диспетчеры, пропускаются
+    (FOR UPDATE SKIP LOCKED), поэтому параллельные вызовы не ждут друг друга
+    и не получают одну и ту же заявку.
+    """
+    if not user.company_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Сотрудник не привязан к УК"
+        )
+    
+    # Условия и порядок совпадают с частичным индексом ix_requests_queue
+    query = (
+        select(Request.id)
+        .where(
+            Request.company_id == user.company_id,
+            Request.assignee_id.is_(None),
+            Request.status == RequestStatus.NEW,
+        )
+        .order_by(Request.priority.desc(), Request.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if category:
+        query = query.where(Request.category == category)
+    
+    for _ in range(CLAIM_ATTEMPTS):
+        request_id = (await db.execute(query)).scalar()
+        if request_id is None:
+            break
+        result = await db.execute(
+            update(Request)
+            .where(Request.id == request_id, Request.assignee_id.is_(None))
+            .values(assignee_id=user.id)
+            .returning(Request.id)
+        )
+        claimed = result.scalar()
+        await db.commit()
+        if claimed:
+            result = await db.execute(
+                select(Request)
+                .options(
+                    selectinload(Request.user).selectinload(User.house),
+                    selectinload(Request.history)
+                )
+                .where(Request.id == claimed)
+            )
+            return request_to_response(result.scalar_one())
+    
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Нет свободных заявок"
+    )
+
+
 @router.patch("/{request_id}", response_model=RequestResponse)
 async def update_request(
     request_id: int,
@@ -276,7 +479,9 @@ async def update_request_status(
         )
     
     old_status = request.status
-    request.status = data.status
+    request.set_status(data.status)
+    if user.role != UserRole.RESIDENT and request.assignee_id is None:
+        request.assignee_id = user.id
     
     # Записываем в историю
     history = RequestHistory(
@@ -287,10 +492,12 @@ async def update_request_status(
         changed_by=user.id
     )
     db.add(history)
+    await queue_status_notification(db, request, user)
     
     try:
         await db.commit()
         await db.refresh(request)
+        sla_scheduler.track(db.info["shard"], request)
     except Exception as e:
         print(f"ERROR in update_request_status: {e}")
         print(traceback.format_exc())
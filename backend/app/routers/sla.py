@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, or_
+
+from app.database import get_db
+from app.models.user import User, UserRole
+from app.models.sla import SlaPolicy
+from app.schemas.request import STATUS_LABELS
+from app.schemas.sla import SlaPolicySet, SlaPolicyResponse, SlaPolicyListResponse
+from app.utils.auth import require_role
+from app.utils.sla import sla_scheduler, SLA_STATUSES
+
+router = APIRouter(prefix="/sla", tags=["SLA"])
+
+require_admin = require_role(UserRole.ADMIN, UserRole.SUPER_ADMIN)
+
+
+@router.get("/policies", response_model=SlaPolicyListResponse)
+async def get_policies(
+    user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Правила SLA своей УК и общие правила (для суперадмина - все)"""
+    query = select(SlaPolicy).order_by(SlaPolicy.company_id, SlaPolicy.status, SlaPolicy.category)
+    if user.role != UserRole.SUPER_ADMIN:
+        query = query.where(or_(SlaPolicy.company_id == user.company_id, SlaPolicy.company_id.is_(None)))
+
+    result = await db.execute(query)
+    return SlaPolicyListResponse(
+        items=[SlaPolicyResponse.model_validate(p) for p in result.scalars().all()],
+        timers=len(sla_scheduler)
+    )
+
+
+@router.put("/policies", response_model=SlaPolicyResponse)
+async def set_policy(
+    data: SlaPolicySet,
+    user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Создать или заменить правило для (УК, категория, статус).
+    Таймеры открытых заявок этого процесса пересчитываются сразу.
+    """
+    if data.status not in SLA_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Срок можно задать только для открытых статусов, не «{STATUS_LABELS[data.status]}»"
+        )
+    company_id = data.company_id if user.role == UserRole.SUPER_ADMIN else user.company_id
+    if user.role != UserRole.SUPER_ADMIN and not company_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Сотрудник не привязан к УК"
+        )
+
+    result = await db.execute(
+        select(SlaPolicy).where(
+            SlaPolicy.company_id.is_(company_id) if company_id is None else SlaPolicy.company_id == company_id,
+            SlaPolicy.category.is_(None) if data.category is None else SlaPolicy.category == data.category,
+            SlaPolicy.status == data.status,
+        )
+    )
+    policy = result.scalar_one_or_none()
+    if not policy:
+        policy = SlaPolicy(company_id=company_id, category=data.category, status=data.status)
+        db.add(policy)
+
+    policy.deadline_minutes = data.deadline_minutes
+    policy.notify = data.notify
+    policy.reassign = data.reassign
+    policy.raise_priority = data.raise_priority
+    await db.commit()
+    await db.refresh(policy)
+
+    await sla_scheduler.reload()
+    return SlaPolicyResponse.model_validate(policy)
+
+
+@router.delete("/policies/{policy_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_policy(
+    policy_id: int,
+    user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Удалить правило SLA"""
+    policy = await db.get(SlaPolicy, policy_id)
+    if not policy or (user.role != UserRole.SUPER_ADMIN and policy.company_id != user.company_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Правило не найдено"
+        )
+
+    await db.delete(policy)
+    await db.commit()
+    await sla_scheduler.reload()
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+from app.database import get_db
+from app.models.user import User, UserRole
+from app.models.request import RequestStatus, RequestCategory
+from app.utils.auth import require_role
+from app.utils.rollups import ROLLUPS
+
+router = APIRouter(prefix="/stats", tags=["Статистика"])
+
+
+@router.get("/timeseries")
+async def get_timeseries(
+    granularity: Literal["hour", "day"] = "day",
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    company_id: Optional[int] = None,
+    house_id: Optional[int] = None,
+    category: Optional[RequestCategory] = None,
+    status_filter: Optional[RequestStatus] = Query(None, alias="status"),
+    user: User = Depends(require_role(UserRole.ADMIN, UserRole.DISPATCHER, UserRole.SUPER_ADMIN)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Количество переходов заявок в статусы по часам или дням (из сводных таблиц).
+    Сотрудники УК видят только свою УК, суперадмин - все или выбранную.
+    """
+    if user.role != UserRole.SUPER_ADMIN:
+        if not user.company_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Сотрудник не привязан к УК"
+            )
+        company_id = user.company_id
+    
+    date_to = date_to or datetime.now()
+    date_from = date_from or date_to - timedelta(days=30)
+    if date_from >= date_to or date_to - date_from > timedelta(days=366):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Период должен быть не длиннее года"
+        )
+    
+    rollup = ROLLUPS[granularity]
+    total = func.sum(rollup.count).label("count")
+    query = (
+        select(rollup.bucket, rollup.category, rollup.status, total)
+        .where(rollup.bucket >= date_from, rollup.bucket < date_to)
+        .group_by(rollup.bucket, rollup.category, rollup.status)
+        .order_by(rollup.bucket)
+    )
+    
+    if company_id:
+        query = query.where(rollup.company_id == company_id)
+    if house_id:
+        query = query.where(rollup.house_id == house_id)
+    if category:
+        query = query.where(rollup.category == category)
+    if status_filter:
+        query = query.where(rollup.status == status_filter)
+    
+    result = await db.execute(query)
+    
+    return [
+        {
+            "bucket": bucket.isoformat(),
+            "category": row_category.value,
+            "status": row_status.value,
+            "count": count
+        }
+        for bucket, row_category, row_status, count in result.all()
+    ]
@@ -1,18 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import io
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Literal, Optional
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import DEFAULT_SHARD, get_company_db, get_shard_db, resolve_shard, shards
 from app.models.user import User, UserRole
 from app.models.company import Company
 from app.models.house import House
 from app.models.request import Request, RequestStatus, RequestHistory
 from app.utils.auth import get_current_user
+from app.utils.address_index import address_index
+from app.utils.cache import response_cache, COMPANIES, HOUSES
+from app.utils.bulk_import import import_houses_and_residents, ImportReport
+from app.utils.analytics import sla_report
+from app.utils.notifications import queue_status_notification
+from app.utils.sla import sla_scheduler
+from app.utils.idempotency import IdempotentRoute
+from app.utils.tenant_purge import queue_purge
+from app.utils.invalidation import bus, SHARD_PLACEMENTS
 
-router = APIRouter(prefix="/superadmin", tags=["Super Admin"])
+router = APIRouter(prefix="/superadmin", tags=["Super Admin"], route_class=IdempotentRoute)
 
 
 def require_super_admin(user: User = Depends(get_current_user)) -> User:
@@ -33,6 +45,7 @@ class CompanyCreate(BaseModel):
     phone: Optional[str] = None
     email: Optional[str] = None
     address: Optional[str] = None
+    shard: Optional[str] = None  # settings.shards; by default the company lives in the default shard
 
 class CompanyUpdate(BaseModel):
     name: Optional[str] = None
@@ -43,49 +56,74 @@ class CompanyUpdate(BaseModel):
 
 @router.get("/companies")
 async def list_companies(
-    user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    user: User = Depends(require_super_admin)
 ):
-    """List all companies with stats"""
-    result = await db.execute(
-        select(Company).options(selectinload(Company.houses))
-    )
-    companies = result.scalars().all()
-    
-    response = []
-    for company in companies:
-        # Count houses and users
-        house_count = len(company.houses)
-        user_result = await db.execute(
-            select(func.count(User.id)).where(User.company_id == company.id)
+    """List all companies with stats, from all shards"""
+    async def load(db: AsyncSession):
+        result = await db.execute(
+            select(Company).options(selectinload(Company.houses))
         )
-        user_count = user_result.scalar() or 0
+        companies = result.scalars().all()
         
-        response.append({
-            "id": company.id,
-            "name": company.name,
-            "phone": company.phone,
-            "email": company.email,
-            "address": getattr(company, "address", None), # Safety check
-            "house_count": house_count,
-            "user_count": user_count,
-            "created_at": company.created_at.isoformat() if company.created_at else None
-        })
-    
-    return response
+        rows = []
+        for company in companies:
+            # Count houses and users
+            house_count = len(company.houses)
+            user_result = await db.execute(
+                select(func.count(User.id)).where(User.company_id == company.id)
+            )
+            user_count = user_result.scalar() or 0
+            
+            rows.append({
+                "id": company.id,
+                "name": company.name,
+                "phone": company.phone,
+                "email": company.email,
+                "address": getattr(company, "address", None), # Safety check
+                "house_count": house_count,
+                "user_count": user_count,
+                "created_at": company.created_at.isoformat() if company.created_at else None
+            })
+        return rows
+    
+    # The default shard keeps a directory row for companies placed elsewhere: skip it
+    response = [
+        dict(row, shard=shard)
+        for shard, rows in await shards.fan_out(load)
+        for row in rows
+        if shards.shard_for_company(row["id"]) == shard
+    ]
+    return sorted(response, key=lambda row: row["id"])
 
 
 @router.post("/companies", status_code=status.HTTP_201_CREATED)
 async def create_company(
     data: CompanyCreate,
-    user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    user: User = Depends(require_super_admin)
 ):
-    """Create a new company"""
-    company = Company(**data.model_dump())
-    db.add(company)
-    await db.commit()
-    await db.refresh(company)
+    """
+    Create a new company. With `shard` the company data lives in that shard;
+    the id is allocated by a directory row in the default shard, so it stays unique.
+    """
+    shard = data.shard or DEFAULT_SHARD
+    if shard not in shards.names:
+        raise HTTPException(status_code=400, detail="Неизвестный шард")
+    
+    async with shards.session() as directory:
+        company = Company(**data.model_dump(exclude={"shard"}))
+        directory.add(company)
+        await directory.flush()
+        if shard != DEFAULT_SHARD:
+            # The shard row first: until the placement is written nothing is routed to it
+            async with shards.session(shard) as shard_db:
+                shard_db.add(Company(id=company.id, **data.model_dump(exclude={"shard"})))
+                await shard_db.commit()
+        await directory.commit()
+        await directory.refresh(company)
+    if shard != DEFAULT_SHARD:
+        await shards.place(company.id, shard)
+        bus.publish(SHARD_PLACEMENTS)
+    await response_cache.invalidate(COMPANIES)
     
     return {
         "id": company.id,
@@ -101,7 +139,7 @@ async def update_company(
     company_id: int,
     data: CompanyUpdate,
     user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_company_db)
 ):
     """Update a company"""
     result = await db.execute(select(Company).where(Company.id == company_id))
@@ -116,6 +154,12 @@ async def update_company(
     
     await db.commit()
     await db.refresh(company)
+    if update_data and shards.shard_for_company(company_id) != DEFAULT_SHARD:
+        # Keep the directory row (public company list) in sync
+        async with shards.session() as directory:
+            await directory.execute(update(Company).where(Company.id == company_id).values(**update_data))
+            await directory.commit()
+    await response_cache.invalidate(COMPANIES)
     
     return {
         "id": company.id,
@@ -130,17 +174,39 @@ async def update_company(
 async def delete_company(
     company_id: int,
     user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_company_db)
 ):
-    """Delete a company"""
-    result = await db.execute(select(Company).where(Company.id == company_id))
-    company = result.scalar_one_or_none()
+    """Delete a company; houses and their rows are removed by ON DELETE cascades"""
+    result = await db.execute(delete(Company).where(Company.id == company_id))
     
-    if not company:
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="УК не найдена")
+    
+    await db.commit()
+    if shards.shard_for_company(company_id) != DEFAULT_SHARD:
+        await shards.forget(company_id)
+        bus.publish(SHARD_PLACEMENTS)
+    address_index.remove_company(company_id)
+    await response_cache.invalidate(COMPANIES, HOUSES)
+
+
+@router.post("/companies/{company_id}/purge", status_code=status.HTTP_202_ACCEPTED)
+async def purge_company(
+    company_id: int,
+    user: User = Depends(require_super_admin),
+    db: AsyncSession = Depends(get_company_db)
+):
+    """
+    Delete a company with all its requests and houses in the background,
+    in small batches. Use for large companies instead of DELETE.
+    `status` is the purge job's: pending (queued now or still waiting) or running.
+    """
+    if not await db.get(Company, company_id):
         raise HTTPException(status_code=404, detail="УК не найдена")
     
-    await db.delete(company)
+    job_id, job_status = await queue_purge(db, company_id)
     await db.commit()
+    return {"company_id": company_id, "job_id": job_id, "status": job_status.value}
 
 
 # ============== HOUSES ==============
@@ -159,55 +225,67 @@ class HouseUpdate(BaseModel):
 @router.get("/houses")
 async def list_houses(
     company_id: Optional[int] = None,
-    user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    user: User = Depends(require_super_admin)
 ):
-    """List all houses with optional company filter"""
+    """List all houses with optional company filter, from all shards (or the company's one)"""
     query = select(House).options(selectinload(House.company))
     
     if company_id:
         query = query.where(House.company_id == company_id)
     
-    result = await db.execute(query.order_by(House.id))
-    houses = result.scalars().all()
-    
-    response = []
-    for house in houses:
-        # Count residents
-        resident_result = await db.execute(
-            select(func.count(User.id)).where(User.house_id == house.id)
-        )
-        resident_count = resident_result.scalar() or 0
+    async def load(db: AsyncSession):
+        result = await db.execute(query.order_by(House.id))
+        houses = result.scalars().all()
         
-        response.append({
-            "id": house.id,
-            "address": house.address,
-            "apartment_count": house.apartment_count,
-            "company_id": house.company_id,
-            "company_name": house.company.name if house.company else None,
-            "resident_count": resident_count,
-            "created_at": house.created_at.isoformat() if house.created_at else None
-        })
+        rows = []
+        for house in houses:
+            # Count residents
+            resident_result = await db.execute(
+                select(func.count(User.id)).where(User.house_id == house.id)
+            )
+            resident_count = resident_result.scalar() or 0
+            
+            rows.append({
+                "id": house.id,
+                "address": house.address,
+                "apartment_count": house.apartment_count,
+                "company_id": house.company_id,
+                "company_name": house.company.name if house.company else None,
+                "resident_count": resident_count,
+                "created_at": house.created_at.isoformat() if house.created_at else None
+            })
+        return rows
     
-    return response
+    if company_id:
+        shard = shards.shard_for_company(company_id)
+        async with shards.session(shard) as shard_db:
+            return [dict(row, shard=shard) for row in await load(shard_db)]
+    
+    return [dict(row, shard=shard) for shard, rows in await shards.fan_out(load) for row in rows]
 
 
 @router.post("/houses", status_code=status.HTTP_201_CREATED)
 async def create_house(
     data: HouseCreate,
-    user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    user: User = Depends(require_super_admin)
 ):
-    """Create a new house"""
-    # Verify company exists
-    result = await db.execute(select(Company).where(Company.id == data.company_id))
-    if not result.scalar_one_or_none():
-        raise HTTPException(status_code=404, detail="УК не найдена")
-    
-    house = House(**data.model_dump())
-    db.add(house)
-    await db.commit()
-    await db.refresh(house)
+    """Create a new house in the company's shard"""
+    async with shards.session(shards.shard_for_company(data.company_id)) as db:
+        # Verify company exists
+        result = await db.execute(select(Company).where(Company.id == data.company_id))
+        if not result.scalar_one_or_none():
+            raise HTTPException(status_code=404, detail="УК не найдена")
+        
+        house = House(**data.model_dump())
+        db.add(house)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Дом с таким адресом в этой УК уже существует")
+        await db.refresh(house)
+    address_index.add(db.info["shard"], house.id, house.company_id, house.address)
+    await response_cache.invalidate(HOUSES, COMPANIES)
     
     return {
         "id": house.id,
@@ -222,9 +300,9 @@ async def update_house(
     house_id: int,
     data: HouseUpdate,
     user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_shard_db)
 ):
-    """Update a house"""
+    """Update a house in the shard given by `shard` (house ids repeat across shards)"""
     result = await db.execute(select(House).where(House.id == house_id))
     house = result.scalar_one_or_none()
     
@@ -235,8 +313,14 @@ async def update_house(
     for field, value in update_data.items():
         setattr(house, field, value)
     
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Дом с таким адресом в этой УК уже существует")
     await db.refresh(house)
+    address_index.add(db.info["shard"], house.id, house.company_id, house.address)
+    await response_cache.invalidate(HOUSES, COMPANIES)
     
     return {
         "id": house.id,
@@ -250,17 +334,38 @@ async def update_house(
 async def delete_house(
     house_id: int,
     user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_shard_db)
 ):
-    """Delete a house"""
-    result = await db.execute(select(House).where(House.id == house_id))
-    house = result.scalar_one_or_none()
+    """Delete a house in the shard given by `shard`; residents are detached by ON DELETE SET NULL"""
+    result = await db.execute(delete(House).where(House.id == house_id))
     
-    if not house:
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Дом не найден")
     
-    await db.delete(house)
     await db.commit()
+    address_index.remove(db.info["shard"], house_id)
+    await response_cache.invalidate(HOUSES, COMPANIES)
+
+
+# ============== IMPORT ==============
+
+@router.post("/import", response_model=ImportReport)
+async def import_csv(
+    file: UploadFile = File(...),
+    user: User = Depends(require_super_admin)
+):
+    """
+    Bulk import houses and residents from CSV.
+    Columns: company_id, address, apartment_count, telegram_id, first_name,
+    last_name, username, phone, apartment. Returns a per-row error report.
+    Each row is written to the shard of its company; a resident whose telegram_id
+    already exists on another shard is reported as an error.
+    """
+    data = await file.read()
+    async with shards.session() as directory:
+        report = await import_houses_and_residents(directory, io.BytesIO(data))
+    await response_cache.invalidate(HOUSES, COMPANIES)
+    return report
 
 
 # ============== USERS ==============
@@ -276,10 +381,9 @@ class UserUpdate(BaseModel):
 async def list_users(
     role: Optional[str] = None,
     company_id: Optional[int] = None,
-    user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    user: User = Depends(require_super_admin)
 ):
-    """List all users with optional filters"""
+    """List all users with optional filters, from all shards"""
     query = select(User).options(
         selectinload(User.house),
         selectinload(User.company)
@@ -290,29 +394,29 @@ async def list_users(
     if company_id:
         query = query.where(User.company_id == company_id)
     
-    result = await db.execute(query.order_by(User.id))
-    users = result.scalars().all()
-    
-    response = []
-    for u in users:
-        response.append({
-            "id": u.id,
-            "telegram_id": u.telegram_id,
-            "username": u.username,
-            "first_name": u.first_name,
-            "last_name": u.last_name,
-            "full_name": u.full_name,
-            "phone": u.phone,
-            "role": u.role.value if u.role else None,
-            "house_id": u.house_id,
-            "house_address": u.house.address if u.house else None,
-            "apartment": u.apartment,
-            "company_id": u.company_id,
-            "company_name": u.company.name if u.company else None,
-            "created_at": u.created_at.isoformat() if u.created_at else None
-        })
-    
-    return response
+    async def load(db: AsyncSession):
+        result = await db.execute(query.order_by(User.id))
+        return [
+            {
+                "id": u.id,
+                "telegram_id": u.telegram_id,
+                "username": u.username,
+                "first_name": u.first_name,
+                "last_name": u.last_name,
+                "full_name": u.full_name,
+                "phone": u.phone,
+                "role": u.role.value if u.role else None,
+                "house_id": u.house_id,
+                "house_address": u.house.address if u.house else None,
+                "apartment": u.apartment,
+                "company_id": u.company_id,
+                "company_name": u.company.name if u.company else None,
+                "created_at": u.created_at.isoformat() if u.created_at else None
+            }
+            for u in result.scalars().all()
+        ]
+    
+    return [dict(row, shard=shard) for shard, rows in await shards.fan_out(load) for row in rows]
 
 
 @router.patch("/users/{user_id}")
@@ -320,9 +424,9 @@ async def update_user(
     user_id: int,
     data: UserUpdate,
     user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_shard_db)
 ):
-    """Update user role/company/house"""
+    """Update user role/company/house in the shard given by `shard`"""
     result = await db.execute(select(User).where(User.id == user_id))
     target_user = result.scalar_one_or_none()
     
@@ -350,19 +454,17 @@ async def update_user(
 async def delete_user(
     user_id: int,
     user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_shard_db)
 ):
-    """Delete a user"""
-    result = await db.execute(select(User).where(User.id == user_id))
-    target_user = result.scalar_one_or_none()
+    """Delete a user in the shard given by `shard`; their requests and history are removed by ON DELETE cascades"""
+    if user_id == user.id and db.info["shard"] == DEFAULT_SHARD:
+        raise HTTPException(status_code=400, detail="Нельзя удалить себя")
     
-    if not target_user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    result = await db.execute(delete(User).where(User.id == user_id))
     
-    if target_user.id == user.id:
-        raise HTTPException(status_code=400, detail="Нельзя удалить себя")
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
     
-    await db.delete(target_user)
     await db.commit()
 
 
@@ -373,9 +475,9 @@ async def cancel_request(
     request_id: int,
     comment: str = "Отменено супер-администратором",
     user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_shard_db)
 ):
-    """Cancel any request (super admin only)"""
+    """Cancel any request in the shard given by `shard` (super admin only)"""
     result = await db.execute(select(Request).where(Request.id == request_id))
     request = result.scalar_one_or_none()
     
@@ -386,7 +488,7 @@ async def cancel_request(
         raise HTTPException(status_code=400, detail="Заявка уже отменена")
     
     old_status = request.status
-    request.status = RequestStatus.CANCELLED
+    request.set_status(RequestStatus.CANCELLED)
     
     # Add to history
     history = RequestHistory(
@@ -397,8 +499,10 @@ async def cancel_request(
         changed_by=user.id
     )
     db.add(history)
+    await queue_status_notification(db, request, user)
     
     await db.commit()
+    sla_scheduler.cancel(db.info["shard"], request.id)
     
     return {"message": "Заявка отменена"}
 
@@ -407,38 +511,64 @@ async def cancel_request(
 
 @router.get("/stats")
 async def get_stats(
-    user: User = Depends(require_super_admin),
-    db: AsyncSession = Depends(get_db)
+    user: User = Depends(require_super_admin)
 ):
-    """Get global statistics"""
-    # Companies count
-    company_result = await db.execute(select(func.count(Company.id)))
-    company_count = company_result.scalar() or 0
-    
-    # Houses count
-    house_result = await db.execute(select(func.count(House.id)))
-    house_count = house_result.scalar() or 0
-    
-    # Users count
-    user_result = await db.execute(select(func.count(User.id)))
-    user_count = user_result.scalar() or 0
-    
-    # Requests by status
-    requests_by_status = {}
-    for status in RequestStatus:
-        result = await db.execute(
-            select(func.count(Request.id)).where(Request.status == status)
-        )
-        requests_by_status[status.value] = result.scalar() or 0
+    """Get global statistics, summed over all shards"""
+    async def load(db: AsyncSession):
+        # Company ids, not a count: companies placed in other shards also have a directory row in default
+        company_ids = set((await db.execute(select(Company.id))).scalars().all())
+        
+        # Houses count
+        house_result = await db.execute(select(func.count(House.id)))
+        house_count = house_result.scalar() or 0
+        
+        # Users count
+        user_result = await db.execute(select(func.count(User.id)))
+        user_count = user_result.scalar() or 0
+        
+        # Requests by status
+        status_result = await db.execute(select(Request.status, func.count(Request.id)).group_by(Request.status))
+        return company_ids, house_count, user_count, dict(status_result.all())
+    
+    results = [result for _, result in await shards.fan_out(load)]
     
+    requests_by_status = {
+        status.value: sum(by_status.get(status, 0) for _, _, _, by_status in results)
+        for status in RequestStatus
+    }
     total_requests = sum(requests_by_status.values())
     
     return {
-        "companies": company_count,
-        "houses": house_count,
-        "users": user_count,
+        "companies": len(set().union(*(company_ids for company_ids, _, _, _ in results))),
+        "houses": sum(house_count for _, house_count, _, _ in results),
+        "users": sum(user_count for _, _, user_count, _ in results),
         "requests": {
             "total": total_requests,
             "by_status": requests_by_status
         }
     }
+
+
+@router.get("/analytics")
+async def get_analytics(
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    group_by: Literal["company", "house", "category", "dispatcher"] = "company",
+    company_id: Optional[int] = None,
+    shard: Optional[str] = None,
+    user: User = Depends(require_super_admin)
+):
+    """
+    SLA metrics (time to accept/complete percentiles, reopen rate), last 30 days by default.
+    Percentiles do not add up across shards: the report covers the shard of `company_id`,
+    or the shard given by `shard`.
+    """
+    date_to = date_to or datetime.now()
+    date_from = date_from or date_to - timedelta(days=30)
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="Неверный период")
+    
+    if company_id is not None:
+        shard = shards.shard_for_company(company_id)
+    async with shards.session(resolve_shard(shard)) as db:
+        return await sla_report(db, date_from, date_to, group_by, company_id)
@@ -2,10 +2,12 @@ from app.schemas.user import UserCreate, UserUpdate, UserResponse, UserAuth
 from app.schemas.company import CompanyCreate, CompanyUpdate, CompanyResponse
 from app.schemas.house import HouseCreate, HouseUpdate, HouseResponse
 from app.schemas.request import RequestCreate, RequestUpdate, RequestResponse, RequestStatusUpdate
+from app.schemas.broadcast import BroadcastCreate, BroadcastResponse
 
 __all__ = [
     "UserCreate", "UserUpdate", "UserResponse", "UserAuth",
     "CompanyCreate", "CompanyUpdate", "CompanyResponse",
     "HouseCreate", "HouseUpdate", "HouseResponse",
     "RequestCreate", "RequestUpdate", "RequestResponse", "RequestStatusUpdate",
+    "BroadcastCreate", "BroadcastResponse",
 ]
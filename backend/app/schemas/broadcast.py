@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+from app.models.broadcast import BroadcastStatus
+
+
+class BroadcastCreate(BaseModel):
+    text: str = Field(..., min_length=1, max_length=4000)
+    house_id: Optional[int] = None    # None = всем жильцам УК
+    company_id: Optional[int] = None  # только для суперадмина
+
+
+class BroadcastResponse(BaseModel):
+    id: int
+    company_id: int
+    house_id: Optional[int]
+    text: str
+    status: BroadcastStatus
+    total: int
+    sent: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
+
+
+class BroadcastListResponse(BaseModel):
+    items: List[BroadcastResponse]
+    total: int
@@ -28,3 +28,10 @@ class HouseResponse(BaseModel):
 class HouseListResponse(BaseModel):
     items: List[HouseResponse]
     total: int
+
+
+class HouseSuggestion(BaseModel):
+    id: int
+    company_id: int
+    address: str
+    shard: str  # id домов в разных шардах совпадают
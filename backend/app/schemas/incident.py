@@ -0,0 +1,35 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+from app.models.request import RequestStatus, RequestCategory
+from app.schemas.request import RequestResponse
+
+
+class IncidentStatusUpdate(BaseModel):
+    status: RequestStatus
+    comment: Optional[str] = None
+
+
+class IncidentResponse(BaseModel):
+    id: int
+    house_id: int
+    category: RequestCategory
+    title: str
+    status: RequestStatus
+    request_count: int
+    created_at: datetime
+    last_request_at: datetime
+    
+    house_address: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class IncidentDetailResponse(IncidentResponse):
+    requests: List[RequestResponse] = []
+
+
+class IncidentListResponse(BaseModel):
+    items: List[IncidentResponse]
+    total: int
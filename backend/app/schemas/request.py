@@ -39,6 +39,9 @@ class RequestResponse(BaseModel):
     title: str
     description: Optional[str]
     status: RequestStatus
+    incident_id: Optional[int] = None
+    assignee_id: Optional[int] = None
+    priority: int = 0
     is_paid: int
     payment_status: Optional[str]
     created_at: datetime
@@ -57,6 +60,7 @@ class RequestResponse(BaseModel):
 class RequestListResponse(BaseModel):
     items: List[RequestResponse]
     total: int
+    shard: Optional[str] = None  # шард, из которого прочитан список (для операций суперадмина по id)
 
 
 # Категории для фронтенда
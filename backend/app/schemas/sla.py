@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+from app.models.request import RequestStatus, RequestCategory
+
+
+class SlaPolicySet(BaseModel):
+    company_id: Optional[int] = None        # только для суперадмина; None - для всех УК
+    category: Optional[RequestCategory] = None  # None - для всех категорий
+    status: RequestStatus
+    deadline_minutes: int = Field(..., ge=1, le=60 * 24 * 90)
+    notify: bool = True
+    reassign: bool = False
+    raise_priority: bool = False
+
+
+class SlaPolicyResponse(BaseModel):
+    id: int
+    company_id: Optional[int]
+    category: Optional[RequestCategory]
+    status: RequestStatus
+    deadline_minutes: int
+    notify: bool
+    reassign: bool
+    raise_priority: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class SlaPolicyListResponse(BaseModel):
+    items: List[SlaPolicyResponse]
+    timers: int  # активных таймеров в этом процессе
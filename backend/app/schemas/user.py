@@ -28,6 +28,7 @@ class UserCreate(BaseModel):
 class UserUpdate(BaseModel):
     phone: Optional[str] = None
     house_id: Optional[int] = None
+    house_company_id: Optional[int] = None  # УК дома: по ней выбирается шард (id домов в шардах совпадают)
     apartment: Optional[str] = None
 
 
@@ -0,0 +1,374 @@
+"""
+In-memory индекс адресов домов для автодополнения (GET /api/houses/suggest).
+
+Адреса нормализуются ("улица" -> "ул", "дом" -> "д", "ё" -> "е" и т.д.) и
+разбиваются на токены. Для каждого токена хранятся id домов, отсортированные
+по адресу, отдельно по каждой УК и по всем УК вместе, поэтому подсказки берутся
+с начала уже упорядоченных списков, не перебирая все дома. Префикс запроса
+раскрывается в токены словаря бинарным поиском; первые TOP_CAP домов префикса
+кэшируются. Для опечаток есть запасной поиск токенов словаря по триграммам.
+
+Индекс строится в пуле потоков (run_in_executor) по домам всех шардов и
+обновляется обработчиками создания/изменения/удаления домов (в других
+процессах API - через app/utils/invalidation.py). id домов в разных шардах
+совпадают, поэтому дом снаружи - пара (шард, id), а внутри индекса - одно
+число с номером шарда в старших битах: множества и сортировки идут по int.
+"""
+import asyncio
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import islice
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import shards
+from app.models.house import House
+from app.utils.invalidation import bus, ADDRESS_INDEX
+
+# Варианты написания типов улиц и частей адреса приводим к одному виду
+ABBREVIATIONS = {
+    "улица": "ул",
+    "дом": "д",
+    "проспект": "пр",
+    "просп": "пр",
+    "пр-т": "пр",
+    "переулок": "пер",
+    "бульвар": "б-р",
+    "бул": "б-р",
+    "шоссе": "ш",
+    "площадь": "пл",
+    "набережная": "наб",
+    "проезд": "пр-д",
+    "корпус": "к",
+    "корп": "к",
+    "строение": "стр",
+    "город": "г",
+}
+
+# Служебные токены встречаются почти в каждом адресе и ничего не различают:
+# они остаются в нормализованной строке, но не попадают в индекс
+STOP_TOKENS = set(ABBREVIATIONS.values())
+
+# Сколько первых домов префикса держать в кэше (не меньше максимального limit подсказок)
+TOP_CAP = 64
+TRIGRAM_MIN_SCORE = 0.3
+# Сколько похожих токенов словаря подставлять вместо токена с опечаткой
+TRIGRAM_MAX_WORDS = 20
+
+# Слова и числа, дефис допускается только внутри ("пр-т", "б-р")
+_TOKEN_RE = re.compile(r"\w+(?:-+\w+)*", re.UNICODE)
+_PREFIX_END = "\uffff"
+
+
+def normalize_tokens(address: str) -> List[str]:
+    """Разбить адрес на нормализованные токены"""
+    text = address.lower().replace("ё", "е")
+    return [ABBREVIATIONS.get(token, token) for token in _TOKEN_RE.findall(text)]
+
+
+def index_tokens(address: str) -> List[str]:
+    """Токены адреса, которые попадают в индекс (без служебных и повторов)"""
+    return list(dict.fromkeys(t for t in normalize_tokens(address) if t not in STOP_TOKENS))
+
+
+# Ссылка на дом: номер шарда << HOUSE_ID_BITS | house_id. Номер в старших битах:
+# младшие биты - хэш int в множествах, у шарда default ссылка равна id дома
+HOUSE_ID_BITS = 40
+_shard_numbers: Dict[str, int] = {}
+_shard_names: List[str] = []
+_shard_lock = threading.Lock()
+
+
+def _ref(shard: str, house_id: int) -> int:
+    """Ссылка на дом внутри индекса (номера шардов раздаются по мере появления)"""
+    number = _shard_numbers.get(shard)
+    if number is None:
+        with _shard_lock:
+            number = _shard_numbers.get(shard)
+            if number is None:
+                number = _shard_numbers[shard] = len(_shard_names)
+                _shard_names.append(shard)
+    return number << HOUSE_ID_BITS | house_id
+
+
+def _unref(ref: int) -> Tuple[str, int]:
+    return _shard_names[ref >> HOUSE_ID_BITS], ref & ((1 << HOUSE_ID_BITS) - 1)
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AddressIndex:
+    """Индекс адресов домов: отсортированные списки домов по токенам, по УК"""
+
+    def __init__(self):
+        # ссылка на дом (_ref) -> (company_id, address, ключ сортировки, токены)
+        self._houses: Dict[int, Tuple[int, str, Tuple[str, int], List[str]]] = {}
+        # УК (None - все УК) -> токен -> ссылки на дома по возрастанию ключа сортировки
+        self._postings: Dict[Optional[int], Dict[str, List[int]]] = {None: {}}
+        self._vocabulary: List[str] = []  # все токены, по алфавиту
+        self._trigrams: Dict[str, Set[str]] = {}  # триграмма -> токены словаря
+        self._top: Dict[Tuple[Optional[int], str], List[int]] = {}  # (УК, префикс) -> первые TOP_CAP домов
+        self._pending: Optional[list] = None  # изменения, пришедшие во время перестроения
+        self.ready = False  # индекс загружен из БД (до этого подсказки - запросом к БД)
+        self._rebuild_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._houses)
+
+    def _key(self, house_id: int) -> Tuple[str, int]:
+        return self._houses[house_id][2]
+
+    def rebuild(self, houses: Iterable[Tuple[str, int, int, str]]):
+        """Перестроить индекс из (шард, id, company_id, address)"""
+        self._set_state(_build(houses))
+
+    async def rebuild_in_executor(self, load: Callable[[], Awaitable[Iterable[Tuple[str, int, int, str]]]]):
+        """
+        Прочитать дома (load) и перестроить индекс в пуле потоков, не занимая event loop.
+        Изменения, пришедшие за это время, применяются к готовому индексу.
+        """
+        async with self._rebuild_lock:
+            self._pending = []
+            try:
+                houses = await load()
+                state = await asyncio.get_running_loop().run_in_executor(None, _build, houses)
+            finally:
+                pending, self._pending = self._pending, None
+            self._set_state(state)
+            for event in pending:
+                self.apply(event)
+            self.ready = True
+
+    def _set_state(self, state):
+        self._houses, self._postings, self._vocabulary, self._trigrams = state
+        self._top = {}
+
+    def clear(self):
+        self._set_state(({}, {None: {}}, [], {}))
+
+    def add(self, shard: str, house_id: int, company_id: int, address: str):
+        """Добавить или обновить дом шарда"""
+        self._add(shard, house_id, company_id, address)
+        bus.publish(ADDRESS_INDEX, ["add", shard, house_id, company_id, address])
+
+    def remove(self, shard: str, house_id: int):
+        """Удалить дом шарда из индекса (если он там есть)"""
+        self._remove(shard, house_id)
+        bus.publish(ADDRESS_INDEX, ["remove", shard, house_id])
+
+    def remove_company(self, company_id: int):
+        """Удалить все дома УК (каскадное удаление компании)"""
+        self._remove_company(company_id)
+        bus.publish(ADDRESS_INDEX, ["remove_company", company_id])
+
+    def apply(self, event: list):
+        """Изменение из другого процесса (см. app/utils/invalidation.py)"""
+        op, *args = event
+        {"add": self._add, "remove": self._remove, "remove_company": self._remove_company}[op](*args)
+
+    def _add(self, shard: str, house_id: int, company_id: int, address: str):
+        self._remove(shard, house_id)
+        if self._pending is not None:
+            self._pending.append(["add", shard, house_id, company_id, address])
+        tokens = index_tokens(address)
+        house_id = _ref(shard, house_id)
+        self._houses[house_id] = (company_id, address, (" ".join(tokens), house_id), tokens)
+        for part in (None, company_id):
+            postings = self._postings.setdefault(part, {})
+            for token in tokens:
+                if token not in postings:
+                    postings[token] = []
+                    if part is None:
+                        insort(self._vocabulary, token)
+                        for gram in _trigrams(token):
+                            self._trigrams.setdefault(gram, set()).add(token)
+                insort(postings[token], house_id, key=self._key)
+        self._forget_top(company_id, tokens)
+
+    def _remove(self, shard: str, house_id: int):
+        if self._pending is not None:
+            self._pending.append(["remove", shard, house_id])
+        house_id = _ref(shard, house_id)
+        house = self._houses.get(house_id)
+        if house is None:
+            return
+        company_id, _, key, tokens = house
+        for part in (None, company_id):
+            postings = self._postings[part]
+            for token in tokens:
+                ids = postings[token]
+                del ids[bisect_left(ids, key, key=self._key)]
+                if ids:
+                    continue
+                del postings[token]
+                if part is None:
+                    del self._vocabulary[bisect_left(self._vocabulary, token)]
+                    for gram in _trigrams(token):
+                        self._trigrams[gram].discard(token)
+                        if not self._trigrams[gram]:
+                            del self._trigrams[gram]
+            if not postings and part is not None:
+                del self._postings[part]
+        del self._houses[house_id]
+        self._forget_top(company_id, tokens)
+
+    def _remove_company(self, company_id: int):
+        if self._pending is not None:
+            self._pending.append(["remove_company", company_id])
+        postings = self._postings.get(company_id, {})
+        for ref in {h for ids in postings.values() for h in ids}:
+            self._remove(*_unref(ref))
+
+    def _forget_top(self, company_id: int, tokens: List[str]):
+        """Сбросить кэш префиксов, в которые входит дом"""
+        if not self._top:
+            return
+        for token in tokens:
+            for i in range(1, len(token) + 1):
+                self._top.pop((None, token[:i]), None)
+                self._top.pop((company_id, token[:i]), None)
+
+    def _words(self, prefix: str) -> List[str]:
+        """Токены словаря, начинающиеся с prefix"""
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + _PREFIX_END, lo=start)
+        return self._vocabulary[start:end]
+
+    def _similar(self, token: str) -> List[str]:
+        """Токены словаря, похожие на token по триграммам (для опечаток)"""
+        grams = _trigrams(token)
+        scores = Counter()
+        for gram in grams:
+            scores.update(self._trigrams.get(gram, ()))
+        return [
+            word for word, score in scores.most_common(TRIGRAM_MAX_WORDS)
+            if score / len(grams) >= TRIGRAM_MIN_SCORE
+        ]
+
+    def suggest(self, q: str, company_id: Optional[int] = None, limit: int = 10) -> List[Tuple[str, int, int, str]]:
+        """Найти дома по началу адреса, возвращает список (шард, id, company_id, address)"""
+        tokens = index_tokens(q)
+        postings = self._postings.get(company_id)
+        if not tokens or not postings:
+            return []
+
+        # Каждый токен запроса -> токены словаря: по префиксу, а если таких нет - похожие
+        matches = []
+        for token in tokens:
+            words = [w for w in self._words(token) if w in postings]
+            if words:
+                matches.append((token, words))
+                continue
+            words = [w for w in self._similar(token) if w in postings]
+            if not words:
+                return []
+            matches.append((None, words))
+
+        # Первые TOP_CAP домов самого редкого токена идут по порядку адресов: проверяем их по токенам дома
+        matches.sort(key=lambda m: sum(len(postings[w]) for w in m[1]))
+        (prefix, words), rest = matches[0], [words for _, words in matches[1:]]
+        rest_sets = [set(words) for words in rest]
+        top = self._top_ids(company_id, prefix, words)
+        result = [h for h in top if all(not ws.isdisjoint(self._houses[h][3]) for ws in rest_sets)][:limit]
+
+        # Дальше - пересечение множеств домов и limit наименьших по адресу
+        if len(result) < limit and len(top) == TOP_CAP:
+            candidates = set().union(*(postings[w] for w in words)).difference(top)
+            for other in rest:
+                candidates = set().union(*(candidates.intersection(postings[w]) for w in other))
+            result += heapq.nsmallest(limit - len(result), candidates, key=self._key)
+
+        return [(*_unref(h), self._houses[h][0], self._houses[h][1]) for h in result]
+
+    def _top_ids(self, company_id: Optional[int], prefix: Optional[str], words: List[str]) -> List[int]:
+        """Первые TOP_CAP домов с любым из words по порядку адресов (для префикса - из кэша)"""
+        postings = self._postings[company_id]
+        if len(words) == 1:
+            return postings[words[0]][:TOP_CAP]
+        top = self._top.get((company_id, prefix)) if prefix is not None else None
+        if top is None:
+            merged = heapq.merge(*(postings[w] for w in words), key=self._key)
+            top = list(islice(_unique(merged), TOP_CAP))
+            if prefix is not None:
+                self._top[(company_id, prefix)] = top
+        return top
+
+
+def _unique(ids: Iterable[int]) -> Iterator[int]:
+    """Убрать повторы из слияния (дом с несколькими токенами одного префикса)"""
+    previous = None
+    for house_id in ids:
+        if house_id != previous:
+            yield house_id
+            previous = house_id
+
+
+def _build(houses: Iterable[Tuple[str, int, int, str]]):
+    """Собрать состояние индекса с нуля: один проход по домам, отсортированным по адресу"""
+    records = {}
+    for shard, house_id, company_id, address in houses:
+        tokens = index_tokens(address)
+        house_id = _ref(shard, house_id)
+        records[house_id] = (company_id, address, (" ".join(tokens), house_id), tokens)
+    everyone = defaultdict(list)
+    companies = defaultdict(lambda: defaultdict(list))
+    for house_id, (company_id, _, _, tokens) in sorted(records.items(), key=lambda item: item[1][2]):
+        company = companies[company_id]
+        for token in tokens:
+            everyone[token].append(house_id)
+            company[token].append(house_id)
+    postings: Dict[Optional[int], Dict[str, List[int]]] = {None: dict(everyone)}
+    postings.update((company_id, dict(company)) for company_id, company in companies.items())
+    vocabulary = sorted(everyone)
+    trigrams: Dict[str, Set[str]] = {}
+    for token in vocabulary:
+        for gram in _trigrams(token):
+            trigrams.setdefault(gram, set()).add(token)
+    return records, postings, vocabulary, trigrams
+
+
+address_index = AddressIndex()
+bus.subscribe(ADDRESS_INDEX, address_index.apply)
+
+
+async def load_address_index():
+    """Загрузить дома всех шардов в индекс (фоном после старта приложения, см. app/main.py)"""
+    async def load(db: AsyncSession):
+        return (await db.execute(select(House.id, House.company_id, House.address))).all()
+
+    async def houses():
+        return [(shard, *row) for shard, rows in await shards.fan_out(load) for row in rows]
+
+    await address_index.rebuild_in_executor(houses)
+    print(f"ADDRESS INDEX: loaded {len(address_index)} houses.")
+
+
+async def suggest_from_db(q: str, company_id: Optional[int] = None, limit: int = 10) -> List[Tuple[str, int, int, str]]:
+    """Подсказки, пока индекс загружается: адреса, содержащие все слова запроса (со всех шардов или из шарда УК)"""
+    tokens = index_tokens(q)
+    if not tokens:
+        return []
+    query = select(House.id, House.company_id, House.address)
+    for token in tokens:
+        query = query.where(House.address.icontains(token, autoescape=True))
+    if company_id is not None:
+        query = query.where(House.company_id == company_id)
+    query = query.order_by(House.address).limit(limit)
+
+    async def load(db: AsyncSession):
+        return (await db.execute(query)).all()
+
+    if company_id is not None:
+        shard = shards.shard_for_company(company_id)
+        async with shards.session(shard) as db:
+            return [(shard, *row) for row in await load(db)]
+    houses = [(shard, *row) for shard, rows in await shards.fan_out(load) for row in rows]
+    return sorted(houses, key=lambda house: house[3])[:limit]
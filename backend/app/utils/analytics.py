@@ -0,0 +1,209 @@
+"""
+SLA-аналитика по истории статусов (GET /api/superadmin/analytics).
+
+Время до принятия, время до выполнения и доля переоткрытых заявок считаются
+одним агрегирующим запросом по request_history: сначала условная агрегация
+сворачивает историю каждой заявки в одну строку, затем строки группируются
+по выбранному измерению. На PostgreSQL перцентили считает percentile_cont,
+на SQLite (нет перцентильных агрегатов) - statistics.quantiles по результату.
+"""
+import statistics
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, func, case, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.company import Company
+from app.models.house import House
+from app.models.user import User
+from app.models.request import Request, RequestHistory, RequestStatus, RequestCategory
+from app.schemas.request import CATEGORY_LABELS
+
+PERCENTILES = (0.5, 0.9, 0.95)
+
+
+def _seconds_between(dialect: str, start, end):
+    if dialect == "postgresql":
+        return func.extract("epoch", end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+
+def _per_request(dialect: str, date_from: datetime, date_to: datetime, company_id: Optional[int]):
+    """
+    Одна строка на заявку: измерения, длительности и флаг переоткрытия.
+    УК и дом - те, откуда подана заявка (жилец мог с тех пор переехать), диспетчер -
+    автор первого перехода в ACCEPTED: оконная функция ставит переходы в ACCEPTED
+    первыми, так что история читается один раз.
+    """
+    accepted = RequestHistory.new_status == RequestStatus.ACCEPTED
+    events = (
+        select(
+            Request.id,
+            Request.company_id,
+            Request.house_id,
+            Request.category,
+            Request.created_at.label("request_created_at"),
+            RequestHistory.new_status,
+            RequestHistory.created_at,
+            func.first_value(RequestHistory.changed_by).over(
+                partition_by=RequestHistory.request_id,
+                order_by=(case((accepted, 0), else_=1), RequestHistory.created_at, RequestHistory.id),
+            ).label("first_acceptor"),
+        )
+        .join(RequestHistory, RequestHistory.request_id == Request.id)
+        .where(Request.created_at >= date_from, Request.created_at < date_to)
+    )
+    if company_id:
+        events = events.where(Request.company_id == company_id)
+    events = events.subquery()
+
+    def first(status: RequestStatus, column):
+        return func.min(case((events.c.new_status == status, column)))
+
+    query = (
+        select(
+            events.c.company_id.label("company"),
+            events.c.house_id.label("house"),
+            events.c.category.label("category"),
+            first(RequestStatus.ACCEPTED, events.c.first_acceptor).label("dispatcher"),
+            _seconds_between(
+                dialect, events.c.request_created_at, first(RequestStatus.ACCEPTED, events.c.created_at)
+            ).label("time_to_accept"),
+            _seconds_between(
+                dialect, events.c.request_created_at, first(RequestStatus.COMPLETED, events.c.created_at)
+            ).label("time_to_complete"),
+            func.max(case((events.c.new_status == RequestStatus.REOPENED, 1), else_=0)).label("reopened"),
+        )
+        .group_by(events.c.id, events.c.company_id, events.c.house_id, events.c.category,
+                  events.c.request_created_at)
+    )
+    return query.subquery()
+
+
+def _hours(seconds: Optional[float]) -> Optional[float]:
+    return round(float(seconds) / 3600, 2) if seconds is not None else None
+
+
+def _duration_stats(values: Dict[str, Optional[float]]) -> dict:
+    return {key: _hours(value) for key, value in values.items()}
+
+
+async def _postgres_groups(db: AsyncSession, per_request, key) -> List[dict]:
+    columns = [key.label("key"), func.count().label("requests"),
+               func.count(per_request.c.time_to_accept).label("accepted"),
+               func.count(per_request.c.time_to_complete).label("completed"),
+               func.sum(per_request.c.reopened).label("reopened")]
+    for metric in ("time_to_accept", "time_to_complete"):
+        column = per_request.c[metric]
+        columns.append(func.avg(column).label(f"{metric}_avg"))
+        for p in PERCENTILES:
+            columns.append(
+                func.percentile_cont(literal_column(str(p))).within_group(column).label(f"{metric}_p{int(p * 100)}")
+            )
+
+    result = await db.execute(select(*columns).group_by(key).order_by(key))
+    groups = []
+    for row in result.mappings():
+        group = {
+            "key": row["key"],
+            "requests": row["requests"],
+            "accepted": row["accepted"],
+            "completed": row["completed"],
+            "reopened": int(row["reopened"] or 0),
+        }
+        for metric in ("time_to_accept", "time_to_complete"):
+            group[metric] = _duration_stats({
+                "avg": row[f"{metric}_avg"],
+                **{f"p{int(p * 100)}": row[f"{metric}_p{int(p * 100)}"] for p in PERCENTILES},
+            })
+        groups.append(group)
+    return groups
+
+
+def _quantiles(values: List[float]) -> dict:
+    if not values:
+        return {"avg": None, **{f"p{int(p * 100)}": None for p in PERCENTILES}}
+    if len(values) == 1:
+        cuts = values * 99
+    else:
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"avg": statistics.fmean(values), **{f"p{int(p * 100)}": cuts[int(p * 100) - 1] for p in PERCENTILES}}
+
+
+async def _fallback_groups(db: AsyncSession, per_request, key) -> List[dict]:
+    result = await db.execute(
+        select(key.label("key"), per_request.c.time_to_accept, per_request.c.time_to_complete, per_request.c.reopened)
+    )
+    buckets = defaultdict(lambda: {"requests": 0, "reopened": 0, "time_to_accept": [], "time_to_complete": []})
+    for group_key, time_to_accept, time_to_complete, reopened in result.all():
+        bucket = buckets[group_key]
+        bucket["requests"] += 1
+        bucket["reopened"] += reopened or 0
+        if time_to_accept is not None:
+            bucket["time_to_accept"].append(time_to_accept)
+        if time_to_complete is not None:
+            bucket["time_to_complete"].append(time_to_complete)
+
+    groups = []
+    for group_key in sorted(buckets, key=lambda k: (k is None, str(k))):
+        bucket = buckets[group_key]
+        groups.append({
+            "key": group_key,
+            "requests": bucket["requests"],
+            "accepted": len(bucket["time_to_accept"]),
+            "completed": len(bucket["time_to_complete"]),
+            "reopened": bucket["reopened"],
+            "time_to_accept": _duration_stats(_quantiles(bucket["time_to_accept"])),
+            "time_to_complete": _duration_stats(_quantiles(bucket["time_to_complete"])),
+        })
+    return groups
+
+
+async def _labels(db: AsyncSession, group_by: str, keys: List) -> Dict:
+    if group_by == "category":
+        return CATEGORY_LABELS
+    ids = [k for k in keys if k is not None]
+    if not ids:
+        return {}
+    if group_by == "company":
+        query = select(Company.id, Company.name).where(Company.id.in_(ids))
+    elif group_by == "house":
+        query = select(House.id, House.address).where(House.id.in_(ids))
+    else:
+        users = (await db.execute(select(User).where(User.id.in_(ids)))).scalars()
+        return {u.id: u.full_name for u in users}
+    return dict((await db.execute(query)).all())
+
+
+async def sla_report(
+    db: AsyncSession,
+    date_from: datetime,
+    date_to: datetime,
+    group_by: str = "company",
+    company_id: Optional[int] = None,
+) -> dict:
+    """SLA-метрики по заявкам, созданным в [date_from, date_to), в разрезе group_by"""
+    dialect = db.bind.dialect.name
+    per_request = _per_request(dialect, date_from, date_to, company_id)
+    key = per_request.c[group_by]
+
+    if dialect == "postgresql":
+        groups = await _postgres_groups(db, per_request, key)
+    else:
+        groups = await _fallback_groups(db, per_request, key)
+
+    labels = await _labels(db, group_by, [g["key"] for g in groups])
+    for group in groups:
+        group["label"] = labels.get(group["key"])
+        if isinstance(group["key"], RequestCategory):
+            group["key"] = group["key"].value
+        group["reopen_rate"] = round(group["reopened"] / group["completed"], 4) if group["completed"] else None
+
+    return {
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "group_by": group_by,
+        "groups": groups,
+    }
@@ -0,0 +1,63 @@
+"""
+Перенос старых закрытых заявок в архивные таблицы.
+
+Заявки в статусах ARCHIVE_STATUSES, статус которых не менялся дольше
+settings.archive_after_days, периодическая задача воркера переносит вместе с
+историей в requests_archive и request_history_archive: пачками по
+ARCHIVE_BATCH_SIZE, INSERT ... SELECT и DELETE в одной транзакции (история в
+requests удаляется каскадом). Обычные эндпоинты читают только requests;
+архив - по явному ?include_archived=true.
+
+Сводки (app/utils/rollups.py) к этому моменту уже учли историю заявок, а
+отчёты за периоды старше срока хранения архив не видят.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.request import Request, RequestHistory, RequestStatus
+from app.models.archive import ArchivedRequest, ArchivedRequestHistory
+
+ARCHIVE_TASK = "archive_requests"
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_STATUSES = [RequestStatus.COMPLETED, RequestStatus.REJECTED, RequestStatus.CANCELLED]
+
+
+def _copy(source, target, condition):
+    """INSERT INTO target (колонки source) SELECT ... FROM source WHERE condition"""
+    columns = [c.name for c in source.__table__.columns]
+    return insert(target).from_select(
+        columns, select(*[source.__table__.c[name] for name in columns]).where(condition)
+    )
+
+
+async def archive_requests(db: AsyncSession) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.archive_after_days)
+    if db.bind.dialect.name != "postgresql":
+        cutoff = cutoff.replace(tzinfo=None)
+
+    archived = 0
+    while True:
+        result = await db.execute(
+            select(Request.id)
+            .where(Request.status.in_(ARCHIVE_STATUSES), Request.status_changed_at < cutoff)
+            .order_by(Request.id)
+            .limit(ARCHIVE_BATCH_SIZE)
+            # Блокировка до коммита: заявку не переоткроют между копированием и удалением
+            .with_for_update(skip_locked=True)
+        )
+        ids = result.scalars().all()
+        if not ids:
+            break
+
+        await db.execute(_copy(Request, ArchivedRequest, Request.id.in_(ids)))
+        await db.execute(_copy(RequestHistory, ArchivedRequestHistory, RequestHistory.request_id.in_(ids)))
+        await db.execute(delete(Request).where(Request.id.in_(ids)))
+        await db.commit()
+        archived += len(ids)
+
+    if archived:
+        print(f"ARCHIVE: moved {archived} closed requests.")
+    return archived
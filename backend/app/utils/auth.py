@@ -12,8 +12,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.config import settings
-from app.database import get_db
+from app.database import DEFAULT_SHARD, get_db, shards
 from app.models.user import User, UserRole
+from app.models.house import House
 
 security = HTTPBearer(auto_error=False)
 
@@ -73,6 +74,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
 
 
+async def token_claims(db: AsyncSession, user: User) -> dict:
+    """
+    Данные токена; tenant_id (УК сотрудника или УК дома жильца) нужен выбору шарда в get_db
+    и лимитам запросов по УК, чтобы не читать пользователя из БД
+    """
+    claims = {"telegram_id": user.telegram_id}
+    if user.company_id:
+        claims["company_id"] = user.company_id
+    tenant_id = user.company_id
+    if not tenant_id and user.house_id:
+        tenant_id = (await db.execute(select(House.company_id).where(House.id == user.house_id))).scalar()
+    if tenant_id:
+        claims["tenant_id"] = tenant_id
+    return claims
+
+
 def decode_access_token(token: str) -> Optional[dict]:
     """Декодирование JWT токена"""
     try:
@@ -82,6 +99,18 @@ def decode_access_token(token: str) -> Optional[dict]:
         return None
 
 
+async def get_login_db(telegram_id: Optional[int] = None, init_data: Optional[str] = None):
+    """
+    Сессия шарда пользователя для входа: токена с tenant_id ещё нет, поэтому
+    шард ищется по telegram_id (параметр запроса или проверенный init_data)
+    """
+    if telegram_id is None and init_data and shards.sharded:
+        telegram_id = (verify_telegram_data(init_data) or {}).get("id")
+    shard = await shards.shard_for_user(telegram_id) if telegram_id else DEFAULT_SHARD
+    async with shards.session(shard) as session:
+        yield session
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
@@ -0,0 +1,161 @@
+"""
+Рассылки жильцам дома или всей УК (POST /api/broadcasts).
+
+API только создаёт запись Broadcast и ставит задачу broadcast_fanout - ответ
+не зависит от числа получателей. Задача fan-out читает telegram_id жильцов
+keyset-пагинацией по users.id и ставит по задаче broadcast_send на каждую
+пачку из BROADCAST_CHUNK_SIZE получателей (dedupe_key по границе пачки, так
+что повтор fan-out после сбоя не задвоит пачки). Пачки отправляются через
+общий notifier с его лимитами и прибавляют счётчики sent/failed к рассылке;
+последняя пачка переводит рассылку в done. Отправленные получатели пишутся в
+broadcast_deliveries группами по SEND_PARALLELISM вместе со счётчиками, и
+повтор пачки после сбоя пропускает их.
+"""
+import asyncio
+from datetime import datetime, timezone
+from html import escape
+from typing import List
+
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.house import House
+from app.models.user import User, UserRole
+from app.models.broadcast import Broadcast, BroadcastStatus, BroadcastDelivery
+from app.utils.telegram import notifier
+from app.worker import enqueue
+
+FANOUT_TASK = "broadcast_fanout"
+SEND_TASK = "broadcast_send"
+
+BROADCAST_CHUNK_SIZE = 500
+# Одновременных запросов к Bot API из одной пачки (и размер группы, после которой
+# сохраняется прогресс); темп задаёт notifier
+SEND_PARALLELISM = 25
+
+
+def _recipients(broadcast: Broadcast):
+    query = (
+        select(User.id, User.telegram_id)
+        .join(House, User.house_id == House.id)
+        .where(House.company_id == broadcast.company_id, User.role == UserRole.RESIDENT)
+    )
+    if broadcast.house_id:
+        query = query.where(User.house_id == broadcast.house_id)
+    return query
+
+
+async def queue_broadcast(db: AsyncSession, broadcast: Broadcast):
+    """Поставить рассылку в очередь (коммит - за вызывающим)"""
+    await db.flush()
+    await enqueue(db, FANOUT_TASK, {"broadcast_id": broadcast.id}, dedupe_key=f"{FANOUT_TASK}:{broadcast.id}")
+
+
+async def _finish_if_complete(db: AsyncSession, broadcast_id: int):
+    await db.execute(
+        update(Broadcast)
+        .where(
+            Broadcast.id == broadcast_id,
+            Broadcast.status == BroadcastStatus.SENDING,
+            Broadcast.sent + Broadcast.failed >= Broadcast.total,
+        )
+        .values(status=BroadcastStatus.DONE, finished_at=datetime.now(timezone.utc))
+    )
+    await db.commit()
+
+
+async def purge_deliveries(db: AsyncSession, finished_before: datetime):
+    """Удалить отметки об отправке завершённых рассылок: их пачки уже не повторятся (коммит - за вызывающим)"""
+    await db.execute(
+        delete(BroadcastDelivery).where(BroadcastDelivery.broadcast_id.in_(
+            select(Broadcast.id).where(Broadcast.status == BroadcastStatus.DONE, Broadcast.finished_at < finished_before)
+        ))
+    )
+
+
+async def fan_out(db: AsyncSession, broadcast_id: int):
+    """Разбить получателей рассылки на пачки и поставить их отправку"""
+    broadcast = await db.get(Broadcast, broadcast_id)
+    if not broadcast or broadcast.status != BroadcastStatus.PENDING:
+        return
+
+    # Предварительное число получателей - для прогресса, пока идёт разбиение
+    recipients = _recipients(broadcast)
+    broadcast.total = (await db.execute(select(func.count()).select_from(recipients.subquery()))).scalar()
+    await db.commit()
+
+    total = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            recipients.where(User.id > last_id).order_by(User.id).limit(BROADCAST_CHUNK_SIZE)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        await enqueue(
+            db,
+            SEND_TASK,
+            {"broadcast_id": broadcast_id, "chat_ids": [telegram_id for _, telegram_id in rows]},
+            dedupe_key=f"{SEND_TASK}:{broadcast_id}:{last_id}",
+        )
+        await db.commit()
+        total += len(rows)
+        last_id = rows[-1][0]
+
+    await db.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id)
+        .values(total=total, status=BroadcastStatus.SENDING)
+    )
+    # Пачки могли успеть отправиться, пока шло разбиение
+    await _finish_if_complete(db, broadcast_id)
+
+
+async def send_chunk(db: AsyncSession, broadcast_id: int, chat_ids: List[int]):
+    """
+    Отправить пачку рассылки. Ошибки отдельных чатов (бот заблокирован и т.п.)
+    считаются в failed и не повторяются. Прогресс сохраняется после каждой
+    группы из SEND_PARALLELISM сообщений, поэтому повтор задачи после сбоя
+    отправляет только получателям, которых нет в broadcast_deliveries: задвоиться
+    может лишь группа, прерванная посреди отправки.
+    """
+    text = (await db.execute(select(Broadcast.text).where(Broadcast.id == broadcast_id))).scalar()
+    if text is None:
+        return
+    done = set((await db.execute(
+        select(BroadcastDelivery.chat_id)
+        .where(BroadcastDelivery.broadcast_id == broadcast_id, BroadcastDelivery.chat_id.in_(chat_ids))
+    )).scalars().all())
+    await db.commit()
+    pending = [chat_id for chat_id in dict.fromkeys(chat_ids) if chat_id not in done]
+    message = escape(text)
+
+    async def send(chat_id: int) -> bool:
+        if not settings.telegram_bot_token:
+            return False
+        try:
+            await notifier.send_message(chat_id, message)
+            return True
+        except Exception as e:
+            print(f"BROADCAST {broadcast_id}: chat {chat_id} failed: {e}")
+            return False
+
+    for start in range(0, len(pending), SEND_PARALLELISM):
+        group = pending[start:start + SEND_PARALLELISM]
+        results = await asyncio.gather(*(send(chat_id) for chat_id in group))
+        sent = sum(results)
+
+        await db.execute(insert(BroadcastDelivery), [
+            {"broadcast_id": broadcast_id, "chat_id": chat_id, "delivered": ok}
+            for chat_id, ok in zip(group, results)
+        ])
+        await db.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id)
+            .values(sent=Broadcast.sent + sent, failed=Broadcast.failed + len(results) - sent)
+        )
+        await db.commit()
+
+    await _finish_if_complete(db, broadcast_id)
@@ -0,0 +1,221 @@
+"""
+Массовый импорт домов и жильцов из CSV (POST /api/superadmin/import).
+
+Файл читается построчно, каждая строка валидируется отдельно, а валидные
+строки накапливаются и записываются пачками по IMPORT_BATCH_SIZE через
+INSERT ... ON CONFLICT DO UPDATE. Ошибки возвращаются с номером строки.
+
+Колонки CSV (разделитель "," или ";"):
+    company_id, address, apartment_count,
+    telegram_id, first_name, last_name, username, phone, apartment
+Строка без telegram_id создаёт/обновляет только дом.
+Строки пишутся в шард своей УК (пачки копятся по шардам отдельно). Строка
+с telegram_id пользователя из другого шарда отклоняется: один telegram_id
+в двух шардах сделал бы вход неоднозначным (см. auth._move_resident).
+Разбор CSV и валидация идут в потоке, пачками по IMPORT_BATCH_SIZE строк,
+чтобы большой файл не блокировал event loop.
+"""
+import asyncio
+import csv
+import io
+import itertools
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from pydantic import BaseModel, ValidationError, field_validator
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import shards
+from app.models.company import Company
+from app.models.house import House
+from app.models.user import User
+from app.utils.address_index import address_index
+
+IMPORT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportRow(BaseModel):
+    company_id: int
+    address: str
+    apartment_count: Optional[int] = None
+    telegram_id: Optional[int] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    username: Optional[str] = None
+    phone: Optional[str] = None
+    apartment: Optional[str] = None
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def empty_to_none(cls, value):
+        if isinstance(value, str):
+            value = value.strip()
+            return value or None
+        return value
+
+
+class ImportReport(BaseModel):
+    rows: int = 0
+    houses: int = 0
+    residents: int = 0
+    error_count: int = 0
+    errors: List[dict] = []
+
+    def add_error(self, row: int, error: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+
+def _insert(dialect: str):
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+
+def _read_rows(file: BinaryIO):
+    """Построчно читать CSV, определив разделитель по заголовку"""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    header = text.readline()
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    return csv.DictReader(itertools.chain([header], text), delimiter=delimiter)
+
+
+def _parse(rows: Iterator[Tuple[int, dict]], limit: int) -> List[Tuple[int, Union[ImportRow, str]]]:
+    """Следующие limit строк: (номер строки, ImportRow или текст ошибки валидации)"""
+    parsed = []
+    for line, raw in itertools.islice(rows, limit):
+        try:
+            parsed.append((line, ImportRow.model_validate(raw)))
+        except ValidationError as e:
+            parsed.append((line, "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+            )))
+    return parsed
+
+
+async def _users_elsewhere(shard: str, telegram_ids: set) -> Dict[int, str]:
+    """telegram_id пользователей, которые уже есть в других шардах -> шард"""
+    if not shards.sharded or not telegram_ids:
+        return {}
+
+    async def find(db: AsyncSession):
+        if db.info["shard"] == shard:
+            return []
+        return (await db.execute(select(User.telegram_id).where(User.telegram_id.in_(telegram_ids)))).scalars().all()
+
+    return {telegram_id: other for other, found in await shards.fan_out(find) for telegram_id in found}
+
+
+async def _flush(db: AsyncSession, batch: List[Tuple[int, ImportRow]], report: ImportReport):
+    insert = _insert(db.bind.dialect.name)
+
+    # Внутри одного INSERT ... ON CONFLICT ключ не может повторяться
+    houses: Dict[Tuple[int, str], Optional[int]] = {}
+    for _, row in batch:
+        key = (row.company_id, row.address)
+        houses[key] = row.apartment_count or houses.get(key)
+
+    stmt = insert(House).values([
+        {"company_id": company_id, "address": address, "apartment_count": apartment_count}
+        for (company_id, address), apartment_count in houses.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[House.company_id, House.address],
+        set_={"apartment_count": func.coalesce(stmt.excluded.apartment_count, House.apartment_count)},
+    ).returning(House.id, House.company_id, House.address)
+    house_ids = {}
+    for house_id, company_id, address in (await db.execute(stmt)).all():
+        house_ids[(company_id, address)] = house_id
+
+    residents = {}
+    for _, row in batch:
+        if row.telegram_id is not None:
+            residents[row.telegram_id] = {
+                "telegram_id": row.telegram_id,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "username": row.username,
+                "phone": row.phone,
+                "house_id": house_ids[(row.company_id, row.address)],
+                "apartment": row.apartment,
+            }
+    if residents:
+        stmt = insert(User).values(list(residents.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={
+                "house_id": stmt.excluded.house_id,
+                "apartment": func.coalesce(stmt.excluded.apartment, User.apartment),
+                "phone": func.coalesce(stmt.excluded.phone, User.phone),
+                "first_name": func.coalesce(stmt.excluded.first_name, User.first_name),
+                "last_name": func.coalesce(stmt.excluded.last_name, User.last_name),
+                "username": func.coalesce(stmt.excluded.username, User.username),
+                "updated_at": func.now(),
+            },
+        )
+        await db.execute(stmt)
+
+    await db.commit()
+
+    for (company_id, address), house_id in house_ids.items():
+        address_index.add(db.info["shard"], house_id, company_id, address)
+    report.houses += len(house_ids)
+    report.residents += len(residents)
+
+
+async def import_houses_and_residents(db: AsyncSession, file: BinaryIO) -> ImportReport:
+    """
+    Импортировать CSV, возвращает отчёт с ошибками по строкам.
+    db - сессия шарда default: в нём справочник всех УК.
+    """
+    report = ImportReport()
+    company_ids = set((await db.execute(select(Company.id))).scalars())
+    batches: Dict[str, List[Tuple[int, ImportRow]]] = {}
+
+    async def flush(shard: str):
+        batch = batches.pop(shard)
+        elsewhere = await _users_elsewhere(shard, {row.telegram_id for _, row in batch if row.telegram_id is not None})
+        if elsewhere:
+            for line, row in batch:
+                if row.telegram_id in elsewhere:
+                    report.add_error(line, (
+                        f"Пользователь с telegram_id {row.telegram_id} уже есть в шарде {elsewhere[row.telegram_id]}"
+                    ))
+            batch = [(line, row) for line, row in batch if row.telegram_id not in elsewhere]
+            if not batch:
+                return
+        async with shards.session(shard) as shard_db:
+            try:
+                await _flush(shard_db, batch, report)
+            except Exception as e:
+                await shard_db.rollback()
+                for line, _ in batch:
+                    report.add_error(line, f"Ошибка записи пачки: {e}")
+
+    try:
+        # Строка 1 - заголовок
+        rows = enumerate(await asyncio.to_thread(_read_rows, file), start=2)
+        while parsed := await asyncio.to_thread(_parse, rows, IMPORT_BATCH_SIZE):
+            for line, row in parsed:
+                report.rows += 1
+                if isinstance(row, str):
+                    report.add_error(line, row)
+                    continue
+
+                if row.company_id not in company_ids:
+                    report.add_error(line, f"УК {row.company_id} не найдена")
+                    continue
+
+                shard = shards.shard_for_company(row.company_id)
+                batch = batches.setdefault(shard, [])
+                batch.append((line, row))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await flush(shard)
+    except (UnicodeDecodeError, csv.Error) as e:
+        report.add_error(report.rows + 1, f"Не удалось прочитать CSV: {e}")
+
+    for shard in list(batches):
+        await flush(shard)
+
+    return report
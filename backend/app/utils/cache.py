@@ -0,0 +1,217 @@
+"""
+Кэш готовых ответов для публичных справочников (GET /api/companies, /api/houses).
+
+Ответы хранятся сериализованными (bytes) в LRU процесса с TTL. Одновременные
+промахи по одному ключу схлопываются (SingleFlight): в БД идёт один запрос,
+остальные ждут его результат. Обработчики изменения УК и домов вызывают
+invalidate(): версия пространства имён увеличивается, и старые записи больше
+не находятся (их вытеснит LRU). Ответ, загрузка которого началась до
+инвалидации, в кэш не попадает.
+Инвалидация доходит и до других процессов API через app/utils/invalidation.py.
+
+Второй уровень (settings.rate_limit_backend = "redis", тот же Redis, что у
+лимитов запросов): промах LRU читает ответ из Redis, общего для всех процессов
+и контейнеров, и только потом идёт в БД. Ключи в Redis содержат поколение
+пространства имён (счётчик cache:gen:<namespace>): invalidate() сначала
+увеличивает его, затем публикует событие в шину, и процессы, получив событие,
+перечитывают поколение - старые записи Redis больше не находятся и истекают
+по TTL. Redis недоступен - кэш работает как одноуровневый.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Response
+
+from app.config import settings
+from app.utils.invalidation import bus, CACHE
+
+COMPANIES = "companies"
+HOUSES = "houses"
+
+
+class SingleFlight:
+    """Одновременные вызовы do() с одним ключом выполняют fn один раз"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable], timeout: Optional[float] = None):
+        """
+        timeout - сколько ждать чужой вызов; если он не уложился,
+        fn выполняется отдельно для этого вызывающего
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            try:
+                # shield: отмена одного ожидающего не должна отменять общий вызов
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                return await fn()
+            except asyncio.CancelledError:
+                # Отменён ведущий вызов (его клиент отключился), а не этот: повторяем сами
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.do(key, fn, timeout)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение забирают ожидающие; без них не логировать "never retrieved"
+            future.exception()
+            raise
+        except BaseException:
+            # CancelledError ведущего - не результат вызова: ожидающие выполнят fn заново
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+
+class RedisCacheStore:
+    """Ответы и поколения пространств имён в Redis, общие для всех процессов API"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Необязательная зависимость (pip install redis): нужна только с rate_limit_backend=redis
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    async def generation(self, namespace: str) -> int:
+        return int(await self.client.get(f"cache:gen:{namespace}") or 0)
+
+    async def bump(self, namespace: str) -> int:
+        return await self.client.incr(f"cache:gen:{namespace}")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, body: bytes, ttl: float):
+        await self.client.set(key, body, px=int(ttl * 1000))
+
+
+def cache_store(backend: str, redis_url: str) -> Optional[RedisCacheStore]:
+    if backend == "redis":
+        return RedisCacheStore(redis_url)
+    return None
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float, store: Optional[RedisCacheStore] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self._entries: "OrderedDict[Tuple, Tuple[float, bytes]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        # Поколения пространств имён в store; сбрасываются при инвалидации
+        self._generations: Dict[str, int] = {}
+        self._flight = SingleFlight()
+
+    def _get(self, key: Tuple) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, body = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    def _set(self, key: Tuple, body: bytes):
+        self._entries[key] = (time.monotonic() + self.ttl, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, namespace: str, key: Tuple, loader: Callable[[], Awaitable[bytes]]) -> bytes:
+        version = self._versions.get(namespace, 0)
+        full_key = (namespace, version, *key)
+        body = self._get(full_key)
+        if body is not None:
+            return body
+
+        async def load() -> bytes:
+            shared_key = await self._shared_key(namespace, version, key) if self.store else None
+            body = await self._shared_get(shared_key) if shared_key else None
+            if body is None:
+                body = await loader()
+                if shared_key:
+                    await self._shared_set(shared_key, body)
+            if self._versions.get(namespace, 0) == version:
+                self._set(full_key, body)
+            return body
+
+        return await self._flight.do(full_key, load)
+
+    async def _shared_key(self, namespace: str, version: int, key: Tuple) -> Optional[str]:
+        generation = self._generations.get(namespace)
+        if generation is None:
+            try:
+                generation = await self.store.generation(namespace)
+            except Exception as e:
+                print(f"CACHE: redis unavailable: {e}")
+                return None
+            # Инвалидация во время чтения: прочитанное поколение могло устареть
+            if self._versions.get(namespace, 0) == version:
+                self._generations[namespace] = generation
+        return f"cache:{namespace}:{generation}:" + ":".join(str(part) for part in key)
+
+    async def _shared_get(self, shared_key: str) -> Optional[bytes]:
+        try:
+            return await self.store.get(shared_key)
+        except Exception as e:
+            print(f"CACHE: redis unavailable: {e}")
+            return None
+
+    async def _shared_set(self, shared_key: str, body: bytes):
+        try:
+            await self.store.set(shared_key, body, self.ttl)
+        except Exception as e:
+            print(f"CACHE: redis unavailable: {e}")
+
+    async def invalidate(self, *namespaces: str):
+        # Поколение в Redis - до события в шину: получив его, процессы прочитают уже новое
+        generations = {}
+        if self.store is not None:
+            try:
+                for namespace in namespaces:
+                    generations[namespace] = await self.store.bump(namespace)
+            except Exception as e:
+                print(f"CACHE: redis unavailable, shared entries expire by TTL: {e}")
+        self._bump(namespaces)
+        self._generations.update(generations)
+        bus.publish(CACHE, list(namespaces))
+
+    def _bump(self, namespaces):
+        for namespace in namespaces:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            self._generations.pop(namespace, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+response_cache = ResponseCache(
+    settings.cache_max_entries,
+    settings.cache_ttl_seconds,
+    cache_store(settings.rate_limit_backend, settings.redis_url),
+)
+bus.subscribe(CACHE, response_cache._bump)
@@ -0,0 +1,23 @@
+"""
+Схлопывание одинаковых одновременных чтений.
+
+Эндпоинт подключается явно: строит ключ из области видимости пользователя и
+фильтров и выполняет запросы к БД через coalesce(). Пока первый вызов с этим
+ключом выполняется, остальные ждут его результат (не дольше
+settings.coalesce_max_wait_seconds, затем выполняют запрос сами) и получают
+тот же объект ответа - изменять его нельзя.
+"""
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from app.config import settings
+from app.utils.cache import SingleFlight
+
+T = TypeVar("T")
+
+_flight = SingleFlight()
+
+
+async def coalesce(key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+    if not settings.coalesce_enabled:
+        return await fn()
+    return await _flight.do(key, fn, timeout=settings.coalesce_max_wait_seconds)
@@ -0,0 +1,150 @@
+"""
+Потоковая выгрузка заявок в CSV/XLSX (GET /api/requests/export).
+
+Строки читаются из БД серверным курсором пачками по EXPORT_BATCH_SIZE
+и сразу отдаются клиенту, поэтому память не зависит от объёма выгрузки.
+"""
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import Select
+
+from app.database import shards
+from app.models.request import Request, RequestStatus
+from app.schemas.request import CATEGORY_LABELS, STATUS_LABELS
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = [
+    "ID",
+    "Создана",
+    "Категория",
+    "Статус",
+    "Заголовок",
+    "Описание",
+    "Жилец",
+    "Адрес",
+    "Квартира",
+    "Принята",
+    "Выполнена",
+    "Часов до принятия",
+    "Часов до выполнения",
+    "История",
+]
+
+
+def _hours(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if not start or not end:
+        return None
+    return round((end - start).total_seconds() / 3600, 2)
+
+
+def _format_dt(value: Optional[datetime]) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+
+def request_to_row(request: Request) -> List:
+    """Плоская строка выгрузки: заявка, жилец, история и рассчитанные длительности"""
+    accepted_at = next(
+        (h.created_at for h in request.history if h.new_status == RequestStatus.ACCEPTED), None
+    )
+    completed_at = next(
+        (h.created_at for h in reversed(request.history) if h.new_status == RequestStatus.COMPLETED), None
+    )
+    history = " | ".join(
+        f"{_format_dt(h.created_at)} {STATUS_LABELS[h.new_status]}" + (f" ({h.comment})" if h.comment else "")
+        for h in request.history
+    )
+    user = request.user
+    return [
+        request.id,
+        _format_dt(request.created_at),
+        CATEGORY_LABELS[request.category],
+        STATUS_LABELS[request.status],
+        request.title,
+        request.description or "",
+        user.full_name if user else "",
+        user.house.address if user and user.house else "",
+        (user.apartment or "") if user else "",
+        _format_dt(accepted_at),
+        _format_dt(completed_at),
+        _hours(request.created_at, accepted_at),
+        _hours(request.created_at, completed_at),
+        history,
+    ]
+
+
+async def _stream_requests(query: Select, shard: str) -> AsyncIterator[Request]:
+    # Отдельная сессия шарда пользователя: генератор живёт дольше обработчика запроса
+    async with shards.session(shard) as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.partitions():
+            for request in partition:
+                yield request
+            # Не expunge_all: результат yield_per держит identity map сессии до конца чтения.
+            # История уходит вместе с заявкой (cascade), жильцы и дома повторяются - остаются
+            for request in partition:
+                db.expunge(request)
+
+
+async def stream_csv(query: Select, shard: str) -> AsyncIterator[bytes]:
+    """CSV с BOM, чтобы Excel корректно открывал кириллицу"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+
+    rows = 0
+    async for request in _stream_requests(query, shard):
+        writer.writerow(request_to_row(request))
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode("utf-8")
+
+
+async def stream_xlsx(query: Select, shard: str) -> AsyncIterator[bytes]:
+    """
+    XLSX - zip-архив, его нельзя отдавать по мере записи. Пишем книгу в режиме
+    write_only во временный файл (память постоянна) и затем отдаём файл кусками.
+    Запись строк, сохранение и чтение файла идут в пуле потоков: на большой
+    выгрузке они заняли бы event loop и остальные запросы процесса.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Заявки")
+    sheet.append(EXPORT_COLUMNS)
+
+    def append(rows: List[List]):
+        for row in rows:
+            sheet.append(row)
+
+    rows = []
+    async for request in _stream_requests(query, shard):
+        rows.append(request_to_row(request))
+        if len(rows) == EXPORT_BATCH_SIZE:
+            await asyncio.to_thread(append, rows)
+            rows = []
+    await asyncio.to_thread(append, rows)
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(workbook.save, path)
+        with open(path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, EXPORT_CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
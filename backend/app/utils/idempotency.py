@@ -0,0 +1,216 @@
+"""
+Поддержка заголовка Idempotency-Key для изменяющих запросов.
+
+Роутеры с route_class=IdempotentRoute проверяют ключ до разрешения
+зависимостей: повтор запроса с тем же ключом получает сохранённый ответ, не
+открывая сессию БД и не вызывая обработчик. Ключ привязан к токену, методу и
+пути, так что разные пользователи и эндпоинты не пересекаются; повтор с тем же
+ключом, но другим телом отклоняется (422), а пока первый запрос выполняется -
+конфликт (409). Ответы 5xx не сохраняются, чтобы клиент мог повторить запрос.
+
+Хранилища: MemoryIdempotencyStore (LRU с TTL в процессе, по умолчанию) и
+DbIdempotencyStore (таблица idempotency_keys, общая для всех процессов),
+выбор - settings.idempotency_backend.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple
+
+from fastapi import Request as HttpRequest, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config import settings
+from app.database import AsyncSessionLocal, end_request_transactions
+from app.models.idempotency import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# Сколько держать отметку "выполняется", если процесс упал, не сохранив ответ
+IN_FLIGHT_TIMEOUT = 60
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: Optional[int] = None  # None - запрос ещё выполняется
+    content_type: Optional[str] = None
+    body: bytes = b""
+
+
+class MemoryIdempotencyStore:
+    """LRU-словарь ответов с TTL в памяти процесса"""
+
+    def __init__(self, ttl: int, max_keys: int):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, Tuple[float, StoredResponse]]" = OrderedDict()
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Занять ключ; если он уже есть - вернуть сохранённую запись"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            self._entries.move_to_end(key)
+            return entry[1]
+        self._entries[key] = (now + IN_FLIGHT_TIMEOUT, StoredResponse(fingerprint))
+        self._entries.move_to_end(key)
+        self._evict(now)
+        return None
+
+    async def save(self, key: str, response: StoredResponse):
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+
+    async def release(self, key: str):
+        self._entries.pop(key, None)
+
+    def _evict(self, now: float):
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+        # Просроченные записи в начале LRU
+        while self._entries:
+            oldest_key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            del self._entries[oldest_key]
+
+
+class DbIdempotencyStore:
+    """Ответы в таблице idempotency_keys; просроченные удаляет задача воркера"""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        now = datetime.now(timezone.utc)
+        reservation = {"fingerprint": fingerprint, "status_code": None, "content_type": None, "body": None,
+                       "expires_at": now + timedelta(seconds=IN_FLIGHT_TIMEOUT)}
+        async with AsyncSessionLocal() as db:
+            insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+            result = await db.execute(
+                insert(IdempotencyKey).values(key=key, **reservation)
+                .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+            )
+            if result.rowcount:
+                await db.commit()
+                return None
+
+            # Ключ есть: забираем его, только если запись просрочена
+            result = await db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key, IdempotencyKey.expires_at < now)
+                .values(**reservation)
+            )
+            await db.commit()
+            if result.rowcount:
+                return None
+
+            row = (await db.execute(select(IdempotencyKey).where(IdempotencyKey.key == key))).scalar_one_or_none()
+            if row is None:
+                return None
+            return StoredResponse(row.fingerprint, row.status_code, row.content_type, row.body or b"")
+
+    async def save(self, key: str, response: StoredResponse):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(
+                    status_code=response.status_code,
+                    content_type=response.content_type,
+                    body=response.body,
+                    expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+                )
+            )
+            await db.commit()
+
+    async def release(self, key: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+            await db.commit()
+
+
+async def purge_expired_keys(db):
+    await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.now(timezone.utc)))
+    await db.commit()
+
+
+def _make_store():
+    if settings.idempotency_backend == "db":
+        return DbIdempotencyStore(settings.idempotency_ttl_seconds)
+    return MemoryIdempotencyStore(settings.idempotency_ttl_seconds, settings.idempotency_max_keys)
+
+
+idempotency_store = _make_store()
+
+
+def _sha256(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _error(status_code: int, detail: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"detail": detail})
+
+
+class IdempotentRoute(APIRoute):
+    """Маршрут, повторный вызов которого с тем же Idempotency-Key возвращает сохранённый ответ"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def idempotent_handler(request: HttpRequest) -> Response:
+            client_key = request.headers.get(HEADER)
+            # Загрузки файлов не буферизуем ради отпечатка тела
+            multipart = request.headers.get("content-type", "").startswith("multipart/")
+            if not client_key or request.method in SAFE_METHODS or multipart:
+                return await handler(request)
+            if len(client_key) > MAX_KEY_LENGTH:
+                return _error(400, f"{HEADER} длиннее {MAX_KEY_LENGTH} символов")
+
+            key = _sha256(request.headers.get("authorization", ""), request.method, request.url.path, client_key)
+            fingerprint = _sha256(request.url.query, await request.body())
+
+            stored = await idempotency_store.begin(key, fingerprint)
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    return _error(422, f"{HEADER} уже использован для другого запроса")
+                if stored.status_code is None:
+                    return _error(409, "Запрос с этим ключом ещё выполняется")
+                return Response(
+                    content=stored.body,
+                    status_code=stored.status_code,
+                    media_type=stored.content_type,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+
+            try:
+                response = await handler(request)
+            except Exception:
+                # HTTPException и ошибки валидации тоже сюда: их ответ формирует приложение,
+                # поэтому ключ освобождается и повтор выполнится заново
+                await end_request_transactions(request)
+                await idempotency_store.release(key)
+                raise
+
+            # Сессия обработчика ещё открыта: её транзакция не должна занимать писателя SQLite
+            await end_request_transactions(request)
+            body = getattr(response, "body", None)
+            if response.status_code >= 500 or body is None:
+                await idempotency_store.release(key)
+            else:
+                await idempotency_store.save(key, StoredResponse(
+                    fingerprint, response.status_code, response.headers.get("content-type"), bytes(body)
+                ))
+            return response
+
+        return idempotent_handler
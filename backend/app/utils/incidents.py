@@ -0,0 +1,158 @@
+"""
+Группировка похожих заявок в инциденты (массовые аварии).
+
+При создании заявки ищется открытый инцидент того же дома и категории, в
+который последняя заявка попала не раньше settings.incident_window_minutes
+назад - это выборка по индексу ix_incidents_cluster, ограниченная
+INCIDENT_CANDIDATES строками, так что стоимость не зависит от числа заявок.
+Среди кандидатов выбирается самый похожий по словам заголовка; если похожих
+нет, заявка открывает новый инцидент.
+
+Смена статуса инцидента одним UPDATE переводит все заявки-участники, для
+которых переход допустим по FSM, и одним INSERT пишет их историю.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set
+
+from sqlalchemy import select, update, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.user import User
+from app.models.request import Request, RequestStatus, RequestHistory, STATUS_TRANSITIONS
+from app.models.incident import Incident
+from app.utils.notifications import enqueue_status_notification
+
+INCIDENT_CANDIDATES = 5
+
+# Инцидент с такими статусами принимает новые заявки
+OPEN_STATUSES = [
+    RequestStatus.NEW,
+    RequestStatus.ACCEPTED,
+    RequestStatus.IN_PROGRESS,
+    RequestStatus.ON_HOLD,
+    RequestStatus.REOPENED,
+]
+
+# Слова сравниваются по первым STEM_LENGTH буквам: "лифт"/"лифте", "течь"/"течёт"
+STEM_LENGTH = 4
+MIN_WORD_LENGTH = 3
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def title_stems(text: str) -> Set[str]:
+    words = _WORD_RE.findall(text.lower().replace("ё", "е"))
+    return {w[:STEM_LENGTH] for w in words if len(w) >= MIN_WORD_LENGTH}
+
+
+def similarity(a: str, b: str) -> float:
+    """Доля общих слов относительно более короткого заголовка"""
+    stems_a, stems_b = title_stems(a), title_stems(b)
+    if not stems_a or not stems_b:
+        return 0.0
+    return len(stems_a & stems_b) / min(len(stems_a), len(stems_b))
+
+
+def _window_start(dialect: str) -> datetime:
+    start = datetime.now(timezone.utc) - timedelta(minutes=settings.incident_window_minutes)
+    # SQLite хранит CURRENT_TIMESTAMP как наивное время UTC
+    return start if dialect == "postgresql" else start.replace(tzinfo=None)
+
+
+async def find_incident(db: AsyncSession, house_id: int, request: Request) -> Optional[Incident]:
+    result = await db.execute(
+        select(Incident)
+        .where(
+            Incident.house_id == house_id,
+            Incident.category == request.category,
+            Incident.last_request_at >= _window_start(db.bind.dialect.name),
+            Incident.status.in_(OPEN_STATUSES),
+        )
+        .order_by(Incident.last_request_at.desc())
+        .limit(INCIDENT_CANDIDATES)
+    )
+    best, best_score = None, settings.incident_min_similarity
+    for incident in result.scalars():
+        score = similarity(request.title, incident.title)
+        if score >= best_score:
+            best, best_score = incident, score
+    return best
+
+
+async def attach_to_incident(db: AsyncSession, request: Request, house_id: int, user: User) -> Incident:
+    """
+    Включить новую заявку в подходящий инцидент или открыть новый (коммит - за вызывающим).
+    Если инцидент уже в работе, заявка сразу получает его статус.
+    """
+    incident = await find_incident(db, house_id, request)
+    if incident is None:
+        incident = Incident(house_id=house_id, category=request.category, title=request.title)
+        db.add(incident)
+        await db.flush()
+        request.incident_id = incident.id
+        return incident
+
+    await db.execute(
+        update(Incident)
+        .where(Incident.id == incident.id)
+        .values(request_count=Incident.request_count + 1, last_request_at=func.now())
+    )
+    request.incident_id = incident.id
+    if incident.status != RequestStatus.NEW:
+        db.add(RequestHistory(
+            request_id=request.id,
+            old_status=request.status,
+            new_status=incident.status,
+            comment=f"Присоединена к инциденту #{incident.id}",
+            changed_by=user.id,
+        ))
+        request.set_status(incident.status)
+    return incident
+
+
+async def set_incident_status(
+    db: AsyncSession,
+    incident: Incident,
+    new_status: RequestStatus,
+    comment: Optional[str],
+    user: User,
+) -> List[int]:
+    """Перевести инцидент и его заявки в новый статус, возвращает id изменённых заявок"""
+    sources = [s for s, targets in STATUS_TRANSITIONS.items() if new_status in targets]
+    result = await db.execute(
+        select(Request.id, Request.status, Request.user_id)
+        .where(Request.incident_id == incident.id, Request.status.in_(sources))
+        .with_for_update()
+    )
+    members = result.all()
+
+    incident.status = new_status
+    if not members:
+        await db.commit()
+        return []
+
+    ids = [request_id for request_id, _, _ in members]
+    await db.execute(
+        update(Request)
+        .where(Request.id.in_(ids))
+        .values(status=new_status, status_changed_at=func.now(), escalated_at=None, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(insert(RequestHistory), [
+        {
+            "request_id": request_id,
+            "old_status": old_status,
+            "new_status": new_status,
+            "comment": comment,
+            "changed_by": user.id,
+        }
+        for request_id, old_status, _ in members
+    ])
+    for request_id, _, user_id in members:
+        if user_id != user.id:
+            await enqueue_status_notification(db, request_id)
+
+    await db.commit()
+    return ids
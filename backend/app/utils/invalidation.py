@@ -0,0 +1,154 @@
+"""
+Инвалидация кэшей в памяти между процессами API (воркеры gunicorn, несколько
+контейнеров): кэш ответов справочников, индекс адресов, правила SLA, размещение УК
+по шардам.
+
+Модуль, владеющий кэшем, подписывает обработчик на канал (bus.subscribe) и после
+локального изменения публикует событие (bus.publish). Публикация не ждёт БД:
+событие попадает в очередь процесса. Свои события процесс не получает обратно.
+
+Бэкенды (settings.invalidation_backend):
+- "memory" - один процесс, события никуда не уходят;
+- "db" - таблица cache_events шарда default: фоновая задача каждого процесса раз
+  в invalidation_poll_seconds записывает свои события и применяет новые чужие.
+  Задержка между процессами - до одного интервала опроса.
+"""
+import asyncio
+import inspect
+import os
+import socket
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, insert, delete, func
+
+from app.config import settings
+from app.database import AsyncSessionLocal, shards
+from app.models.cache_event import CacheEvent
+
+# Каналы
+CACHE = "response_cache"
+ADDRESS_INDEX = "address_index"
+SLA_RULES = "sla_rules"
+SHARD_PLACEMENTS = "shard_placements"
+
+# Сколько хранить события в таблице (процесс, отставший сильнее, перечитывает кэши сам при рестарте)
+EVENTS_RETENTION = timedelta(hours=1)
+# Строки с меньшим id могут закоммититься позже (PostgreSQL): читаем с перекрытием
+POLL_OVERLAP = 100
+
+
+class InvalidationBus:
+    def __init__(self, backend: str, poll_interval: float):
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, List[Callable[[Any], Any]]] = defaultdict(list)
+        self._outbox: List[Tuple[str, Any]] = []
+        self._last_id = 0
+        self._seen: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def subscribe(self, channel: str, handler: Callable[[Any], Any]):
+        """handler(payload) - применить чужое событие к локальному кэшу; может быть async"""
+        self._handlers[channel].append(handler)
+
+    def publish(self, channel: str, payload: Any = None):
+        """Сообщить другим процессам об изменении (локальный кэш вызывающий уже обновил)"""
+        if self.backend != "db":
+            return
+        self._outbox.append((channel, payload))
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def start(self):
+        if self.backend != "db" or self._task is not None:
+            return
+        # Модуль импортирован ещё в мастере gunicorn (preload): после fork нужен свой origin
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Кэши процесса только что загружены из БД: старые события не нужны
+        async with AsyncSessionLocal() as db:
+            self._last_id = (await db.execute(select(func.coalesce(func.max(CacheEvent.id), 0)))).scalar()
+            result = await db.execute(select(CacheEvent.id).where(CacheEvent.id > self._last_id - POLL_OVERLAP))
+            self._seen = set(result.scalars().all())
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._outbox:
+            await self._flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._flush()
+                await self._poll()
+            except Exception as e:
+                print(f"INVALIDATION: poll failed: {e}")
+            self._wakeup.clear()
+            try:
+                # Свои события отправляем сразу, чужие читаем по таймеру
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush(self):
+        if not self._outbox:
+            return
+        events, self._outbox = self._outbox, []
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(CacheEvent), [
+                    {"origin": self.origin, "channel": channel, "payload": payload} for channel, payload in events
+                ])
+                await db.commit()
+        except Exception:
+            self._outbox[:0] = events
+            raise
+
+    async def _poll(self):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(CacheEvent.id, CacheEvent.origin, CacheEvent.channel, CacheEvent.payload)
+                .where(CacheEvent.id > self._last_id - POLL_OVERLAP)
+                .order_by(CacheEvent.id)
+            )
+            rows = result.all()
+
+        for event_id, origin, channel, payload in rows:
+            if event_id in self._seen:
+                continue
+            self._seen.add(event_id)
+            self._last_id = max(self._last_id, event_id)
+            if origin != self.origin:
+                await self.dispatch(channel, payload)
+        self._seen = {event_id for event_id in self._seen if event_id > self._last_id - POLL_OVERLAP}
+
+    async def dispatch(self, channel: str, payload: Any):
+        for handler in self._handlers.get(channel, []):
+            try:
+                result = handler(payload)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"INVALIDATION: {channel} handler failed: {e}")
+
+
+async def purge_old_events(db):
+    await db.execute(delete(CacheEvent).where(CacheEvent.created_at < datetime.now(timezone.utc) - EVENTS_RETENTION))
+    await db.commit()
+
+
+bus = InvalidationBus(settings.invalidation_backend, settings.invalidation_poll_seconds)
+# ShardRouter (app/database.py) не может импортировать этот модуль: подписка здесь
+bus.subscribe(SHARD_PLACEMENTS, lambda payload: shards.load_placements())
@@ -1,61 +1,459 @@
-from sqlalchemy import text
-from app.database import engine
+import asyncio
+import hashlib
+from datetime import date, datetime, timezone
+from typing import List
+from sqlalchemy import BigInteger, Integer, bindparam, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.database import Base, DEFAULT_SHARD, engine, init_db, shards
 from app.config import settings
-import asyncpg
+from app.utils.search import REQUEST_SEARCH_DOCUMENT_SQL, USER_SEARCH_NAME_SQL
+from app.models.request import CLAIM_INDEX_WHERE
 
-async def run_auto_migration():
+# Bump when run_auto_migration gets a new step; model changes are covered by schema_fingerprint()
+SCHEMA_VERSION = 11
+
+
+async def add_column(conn, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN if missing (SQLite has no ADD COLUMN IF NOT EXISTS)"""
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {ddl};"))
+        return
+    columns = (await conn.execute(text(f"PRAGMA table_info({table});"))).all()
+    if column not in {c[1] for c in columns}:
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl};"))
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# request_history up to this many rows is partitioned during the startup migration;
+# a larger one with python -m scripts.partition_history (batched, resumable)
+HISTORY_INLINE_ROWS = 50000
+HISTORY_COPY_BATCH = 10000
+# The partitioned copy while request_history is being converted
+HISTORY_COPY = "request_history_new"
+
+
+async def _history_partitioned(conn, table: str = "request_history") -> bool:
+    if conn.dialect.name != "postgresql":
+        return False  # partitions exist only on PostgreSQL
+    result = await conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table);"
+    ), {"table": table})
+    return result.first() is not None
+
+
+async def ensure_history_partitions(conn, months_ahead: int, since: date = None, table: str = "request_history"):
+    """
+    Create monthly partitions of request_history from `since` (default: this month)
+    up to `months_ahead` months ahead. PostgreSQL only; no-op if the table is not partitioned.
+    Rows outside all monthly partitions go to request_history_default; a month cannot be
+    created while the default partition holds rows for it, so partitions are created ahead.
+    `table` is the parent to attach to (HISTORY_COPY during conversion); partition names are the same.
+    """
+    if not await _history_partitioned(conn, table):
+        return
+    month = since or datetime.now(timezone.utc).date().replace(day=1)
+    last = _add_months(datetime.now(timezone.utc).date().replace(day=1), months_ahead)
+    while month <= last:
+        following = _add_months(month, 1)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS request_history_y{month.year}m{month.month:02d} "
+            f"PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{following.isoformat()} 00:00:00+00');"
+        ))
+        month = following
+
+
+async def _create_history_copy(conn, months_ahead: int):
+    """
+    Empty partitioned twin of request_history. The primary key becomes (id, created_at):
+    PostgreSQL requires the partition key in it. Foreign keys are there from the start, so
+    cascades from requests and users reach rows that are already copied.
+    """
+    await conn.execute(text(
+        f"CREATE TABLE {HISTORY_COPY} (LIKE request_history INCLUDING DEFAULTS) PARTITION BY RANGE (created_at);"
+    ))
+    await conn.execute(text(f"ALTER TABLE {HISTORY_COPY} ALTER COLUMN created_at SET NOT NULL;"))
+    await conn.execute(text(f"ALTER TABLE {HISTORY_COPY} ADD PRIMARY KEY (id, created_at);"))
+    # Foreign key names are per table, so the final names can be used right away
+    await conn.execute(text(
+        f"ALTER TABLE {HISTORY_COPY} ADD CONSTRAINT request_history_request_id_fkey "
+        f"FOREIGN KEY (request_id) REFERENCES requests(id) ON DELETE CASCADE;"
+    ))
+    await conn.execute(text(
+        f"ALTER TABLE {HISTORY_COPY} ADD CONSTRAINT request_history_changed_by_fkey "
+        f"FOREIGN KEY (changed_by) REFERENCES users(id) ON DELETE SET NULL;"
+    ))
+    await conn.execute(text(
+        f"CREATE INDEX ix_{HISTORY_COPY}_request ON {HISTORY_COPY} (request_id, created_at);"
+    ))
+    await conn.execute(text(f"CREATE TABLE request_history_default PARTITION OF {HISTORY_COPY} DEFAULT;"))
+
+    oldest = (await conn.execute(text("SELECT min(created_at) FROM request_history;"))).scalar()
+    since = oldest.astimezone(timezone.utc).date().replace(day=1) if oldest else None
+    await ensure_history_partitions(conn, months_ahead, since, table=HISTORY_COPY)
+
+
+async def _copy_history_batch(conn, after: int, batch_size: int):
+    """
+    Copy up to batch_size rows with id > after - batch_size that are not copied yet.
+    The overlap picks up rows whose transactions committed after a later id was copied.
+    Returns (rows copied, highest copied id or `after`).
+    """
+    columns = (await conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = 'request_history' AND table_schema = current_schema() ORDER BY ordinal_position;"
+    ))).scalars().all()
+    select_list = ", ".join("coalesce(o.created_at, now())" if c == "created_at" else f"o.{c}" for c in columns)
+    result = await conn.execute(text(
+        f"WITH copied AS ("
+        f" INSERT INTO {HISTORY_COPY} ({', '.join(columns)})"
+        f" SELECT {select_list} FROM request_history o"
+        f" WHERE o.id > :since"
+        f" AND NOT EXISTS (SELECT 1 FROM {HISTORY_COPY} n WHERE n.id = o.id)"
+        f" ORDER BY o.id LIMIT :batch"
+        f" RETURNING id"
+        f") SELECT count(*), coalesce(max(id), 0) FROM copied;"
+    ).bindparams(bindparam("since", type_=BigInteger), bindparam("batch", type_=Integer)),
+        {"since": after - batch_size, "batch": batch_size})
+    copied, last = result.one()
+    return copied, max(last, after)
+
+
+async def partition_request_history(shard_engine: AsyncEngine, months_ahead: int,
+                                    batch_size: int = HISTORY_COPY_BATCH, pause: float = 0.0) -> bool:
+    """
+    Convert a plain request_history into one range-partitioned by month of created_at (PostgreSQL).
+    Every step commits on its own, so the conversion can be interrupted and run again:
+    1. HISTORY_COPY is created (see _create_history_copy);
+    2. rows are copied in id batches while the application keeps writing to request_history;
+    3. one short transaction blocks writes to request_history, copies the rest and swaps the tables.
+    `pause` seconds between batches leaves the database room for regular traffic.
+    Returns False if request_history is already partitioned.
     """
-    Automatic migration to fix schema drift (missing columns/enum values) on startup.
-    Safe to run multiple times. Non-fatal if it fails.
+    async with shard_engine.begin() as conn:
+        if await _history_partitioned(conn):
+            return False
+        if not await _history_partitioned(conn, HISTORY_COPY):
+            await _create_history_copy(conn, months_ahead)
+        after = (await conn.execute(text(f"SELECT coalesce(max(id), 0) FROM {HISTORY_COPY};"))).scalar()
+
+    total = 0
+    while True:
+        async with shard_engine.begin() as conn:
+            copied, after = await _copy_history_batch(conn, after, batch_size)
+        if not copied:
+            break
+        total += copied
+        print(f"MIGRATION: request_history: {total} rows copied (id up to {after}).")
+        if pause:
+            await asyncio.sleep(pause)
+
+    async with shard_engine.begin() as conn:
+        # Do not queue behind long transactions with every writer waiting behind us: fail and retry later
+        await conn.execute(text("SET LOCAL lock_timeout = '10s';"))
+        await conn.execute(text("LOCK TABLE request_history IN EXCLUSIVE MODE;"))
+        copied = True
+        while copied:
+            copied, after = await _copy_history_batch(conn, after, batch_size)
+        # The id sequence belongs to the old table and would be dropped with it
+        await conn.execute(text(f"ALTER SEQUENCE request_history_id_seq OWNED BY {HISTORY_COPY}.id;"))
+        await conn.execute(text("DROP TABLE request_history;"))
+        await conn.execute(text(f"ALTER TABLE {HISTORY_COPY} RENAME TO request_history;"))
+        await conn.execute(text(f"ALTER INDEX {HISTORY_COPY}_pkey RENAME TO request_history_pkey;"))
+        await conn.execute(text(f"ALTER INDEX ix_{HISTORY_COPY}_request RENAME TO ix_request_history_request;"))
+    return True
+
+
+async def _history_rows_over(conn, limit: int) -> bool:
+    """request_history has more than `limit` rows (reads at most limit + 1)"""
+    result = await conn.execute(text(
+        "SELECT count(*) FROM (SELECT 1 FROM request_history LIMIT :limit) AS t;"
+    ), {"limit": limit + 1})
+    return result.scalar() > limit
+
+
+async def run_auto_migration(shard_engine: AsyncEngine = engine, shard: str = DEFAULT_SHARD):
     """
-    print("STARTING AUTO-MIGRATION checking...")
+    Automatic migration of one shard to fix schema drift (missing columns/enum values) on startup.
+    Safe to run multiple times. Non-fatal if it fails; returns False if any step was skipped.
+    """
+    print(f"STARTING AUTO-MIGRATION checking (shard {shard})...")
+    
+    ok = True
     
     # Step 1: Add enum value using raw asyncpg (requires autocommit, can't be in transaction)
-    try:
-        print("Checking requeststatus enum for 'cancelled' value...")
-        # Get database URL and convert to asyncpg format
-        db_url = settings.database_url
-        if db_url.startswith("postgresql+asyncpg://"):
-            db_url = db_url.replace("postgresql+asyncpg://", "postgresql://")
-        
-        conn = await asyncpg.connect(db_url)
+    if shard_engine.dialect.name == "postgresql":
         try:
-            # Check if value already exists
-            result = await conn.fetch(
-                "SELECT enumlabel FROM pg_enum WHERE enumtypid = 'requeststatus'::regtype AND enumlabel = 'CANCELLED'"
-            )
-            if not result:
-                await conn.execute("ALTER TYPE requeststatus ADD VALUE 'CANCELLED'")
-                print("MIGRATION: 'CANCELLED' enum value added to requeststatus.")
-            else:
-                print("MIGRATION: 'cancelled' enum value already exists.")
-        finally:
-            await conn.close()
-    except Exception as enum_err:
-        print(f"MIGRATION: enum update skipped: {enum_err}")
+            import asyncpg
+            
+            print("Checking requeststatus enum for 'cancelled' value...")
+            # Shard database URL in plain asyncpg format
+            db_url = shard_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+            
+            conn = await asyncpg.connect(db_url)
+            try:
+                # Check if value already exists
+                result = await conn.fetch(
+                    "SELECT enumlabel FROM pg_enum WHERE enumtypid = 'requeststatus'::regtype AND enumlabel = 'CANCELLED'"
+                )
+                if not result:
+                    await conn.execute("ALTER TYPE requeststatus ADD VALUE 'CANCELLED'")
+                    print("MIGRATION: 'CANCELLED' enum value added to requeststatus.")
+                else:
+                    print("MIGRATION: 'cancelled' enum value already exists.")
+            finally:
+                await conn.close()
+        except Exception as enum_err:
+            print(f"MIGRATION: enum update skipped: {enum_err}")
+            ok = False
     
     # Step 2: Other migrations using SQLAlchemy (these work in transactions)
     try:
-        async with engine.begin() as conn:
+        async with shard_engine.begin() as conn:
             try:
                 # Add address column to companies
                 print("Checking companies.address...")
-                await conn.execute(text("ALTER TABLE companies ADD COLUMN IF NOT EXISTS address VARCHAR(500);"))
+                await add_column(conn, "companies", "address", "VARCHAR(500)")
                 print("MIGRATION: 'address' column check/add completed.")
                 
-                # Resize phone column
-                print("Checking companies.phone...")
-                try:
-                    await conn.execute(text("ALTER TABLE companies ALTER COLUMN phone TYPE VARCHAR(255);"))
-                    print("MIGRATION: 'phone' column resize completed.")
-                except Exception as phone_err:
-                    print(f"MIGRATION: phone resize skipped: {phone_err}")
+                # Resize phone column (SQLite does not enforce VARCHAR length)
+                if conn.dialect.name == "postgresql":
+                    print("Checking companies.phone...")
+                    try:
+                        await conn.execute(text("ALTER TABLE companies ALTER COLUMN phone TYPE VARCHAR(255);"))
+                        print("MIGRATION: 'phone' column resize completed.")
+                    except Exception as phone_err:
+                        print(f"MIGRATION: phone resize skipped: {phone_err}")
 
             except Exception as e:
                 print(f"MIGRATION WARNING (Non-critical): {e}")
+                ok = False
     except Exception as outer_e:
         print(f"MIGRATION SKIPPED (connection issue): {outer_e}")
+        ok = False
+    
+    # Step 3: Unique (company_id, address) for bulk import upserts. Existing duplicates are
+    # renamed first (every copy but the oldest gets " (дубль <id>)"): merging them would have to
+    # move residents, requests and incidents, so that is left to the company's staff
+    try:
+        async with shard_engine.begin() as conn:
+            print("Checking houses (company_id, address) uniqueness...")
+            renamed = await conn.execute(text(
+                "UPDATE houses SET address = substr(address, 1, 480) || ' (дубль ' || CAST(id AS VARCHAR) || ')' "
+                "WHERE EXISTS (SELECT 1 FROM houses AS older WHERE older.company_id = houses.company_id "
+                "AND older.address = houses.address AND older.id < houses.id);"
+            ))
+            if renamed.rowcount:
+                print(f"MIGRATION: renamed {renamed.rowcount} duplicate house addresses to '<address> (дубль <id>)'.")
+            await conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_houses_company_address ON houses (company_id, address);"
+            ))
+            print("MIGRATION: houses unique index check/add completed.")
+    except Exception as unique_err:
+        print(f"MIGRATION: houses unique index skipped: {unique_err}")
+        ok = False
+    
+    # Step 4: Full-text search indexes (PostgreSQL only, see app/utils/search.py)
+    if shard_engine.dialect.name == "postgresql":
+        try:
+            async with shard_engine.begin() as conn:
+                print("Checking search indexes...")
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+                await conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_requests_search ON requests USING gin ({REQUEST_SEARCH_DOCUMENT_SQL});"
+                ))
+                await conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_requests_title_trgm ON requests USING gin (title gin_trgm_ops);"
+                ))
+                await conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin ({USER_SEARCH_NAME_SQL} gin_trgm_ops);"
+                ))
+                print("MIGRATION: search indexes check/add completed.")
+        except Exception as search_err:
+            print(f"MIGRATION: search indexes skipped: {search_err}")
+            ok = False
+    
+    # Step 5: requests.incident_id (mass-incident grouping, see app/utils/incidents.py)
+    try:
+        async with shard_engine.begin() as conn:
+            print("Checking requests.incident_id...")
+            await add_column(conn, "requests", "incident_id", "INTEGER REFERENCES incidents(id) ON DELETE SET NULL")
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_requests_incident_id ON requests (incident_id);"
+            ))
+            print("MIGRATION: requests.incident_id check/add completed.")
+    except Exception as incident_err:
+        print(f"MIGRATION: requests.incident_id skipped: {incident_err}")
+        ok = False
+    
+    # Step 6: dispatcher work queue (POST /api/requests/claim-next)
+    try:
+        async with shard_engine.begin() as conn:
+            print("Checking requests.company_id / assignee_id...")
+            await add_column(conn, "requests", "company_id", "INTEGER REFERENCES companies(id) ON DELETE SET NULL")
+            await add_column(conn, "requests", "assignee_id", "INTEGER REFERENCES users(id) ON DELETE SET NULL")
+            await conn.execute(text(
+                "UPDATE requests SET company_id = ("
+                "SELECT houses.company_id FROM users JOIN houses ON houses.id = users.house_id "
+                "WHERE users.id = requests.user_id) WHERE company_id IS NULL;"
+            ))
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_requests_assignee_id ON requests (assignee_id);"
+            ))
+            print("MIGRATION: request queue columns check/add completed.")
+    except Exception as queue_err:
+        print(f"MIGRATION: request queue columns skipped: {queue_err}")
+        ok = False
+    
+    # Step 7: SLA escalation columns (app/utils/sla.py); the dispatcher queue index now includes priority
+    try:
+        async with shard_engine.begin() as conn:
+            print("Checking requests SLA columns...")
+            await add_column(conn, "requests", "status_changed_at", "TIMESTAMP WITH TIME ZONE")
+            await add_column(conn, "requests", "priority", "INTEGER NOT NULL DEFAULT 0")
+            await add_column(conn, "requests", "escalated_at", "TIMESTAMP WITH TIME ZONE")
+            await conn.execute(text(
+                "UPDATE requests SET status_changed_at = updated_at WHERE status_changed_at IS NULL;"
+            ))
+            await conn.execute(text("DROP INDEX IF EXISTS ix_requests_claim;"))
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_requests_queue ON requests (company_id, priority DESC, created_at) "
+                f"WHERE {CLAIM_INDEX_WHERE};"
+            ))
+            print("MIGRATION: requests SLA columns check/add completed.")
+    except Exception as sla_err:
+        print(f"MIGRATION: requests SLA columns skipped: {sla_err}")
+        ok = False
+    
+    # Step 8: request_history partitioned by month (PostgreSQL) and the (request_id, created_at) index.
+    # A large table is not copied on startup: scripts/partition_history.py does it in batches
+    try:
+        print("Checking request_history partitions...")
+        if shard_engine.dialect.name == "postgresql":
+            async with shard_engine.connect() as conn:
+                convert = not await _history_partitioned(conn)
+                inline = convert and not await _history_rows_over(conn, HISTORY_INLINE_ROWS)
+            if inline:
+                await partition_request_history(shard_engine, settings.history_partitions_ahead)
+                print("MIGRATION: request_history converted to a partitioned table.")
+            elif convert:
+                print(
+                    f"MIGRATION: request_history has over {HISTORY_INLINE_ROWS} rows and is not partitioned yet: "
+                    f"run python -m scripts.partition_history --shard {shard}"
+                )
+                ok = False
+        async with shard_engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                await ensure_history_partitions(conn, settings.history_partitions_ahead)
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_request_history_request ON request_history (request_id, created_at);"
+            ))
+            print("MIGRATION: request_history partitions check/add completed.")
+    except Exception as history_err:
+        print(f"MIGRATION: request_history partitions skipped: {history_err}")
+        ok = False
+    
+    # Step 9: indexes for list filters (see tests/test_query_plans.py);
+    # houses.company_id is covered by uq_houses_company_address
+    try:
+        async with shard_engine.begin() as conn:
+            print("Checking list filter indexes...")
+            for name, table, columns in [
+                ("ix_requests_user_created", "requests", "user_id, created_at"),
+                ("ix_requests_status_created", "requests", "status, created_at"),
+                ("ix_requests_created", "requests", "created_at"),
+                ("ix_users_house_id", "users", "house_id"),
+                ("ix_users_company_id", "users", "company_id"),
+            ]:
+                await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns});"))
+            print("MIGRATION: list filter indexes check/add completed.")
+    except Exception as index_err:
+        print(f"MIGRATION: list filter indexes skipped: {index_err}")
+        ok = False
     
-    print("AUTO-MIGRATION FINISHED.")
+    # Step 10: the house a request was filed from (rollups and analytics must not follow a resident
+    # who moved). Old requests get the resident's current house if it is still in the request's company
+    try:
+        async with shard_engine.begin() as conn:
+            print("Checking requests.house_id...")
+            await add_column(conn, "requests", "house_id", "INTEGER REFERENCES houses(id) ON DELETE SET NULL")
+            await add_column(conn, "requests_archive", "house_id", "INTEGER")
+            for table in ("requests", "requests_archive"):
+                await conn.execute(text(
+                    f"UPDATE {table} SET house_id = ("
+                    "SELECT users.house_id FROM users JOIN houses ON houses.id = users.house_id "
+                    f"WHERE users.id = {table}.user_id AND houses.company_id = {table}.company_id"
+                    ") WHERE house_id IS NULL;"
+                ))
+            print("MIGRATION: requests.house_id check/add completed.")
+    except Exception as house_err:
+        print(f"MIGRATION: requests.house_id skipped: {house_err}")
+        ok = False
+    
+    print("AUTO-MIGRATION FINISHED." if ok else "AUTO-MIGRATION FINISHED WITH SKIPPED STEPS.")
+    return ok
+
+
+def schema_fingerprint() -> str:
+    """SCHEMA_VERSION plus a hash of the tables, columns and indexes declared by the models"""
+    import app.models  # noqa: F401 - every model must be registered in Base.metadata
+    digest = hashlib.sha256()
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"{column.name}:{column.type!r}:{column.nullable}:{column.primary_key};".encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            digest.update(f"{index.name}:{[str(e) for e in index.expressions]}:{index.unique};".encode())
+    return f"{SCHEMA_VERSION}.{digest.hexdigest()[:16]}"
+
+
+async def _stored_version(shard_engine):
+    try:
+        async with shard_engine.connect() as conn:
+            return (await conn.execute(text("SELECT version FROM schema_version WHERE id = 1;"))).scalar()
+    except Exception:
+        # No table yet: a new database or one created before schema_version existed
+        return None
+
 
+async def stale_shards() -> List[str]:
+    """Shards whose recorded schema version is not schema_fingerprint()"""
+    expected = schema_fingerprint()
+    versions = await asyncio.gather(*(_stored_version(e) for e in shards.engines.values()))
+    return [shard for shard, version in zip(shards.names, versions) if version != expected]
 
+
+async def schema_is_current() -> bool:
+    """True if every shard is already at schema_fingerprint()"""
+    return not await stale_shards()
+
+
+async def record_schema_version(shard_engine: AsyncEngine):
+    async with shard_engine.begin() as conn:
+        await conn.execute(text("DELETE FROM schema_version;"))
+        await conn.execute(
+            text("INSERT INTO schema_version (id, version) VALUES (1, :version);"), {"version": schema_fingerprint()}
+        )
+
+
+async def ensure_schema():
+    """
+    Startup schema work: create_all and run_auto_migration on every shard whose recorded
+    schema version is outdated; skipped (one SELECT per shard) when all are current.
+    A shard's version is recorded only after its own migration ran without skipped steps,
+    so failed steps are retried on that shard next start.
+    """
+    stale = await stale_shards()
+    if not stale:
+        print("MIGRATION: schema is up to date, create_all and auto-migration skipped.")
+        await shards.load_placements()
+        return
+    await init_db()
+    for shard in stale:
+        shard_engine = shards.engines[shard]
+        if await run_auto_migration(shard_engine, shard):
+            await record_schema_version(shard_engine)
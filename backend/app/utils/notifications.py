@@ -0,0 +1,73 @@
+"""
+Уведомления жильцов о смене статуса заявки.
+
+Смена статуса ставит задачу notify_request_status с задержкой
+settings.notify_coalesce_seconds и dedupe_key по заявке: пока задача ждёт,
+новые переходы той же заявки не создают новых задач, и жилец получает одно
+сообщение с актуальным статусом.
+"""
+from datetime import datetime, timedelta, timezone
+from html import escape
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.config import settings
+from app.models.job import Job
+from app.models.user import User
+from app.models.request import Request
+from app.schemas.request import STATUS_LABELS
+from app.utils.telegram import notifier
+from app.worker import enqueue
+
+NOTIFY_TASK = "notify_request_status"
+
+
+def _dedupe_key(request_id: int) -> str:
+    return f"{NOTIFY_TASK}:{request_id}"
+
+
+async def queue_status_notification(db: AsyncSession, request: Request, changed_by: User):
+    """Поставить уведомление в очередь (в транзакции смены статуса)"""
+    if request.user_id == changed_by.id:
+        return
+    await enqueue_status_notification(db, request.id)
+
+
+async def enqueue_status_notification(db: AsyncSession, request_id: int):
+    await enqueue(
+        db,
+        NOTIFY_TASK,
+        {"request_id": request_id},
+        run_at=datetime.now(timezone.utc) + timedelta(seconds=settings.notify_coalesce_seconds),
+        dedupe_key=_dedupe_key(request_id),
+    )
+
+
+def status_message(request: Request) -> str:
+    text = f"Заявка #{request.id} «{escape(request.title)}»\nСтатус: <b>{STATUS_LABELS[request.status]}</b>"
+    last = request.history[-1] if request.history else None
+    if last and last.new_status == request.status and last.comment:
+        text += f"\n{escape(last.comment)}"
+    return text
+
+
+async def send_status_notification(db: AsyncSession, request_id: int):
+    """Отправить жильцу актуальный статус заявки"""
+    # Сначала освобождаем ключ: переходы после этого момента поставят новую задачу
+    await db.execute(
+        update(Job).where(Job.dedupe_key == _dedupe_key(request_id)).values(dedupe_key=None)
+    )
+    await db.commit()
+
+    result = await db.execute(
+        select(Request)
+        .options(selectinload(Request.user), selectinload(Request.history))
+        .where(Request.id == request_id)
+    )
+    request = result.scalar_one_or_none()
+    if not request or not request.user or not settings.telegram_bot_token:
+        return
+
+    await notifier.send_message(request.user.telegram_id, status_message(request))
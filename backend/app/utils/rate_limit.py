@@ -0,0 +1,341 @@
+"""
+Ограничение частоты: token bucket (исходящие сообщения Telegram) и middleware
+лимитов API на скользящих окнах.
+
+Счётчики окон хранятся в памяти процесса (rate_limit_backend=memory) или в Redis
+(rate_limit_backend=redis) - тогда лимит общий для всех воркеров и контейнеров.
+IP клиента за прокси берётся из X-Forwarded-For, если запрос пришёл от адреса
+из forwarded_allow_ips.
+"""
+import asyncio
+import ipaddress
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+
+class TokenBucket:
+    """
+    Ведро на capacity токенов, пополняется со скоростью rate токенов в секунду.
+    acquire() ждёт токен, try_acquire() отвечает сразу.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Сколько секунд ждать, пока наберётся tokens токенов"""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.wait_time(tokens))
+
+
+# ============== Ограничение частоты запросов к API ==============
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+SCOPES = ("ip", "user", "company")
+# Сколько счётчиков держать в памяти процесса; сверх этого вытесняются давно не использованные
+MAX_COUNTERS = 100000
+
+
+@dataclass(frozen=True)
+class Limit:
+    scope: str    # ip, user (telegram_id из токена) или company (company_id или tenant_id из токена)
+    count: int
+    period: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "Limit":
+        """'ip:20/minute' -> Limit('ip', 20, 60)"""
+        scope, _, rate = spec.strip().partition(":")
+        count, _, period = rate.partition("/")
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown rate limit scope: {scope!r}")
+        seconds = PERIODS[period] if period in PERIODS else float(period)
+        return cls(scope, int(count), seconds)
+
+
+def parse_rules(rules: Dict[str, str]) -> List[Tuple[Optional[str], str, List[Limit]]]:
+    """
+    {"POST /api/auth/telegram": "ip:20/minute", "/api": "user:600/minute; ip:1200/minute"} ->
+    [(метод или None, префикс пути, лимиты)], самые точные правила первыми
+    """
+    parsed = []
+    for route, spec in rules.items():
+        method, _, prefix = route.strip().rpartition(" ")
+        limits = [Limit.parse(part) for part in spec.split(";") if part.strip()]
+        parsed.append((method.upper() or None, prefix.rstrip("/") or "/", limits))
+    parsed.sort(key=lambda rule: (len(rule[1]), rule[0] is not None), reverse=True)
+    return parsed
+
+
+def window_wait(previous: int, current: int, elapsed: float, limit: Limit) -> float:
+    """
+    Скользящее окно по двум фиксированным: запросов за последние period секунд
+    ~ previous * (1 - elapsed / period) + current. 0 - ещё один запрос укладывается
+    в лимит, иначе - через сколько секунд уложится.
+    """
+    if previous * (1 - elapsed / limit.period) + current < limit.count:
+        return 0.0
+    if current >= limit.count or previous == 0:
+        return limit.period - elapsed
+    # Вклад предыдущего окна убывает линейно: ждём, пока он опустится ниже count - current
+    return max(limit.period * (1 - (limit.count - current) / previous) - elapsed, 0.001)
+
+
+Counters = List[Tuple[tuple, Limit]]
+
+
+class MemoryWindowStore:
+    """Счётчики окон в памяти процесса, LRU на max_keys ключей"""
+
+    def __init__(self, max_keys: int = MAX_COUNTERS):
+        self.max_keys = max_keys
+        # ключ -> [номер окна, запросов в предыдущем окне, в текущем]
+        self._counters: "OrderedDict[tuple, List[int]]" = OrderedDict()
+
+    def _counter(self, key: tuple, window: int) -> List[int]:
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = [window, 0, 0]
+            if len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+        else:
+            self._counters.move_to_end(key)
+        if counter[0] != window:
+            counter[1] = counter[2] if counter[0] == window - 1 else 0
+            counter[2] = 0
+            counter[0] = window
+        return counter
+
+    async def hit(self, keys: Counters, now: float) -> float:
+        """Засчитать запрос во все окна, если он укладывается во все лимиты; иначе - сколько ждать"""
+        counters, wait = [], 0.0
+        for key, limit in keys:
+            window, elapsed = divmod(now, limit.period)
+            counter = self._counter(key, int(window))
+            counters.append(counter)
+            wait = max(wait, window_wait(counter[1], counter[2], elapsed, limit))
+        if wait == 0:
+            for counter in counters:
+                counter[2] += 1
+        return wait
+
+
+# KEYS - пары (текущее окно, предыдущее окно) на каждый лимит, ARGV - now и (count, period) на лимит.
+# Проверка и увеличение всех счётчиков атомарны: Redis выполняет скрипт целиком.
+REDIS_HIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local allowed = 1
+local counts = {}
+for i = 1, #KEYS, 2 do
+    local count = tonumber(ARGV[i + 1])
+    local period = tonumber(ARGV[i + 2])
+    local current = tonumber(redis.call("GET", KEYS[i]) or "0")
+    local previous = tonumber(redis.call("GET", KEYS[i + 1]) or "0")
+    if previous * (1 - (now % period) / period) + current >= count then
+        allowed = 0
+    end
+    table.insert(counts, previous)
+    table.insert(counts, current)
+end
+if allowed == 1 then
+    for i = 1, #KEYS, 2 do
+        redis.call("INCR", KEYS[i])
+        redis.call("EXPIRE", KEYS[i], math.ceil(tonumber(ARGV[i + 2]) * 2))
+    end
+end
+table.insert(counts, 1, allowed)
+return counts
+"""
+
+
+class RedisWindowStore:
+    """Счётчики окон в Redis, общие для всех процессов API"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._script = None
+
+    def _hit_script(self):
+        if self._script is None:
+            # Необязательная зависимость (pip install redis): нужна только с rate_limit_backend=redis
+            import redis.asyncio as redis
+            self._script = redis.from_url(self.url).register_script(REDIS_HIT_SCRIPT)
+        return self._script
+
+    async def hit(self, keys: Counters, now: float) -> float:
+        redis_keys, args = [], [now]
+        for key, limit in keys:
+            window = int(now // limit.period)
+            name = "rate:" + ":".join(str(part) for part in key)
+            redis_keys += [f"{name}:{window}", f"{name}:{window - 1}"]
+            args += [limit.count, limit.period]
+        try:
+            allowed, *counts = await self._hit_script()(keys=redis_keys, args=args)
+        except Exception as e:
+            # Лимиты - защита, а не условие работы: без Redis запросы пропускаются
+            print(f"RATE LIMIT: redis unavailable, request allowed: {e}")
+            return 0.0
+        if allowed:
+            return 0.0
+        return max(
+            window_wait(int(counts[i * 2]), int(counts[i * 2 + 1]), now % limit.period, limit)
+            for i, (_, limit) in enumerate(keys)
+        ) or 0.001
+
+
+def window_store(backend: str, redis_url: str):
+    if backend == "redis":
+        return RedisWindowStore(redis_url)
+    return MemoryWindowStore()
+
+
+class RateLimiter:
+    """Скользящее окно на каждое (правило, лимит, ключ); счётчики - в store"""
+
+    def __init__(self, rules: Dict[str, str], store=None):
+        self.rules = parse_rules(rules)
+        self.store = store or MemoryWindowStore()
+
+    def match(self, method: str, path: str) -> Optional[Tuple[str, List[Limit]]]:
+        for rule_method, prefix, limits in self.rules:
+            if rule_method and rule_method != method:
+                continue
+            if path == prefix or path.startswith(prefix + "/") or prefix == "/":
+                return f"{rule_method or '*'} {prefix}", limits
+        return None
+
+    async def check(self, rule: str, limits: List[Limit], identity: Dict[str, Optional[str]]) -> float:
+        """
+        Засчитать запрос по всем лимитам правила.
+        Возвращает 0, если запрос разрешён, иначе - сколько секунд подождать.
+        """
+        keys = [
+            ((rule, limit.scope, limit.count, limit.period, identity[limit.scope]), limit)
+            for limit in limits if identity.get(limit.scope) is not None
+        ]
+        if not keys:
+            return 0.0
+        return await self.store.hit(keys, time.time())
+
+
+class TrustedProxies:
+    """Адреса прокси из forwarded_allow_ips ("*", IP и подсети через запятую)"""
+
+    def __init__(self, spec: str):
+        parts = [part.strip() for part in spec.split(",") if part.strip()]
+        self.any = "*" in parts
+        self.networks = [ipaddress.ip_network(part, strict=False) for part in parts if part != "*"]
+
+    def __contains__(self, host: Optional[str]) -> bool:
+        if self.any:
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+    def client_ip(self, peer: Optional[str], forwarded_for: str) -> Optional[str]:
+        """
+        IP клиента: peer, если он не доверенный прокси; иначе - ближайший к нам
+        недоверенный адрес X-Forwarded-For (левее него клиент может подделать)
+        """
+        if peer is None or peer not in self:
+            return peer
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if hop not in self:
+                return hop
+        return hops[0] if hops else peer
+
+
+class RateLimitMiddleware:
+    """
+    ASGI-middleware: отклоняет запросы сверх лимитов settings.rate_limits
+    до маршрутизации, то есть до открытия сессии БД в get_db.
+    user/company берутся из JWT без обращения к БД.
+    """
+
+    def __init__(self, app, rules: Dict[str, str], backend: str = "memory", redis_url: str = "",
+                 forwarded_allow_ips: str = "127.0.0.1"):
+        self.app = app
+        self.limiter = RateLimiter(rules, window_store(backend, redis_url))
+        self.proxies = TrustedProxies(forwarded_allow_ips)
+
+    def _identity(self, scope, limits: List[Limit]) -> Dict[str, Optional[str]]:
+        client = scope.get("client")
+        headers = Headers(scope=scope)
+        ip = self.proxies.client_ip(client[0] if client else None, headers.get("x-forwarded-for", ""))
+        identity = {"ip": ip, "user": None, "company": None}
+        if any(limit.scope != "ip" for limit in limits):
+            authorization = headers.get("authorization", "")
+            if authorization.lower().startswith("bearer "):
+                # Импорт здесь: app.utils.auth тянет за собой модели и БД
+                from app.utils.auth import decode_access_token
+                payload = decode_access_token(authorization[7:]) or {}
+                if payload.get("telegram_id"):
+                    identity["user"] = str(payload["telegram_id"])
+                # У жильца нет company_id, его УК - tenant_id (УК дома)
+                company = payload.get("company_id") or payload.get("tenant_id")
+                if company:
+                    identity["company"] = str(company)
+        return identity
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        matched = self.limiter.match(scope["method"], scope["path"])
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        rule, limits = matched
+        wait = await self.limiter.check(rule, limits, self._identity(scope, limits))
+        if wait > 0:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Слишком много запросов, попробуйте позже"},
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
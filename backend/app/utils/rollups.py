@@ -0,0 +1,125 @@
+"""
+Инкрементальные почасовые и посуточные сводки по заявкам.
+
+Периодическая задача воркера (app/worker/tasks.py) берёт записи request_history новее сохранённого watermark,
+агрегирует их в SQL по (company_id, house_id, category, status, bucket) и
+прибавляет счётчики к сводным таблицам. УК и дом берутся из заявки (на момент
+её создания), а не из текущего дома жильца. Watermark сдвигается в той же
+транзакции, поэтому каждая запись истории учитывается ровно один раз.
+
+Записи моложе ROLLUP_SAFETY_LAG не обрабатываются: id выдаются до коммита,
+и транзакция с меньшим id может закоммититься позже уже обработанной.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.request import Request, RequestHistory
+from app.models.rollup import RequestRollupHourly, RequestRollupDaily, RollupWatermark
+
+ROLLUP_BATCH_SIZE = 50000
+# Строк в одном INSERT ... ON CONFLICT: 6 параметров на строку, у asyncpg лимит 32767
+ROLLUP_INSERT_ROWS = 1000
+ROLLUP_SAFETY_LAG = timedelta(seconds=30)
+WATERMARK_NAME = "request_history"
+
+ROLLUPS = {
+    "hour": RequestRollupHourly,
+    "day": RequestRollupDaily,
+}
+
+_SQLITE_BUCKET_FORMATS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+
+def _bucket(dialect: str, granularity: str):
+    if dialect == "postgresql":
+        return func.date_trunc(granularity, RequestHistory.created_at)
+    return func.strftime(_SQLITE_BUCKET_FORMATS[granularity], RequestHistory.created_at)
+
+
+def _cutoff(dialect: str) -> datetime:
+    cutoff = datetime.now(timezone.utc) - ROLLUP_SAFETY_LAG
+    # SQLite хранит CURRENT_TIMESTAMP как наивное время UTC
+    return cutoff if dialect == "postgresql" else cutoff.replace(tzinfo=None)
+
+
+def _insert(dialect: str):
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+
+async def _get_watermark(db: AsyncSession) -> RollupWatermark:
+    result = await db.execute(
+        select(RollupWatermark).where(RollupWatermark.name == WATERMARK_NAME).with_for_update()
+    )
+    watermark = result.scalar_one_or_none()
+    if not watermark:
+        watermark = RollupWatermark(name=WATERMARK_NAME, last_history_id=0)
+        db.add(watermark)
+        await db.flush()
+    return watermark
+
+
+async def _rollup_range(db: AsyncSession, low: int, high: int):
+    dialect = db.bind.dialect.name
+    insert = _insert(dialect)
+
+    for granularity, model in ROLLUPS.items():
+        bucket = _bucket(dialect, granularity)
+        company_id = func.coalesce(Request.company_id, 0)
+        house_id = func.coalesce(Request.house_id, 0)
+        result = await db.execute(
+            select(company_id, house_id, Request.category, RequestHistory.new_status, bucket, func.count())
+            .select_from(RequestHistory)
+            .join(Request, RequestHistory.request_id == Request.id)
+            .where(RequestHistory.id > low, RequestHistory.id <= high)
+            .group_by(company_id, house_id, Request.category, RequestHistory.new_status, bucket)
+        )
+
+        counts: Dict[Tuple, int] = {}
+        for company, house, category, status, bucket_value, count in result.all():
+            if isinstance(bucket_value, str):
+                bucket_value = datetime.fromisoformat(bucket_value)
+            counts[(company, house, category, status, bucket_value)] = count
+        rows = [
+            {"company_id": c, "house_id": h, "category": cat, "status": st, "bucket": b, "count": n}
+            for (c, h, cat, st, b), n in counts.items()
+        ]
+        for start in range(0, len(rows), ROLLUP_INSERT_ROWS):
+            stmt = insert(model).values(rows[start:start + ROLLUP_INSERT_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[model.company_id, model.bucket, model.house_id, model.category, model.status],
+                set_={"count": model.count + stmt.excluded.count},
+            )
+            await db.execute(stmt)
+
+
+async def refresh_rollups(db: AsyncSession, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Обработать новые записи истории пачками, возвращает новый watermark"""
+    cutoff = _cutoff(db.bind.dialect.name)
+    while True:
+        watermark = await _get_watermark(db)
+        low = watermark.last_history_id
+        pending = (
+            select(RequestHistory.id)
+            .where(RequestHistory.id > low, RequestHistory.created_at < cutoff)
+            .order_by(RequestHistory.id)
+        )
+
+        # Верхняя граница пачки - id batch_size-й новой записи (или последней)
+        high = (await db.execute(pending.offset(batch_size - 1).limit(1))).scalar()
+        if high is None:
+            high = (await db.execute(select(func.max(pending.subquery().c.id)))).scalar()
+        if high is None:
+            await db.commit()
+            return low
+
+        await _rollup_range(db, low, high)
+        watermark.last_history_id = high
+        await db.commit()
+
@@ -0,0 +1,98 @@
+"""
+Полнотекстовый поиск по заявкам для диспетчеров.
+
+PostgreSQL: tsvector с русской морфологией по title/description (GIN-индекс
+ix_requests_search) + pg_trgm для опечаток в заголовке и имени жильца.
+SQLite: поиск подстрок через LIKE по тексту, нормализованному в Python
+(search_norm, app/utils/sqlite.py): "Течь" находит "течь", "течет" - "течёт".
+
+Числа в запросе трактуются как номер квартиры: "течь 45" найдёт заявки про
+течь из квартиры 45.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, func, literal, literal_column
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.user import User
+from app.models.request import Request
+from app.utils.sqlite import normalize_search_text
+
+# Выражения должны совпадать с индексами ix_requests_search и ix_users_name_trgm
+# (см. utils/migration.py), иначе планировщик не сможет их использовать.
+# Колонки не квалифицированы: title/description есть только в requests,
+# first_name/last_name - только в users.
+SEARCH_CONFIG = "russian"
+REQUEST_SEARCH_DOCUMENT_SQL = (
+    f"to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(title, '') || ' ' || coalesce(description, ''))"
+)
+USER_SEARCH_NAME_SQL = "(coalesce(first_name, '') || ' ' || coalesce(last_name, ''))"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def split_query(q: str) -> Tuple[str, List[str]]:
+    """Разделить строку поиска на текст и номера квартир"""
+    tokens = _TOKEN_RE.findall(q)
+    words = [t for t in tokens if not t.isdigit()]
+    numbers = [t for t in tokens if t.isdigit()]
+    return " ".join(words), numbers
+
+
+def _postgres_search(model, text_q: str, numbers: List[str]) -> Tuple[List[ColumnElement], ColumnElement]:
+    document = literal_column(REQUEST_SEARCH_DOCUMENT_SQL)
+    user_name = literal_column(USER_SEARCH_NAME_SQL)
+    conditions = []
+    rank = literal(0.0)
+
+    if text_q:
+        tsquery = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), text_q)
+        conditions.append(or_(
+            document.op("@@")(tsquery),
+            literal(text_q).op("<%")(model.title),
+            literal(text_q).op("<%")(user_name),
+        ))
+        rank = func.greatest(
+            func.ts_rank(document, tsquery),
+            func.word_similarity(text_q, model.title),
+            func.word_similarity(text_q, user_name) * 0.5,
+        )
+
+    if numbers:
+        conditions.append(User.apartment.in_(numbers))
+
+    return conditions, rank
+
+
+def _fallback_search(model, text_q: str, numbers: List[str]) -> Tuple[List[ColumnElement], ColumnElement]:
+    conditions = []
+    # search_norm регистрируется на каждой connection SQLite (app/utils/sqlite.py)
+    columns = (model.title, model.description, User.first_name, User.last_name)
+    for word in text_q.split():
+        word = normalize_search_text(word)
+        conditions.append(or_(*(
+            func.search_norm(column).contains(word, autoescape=True) for column in columns
+        )))
+    if numbers:
+        conditions.append(User.apartment.in_(numbers))
+    return conditions, literal(0.0)
+
+
+def request_search(q: str, dialect: str, model=Request) -> Optional[Tuple[ColumnElement, ColumnElement]]:
+    """
+    Условие поиска и выражение релевантности для запроса по Request JOIN User
+    (или по архивной модели с теми же колонками).
+
+    Возвращает None, если в строке поиска нет значимых токенов.
+    """
+    text_q, numbers = split_query(q)
+    if not text_q and not numbers:
+        return None
+
+    if dialect == "postgresql":
+        conditions, rank = _postgres_search(model, text_q, numbers)
+    else:
+        conditions, rank = _fallback_search(model, text_q, numbers)
+
+    return and_(*conditions), rank
@@ -0,0 +1,272 @@
+"""
+Эскалация заявок, которые дольше срока SLA остаются в одном статусе.
+
+Сроки задаются правилами SlaPolicy (УК + категория + статус, с запасными
+правилами для всех категорий и всех УК). Таймеры держит в памяти процесса
+SlaScheduler: куча (срок, шард, id заявки) и словарь актуальных таймеров -
+id заявок в разных шардах совпадают. Смена статуса ставит новый таймер или
+отменяет старый за O(log n) без обращения к БД; отменённые записи остаются в
+куче и отбрасываются при извлечении. При старте правила и таймеры
+восстанавливаются одним проходом по открытым заявкам всех шардов.
+
+Эскалация - условный UPDATE (статус не менялся, эскалации ещё не было),
+поэтому если планировщики нескольких процессов сработают на одну заявку,
+действия выполнит только один.
+"""
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import shards
+from app.models.user import User, UserRole
+from app.models.request import Request, RequestStatus, RequestCategory
+from app.models.sla import SlaPolicy
+from app.schemas.request import STATUS_LABELS
+from app.utils.telegram import notifier
+from app.config import settings
+from app.utils.invalidation import bus, SLA_RULES
+from app.worker import enqueue
+
+ESCALATION_TASK = "sla_escalation"
+
+# Статусы, для которых можно задать срок (в остальных заявка закрыта)
+SLA_STATUSES = [
+    RequestStatus.NEW,
+    RequestStatus.ACCEPTED,
+    RequestStatus.IN_PROGRESS,
+    RequestStatus.ON_HOLD,
+    RequestStatus.REOPENED,
+]
+
+# Максимальный сон планировщика: страховка от перевода системных часов
+MAX_SLEEP = 60.0
+REBUILD_BATCH_SIZE = 10000
+
+
+@dataclass(frozen=True)
+class SlaRule:
+    deadline_minutes: int
+    notify: bool
+    reassign: bool
+    raise_priority: bool
+
+
+PolicyKey = Tuple[Optional[int], Optional[RequestCategory], RequestStatus]
+# (шард, id заявки)
+TimerKey = Tuple[str, int]
+# (срок, УК, категория, статус, для которого поставлен таймер)
+Timer = Tuple[float, Optional[int], RequestCategory, RequestStatus]
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return time.time()
+    if value.tzinfo is None:
+        # SQLite возвращает наивное время UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class SlaScheduler:
+    def __init__(self):
+        self.rules: Dict[PolicyKey, SlaRule] = {}
+        self._timers: Dict[TimerKey, Timer] = {}
+        self._heap: List[Tuple[float, TimerKey]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def rule_for(self, company_id: Optional[int], category: RequestCategory, status: RequestStatus) -> Optional[SlaRule]:
+        """Самое точное правило: УК + категория, УК, все УК + категория, все УК"""
+        for key in ((company_id, category, status), (company_id, None, status),
+                    (None, category, status), (None, None, status)):
+            rule = self.rules.get(key)
+            if rule:
+                return rule
+        return None
+
+    def schedule(self, shard: str, request_id: int, company_id: Optional[int], category: RequestCategory,
+                 status: RequestStatus, changed_at: Optional[datetime]):
+        """Поставить таймер на текущий статус заявки (или снять, если правила нет)"""
+        rule = self.rule_for(company_id, category, status)
+        if rule is None:
+            self.cancel(shard, request_id)
+            return
+
+        key = (shard, request_id)
+        deadline = _timestamp(changed_at) + rule.deadline_minutes * 60
+        self._timers[key] = (deadline, company_id, category, status)
+        heapq.heappush(self._heap, (deadline, key))
+        if self._heap[0][1] == key and self._wakeup:
+            self._wakeup.set()
+        self._compact()
+
+    def track(self, shard: str, request: Request):
+        """Обновить таймер после смены статуса заявки из шарда shard (db.info["shard"])"""
+        if request.escalated_at is not None:
+            self.cancel(shard, request.id)
+            return
+        self.schedule(shard, request.id, request.company_id, request.category, request.status,
+                      request.status_changed_at)
+
+    def cancel(self, shard: str, request_id: int):
+        self._timers.pop((shard, request_id), None)
+
+    def _compact(self):
+        # Отменённые и переставленные таймеры копятся в куче; пересобираем, когда их больше половины
+        if len(self._heap) > 2 * len(self._timers) + 1000:
+            self._heap = [(timer[0], key) for key, timer in self._timers.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> List[Tuple[TimerKey, Timer]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, key = heapq.heappop(self._heap)
+            timer = self._timers.get(key)
+            if timer and timer[0] == deadline:
+                del self._timers[key]
+                due.append((key, timer))
+        return due
+
+    async def load(self):
+        """Загрузить правила и восстановить таймеры открытых заявок из всех шардов"""
+        async def load_policies(db: AsyncSession) -> List[SlaPolicy]:
+            result = await db.execute(select(SlaPolicy))
+            return list(result.scalars())
+
+        # Общие правила и правила, заданные суперадмином, лежат в default; правило из шарда самой УК - главнее
+        rules: Dict[PolicyKey, SlaRule] = {}
+        for shard, policies in await shards.fan_out(load_policies):
+            for p in policies:
+                key = (p.company_id, p.category, p.status)
+                if key not in rules or (p.company_id is not None and shards.shard_for_company(p.company_id) == shard):
+                    rules[key] = SlaRule(p.deadline_minutes, p.notify, p.reassign, p.raise_priority)
+        self.rules = rules
+
+        statuses = {status for _, _, status in self.rules}
+
+        async def load_timers(db: AsyncSession) -> Dict[TimerKey, Timer]:
+            timers = {}
+            if not statuses:
+                return timers
+            shard = db.info["shard"]
+            rows = await db.stream(
+                select(Request.id, Request.company_id, Request.category, Request.status, Request.status_changed_at)
+                .where(Request.status.in_(statuses), Request.escalated_at.is_(None))
+                .execution_options(yield_per=REBUILD_BATCH_SIZE)
+            )
+            async for request_id, company_id, category, status, changed_at in rows:
+                rule = self.rule_for(company_id, category, status)
+                if rule:
+                    deadline = _timestamp(changed_at) + rule.deadline_minutes * 60
+                    timers[(shard, request_id)] = (deadline, company_id, category, status)
+            return timers
+
+        self._timers = {}
+        for _, timers in await shards.fan_out(load_timers):
+            self._timers.update(timers)
+        self._heap = [(timer[0], key) for key, timer in self._timers.items()]
+        heapq.heapify(self._heap)
+        print(f"SLA: {len(self.rules)} policies, {len(self._timers)} timers.")
+
+    async def reload(self):
+        """Перечитать правила после их изменения (если планировщик запущен), и в других процессах"""
+        bus.publish(SLA_RULES)
+        await self._reload_local()
+
+    async def _reload_local(self, payload=None):
+        if self._task is None:
+            return
+        await self.load()
+        self._wakeup.set()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        await self.load()
+        while True:
+            for (shard, request_id), timer in self._pop_due(time.time()):
+                try:
+                    await self._fire(shard, request_id, timer)
+                except Exception as e:
+                    print(f"SLA: escalation of request {request_id} in shard {shard} failed: {e}")
+
+            timeout = min(self._heap[0][0] - time.time(), MAX_SLEEP) if self._heap else MAX_SLEEP
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, shard: str, request_id: int, timer: Timer):
+        _, company_id, category, status = timer
+        rule = self.rule_for(company_id, category, status)
+        if rule is None:
+            return
+        async with shards.session(shard) as db:
+            await escalate(db, request_id, status, rule)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def escalate(db: AsyncSession, request_id: int, status: RequestStatus, rule: SlaRule) -> bool:
+    """Выполнить действия эскалации, если заявка всё ещё в статусе status"""
+    values = {"escalated_at": datetime.now(timezone.utc)}
+    if rule.reassign:
+        values["assignee_id"] = None
+    if rule.raise_priority:
+        values["priority"] = Request.priority + 1
+
+    result = await db.execute(
+        update(Request)
+        .where(Request.id == request_id, Request.status == status, Request.escalated_at.is_(None))
+        .values(**values)
+        .returning(Request.id)
+    )
+    if result.scalar() is None:
+        await db.rollback()
+        return False
+    if rule.notify:
+        await enqueue(db, ESCALATION_TASK, {"request_id": request_id, "minutes": rule.deadline_minutes})
+    await db.commit()
+    return True
+
+
+async def send_escalation_notification(db: AsyncSession, request_id: int, minutes: int):
+    """Сообщить администраторам и диспетчерам УК о нарушении SLA"""
+    request = await db.get(Request, request_id)
+    if not request or not request.company_id or not settings.telegram_bot_token:
+        return
+    result = await db.execute(
+        select(User.telegram_id)
+        .where(User.company_id == request.company_id, User.role.in_([UserRole.ADMIN, UserRole.DISPATCHER]))
+    )
+    text = (
+        f"Заявка #{request.id} «{escape(request.title)}» дольше {minutes} мин "
+        f"в статусе «{STATUS_LABELS[request.status]}»"
+    )
+    for telegram_id in result.scalars():
+        await notifier.send_message(telegram_id, text)
+
+
+sla_scheduler = SlaScheduler()
+bus.subscribe(SLA_RULES, sla_scheduler._reload_local)
@@ -0,0 +1,130 @@
+"""
+Режим SQLite для небольших инсталляций (одна БД-файл на VPS).
+
+- WAL: читатели не блокируют писателя и видят последнее закоммиченное состояние;
+  synchronous=NORMAL в WAL - fsync только при checkpoint, а не на каждый коммит.
+- Одна пишущая connection на процесс (пул размером 1): транзакции с записью ждут
+  её в очереди пула по порядку, а не соревнуются за блокировку файла и не падают
+  с "database is locked". busy_timeout покрывает остальные процессы (воркер и т.п.).
+- Пул читающих connections (query_only): SELECT идут параллельно, не занимая писателя.
+
+RoutingSession направляет запрос к читателю или писателю; после первой записи
+транзакция целиком остаётся на писателе, чтобы видеть собственные изменения.
+
+Одна пишущая сессия шарда на задачу (запрос API, задачу воркера): пока транзакция
+с записью не закончена, она держит единственную пишущую connection, и запись из
+второй сессии той же задачи ждала бы её pool_timeout, а затем падала. RoutingSession
+вместо этого сразу бросает WriterBusyError; сессии запроса, которым нужно писать
+после обработчика (IdempotentRoute), сначала завершают его транзакцию
+(app/database.py, end_request_transactions).
+
+Каждая connection получает функцию search_norm (поиск заявок, app/utils/search.py):
+встроенные lower() и LIKE в SQLite сворачивают регистр только для ASCII.
+"""
+import asyncio
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+from app.config import settings
+
+# Пометка в session.info: транзакция уже пишет
+WRITING = "sqlite_writing"
+
+# SQL-функция нормализации текста для поиска
+SEARCH_NORMALIZE = "search_norm"
+
+
+def normalize_search_text(value):
+    """Регистр без учёта алфавита (Python casefold) и ё -> е"""
+    if value is None:
+        return None
+    return value.casefold().replace("ё", "е")
+
+
+def is_file_database(url: str) -> bool:
+    """SQLite в файле: у :memory: каждая connection - отдельная БД, читателей не отделить"""
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+def apply_pragmas(sync_engine: Engine, read_only: bool = False, wal: bool = False):
+    """Настройки на каждую новую connection"""
+    pragmas = ["foreign_keys=ON"]
+    if wal:
+        pragmas += [
+            f"busy_timeout={settings.sqlite_busy_timeout_ms}",
+            f"synchronous={settings.sqlite_synchronous}",
+            f"cache_size=-{settings.sqlite_cache_size_kb}",
+            f"mmap_size={settings.sqlite_mmap_size_mb * 1024 * 1024}",
+            "temp_store=MEMORY",
+        ]
+        # journal_mode хранится в самом файле БД, его переключает писатель
+        pragmas.append("query_only=ON" if read_only else "journal_mode=WAL")
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+        dbapi_connection.create_function(SEARCH_NORMALIZE, 1, normalize_search_text, deterministic=True)
+
+
+class WriterBusyError(RuntimeError):
+    """Вторая пишущая сессия шарда в той же задаче: ждала бы сама себя"""
+
+
+def _is_write(clause) -> bool:
+    if clause is None:
+        return False
+    if isinstance(clause, TextClause):
+        # text(): по тексту запроса не угадать, пишет ли он
+        return True
+    if isinstance(clause, UpdateBase):
+        return True
+    # SELECT ... FOR UPDATE (захват задач воркером) - чтение перед записью в той же транзакции
+    return isinstance(clause, Select) and clause._for_update_arg is not None
+
+
+class RoutingSession(Session):
+    """Session с чтением через пул читателей; reader и writers задаёт routing_session_class"""
+    reader: Engine = None
+    # Задача -> её пишущая сессия этого шарда
+    writers: "weakref.WeakKeyDictionary[asyncio.Task, Session]" = None
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        if self.info.get(WRITING) or self._flushing or _is_write(clause):
+            if not self.info.get(WRITING):
+                self._claim_writer()
+            return super().get_bind(mapper, clause=clause, **kw)
+        return self.reader
+
+    def _claim_writer(self):
+        task = asyncio.current_task()
+        if task is not None:
+            other = self.writers.get(task)
+            if other is not None and other is not self:
+                raise WriterBusyError(
+                    "Пишущая connection SQLite занята другой сессией этой же задачи: "
+                    "закоммитьте или откатите её транзакцию перед записью из новой сессии"
+                )
+            self.writers[task] = self
+        self.info[WRITING] = task or True
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _transaction_end(session, transaction):
+    if transaction.parent is None:
+        task = session.info.pop(WRITING, None)
+        if isinstance(task, asyncio.Task) and session.writers.get(task) is session:
+            del session.writers[task]
+
+
+def routing_session_class(reader: Engine) -> type:
+    return type("SQLiteRoutingSession", (RoutingSession,), {"reader": reader, "writers": weakref.WeakKeyDictionary()})
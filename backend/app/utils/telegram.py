@@ -0,0 +1,89 @@
+"""
+Отправка сообщений через Telegram Bot API.
+
+Один httpx-клиент с пулом соединений на процесс и token bucket на общий
+лимит бота и на каждый чат (Telegram: ~30 сообщений/с всего и ~1/с в чат).
+Корзины - в памяти процесса, поэтому общий лимит делится на число
+отправляющих процессов (settings.telegram_senders).
+Адрес API настраивается (settings.telegram_api_url), что позволяет
+подменить его локальным фейковым сервером. httpx импортируется при первой
+отправке: процессу API он нужен только для уведомлений.
+"""
+from typing import TYPE_CHECKING, Dict, Optional
+
+from app.config import settings
+from app.utils.rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    import httpx
+
+# Сколько корзин отдельных чатов держать в памяти до очистки полных
+MAX_CHAT_BUCKETS = 10000
+
+
+class TelegramError(Exception):
+    pass
+
+
+class TelegramNotifier:
+    def __init__(self, token: str, api_url: str, global_rate: float, chat_rate: float):
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.chat_rate = chat_rate
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            )
+        return self._client
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self.chat_buckets = {k: b for k, b in self.chat_buckets.items() if not b.is_full}
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, capacity=1)
+        return bucket
+
+    async def send_message(self, chat_id: int, text: str, retries: int = 3) -> dict:
+        """Отправить сообщение с учётом лимитов; на 429 ждёт retry_after и повторяет"""
+        for _ in range(retries):
+            await self.global_bucket.acquire()
+            await self._chat_bucket(chat_id).acquire()
+
+            response = await self.client.post(
+                f"{self.api_url}/bot{self.token}/sendMessage",
+                json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"},
+            )
+            data = response.json()
+            if data.get("ok"):
+                return data["result"]
+
+            if response.status_code == 429:
+                retry_after = data.get("parameters", {}).get("retry_after", 1)
+                # Пауза для всех отправок: лимит превышен на стороне Telegram
+                self.global_bucket.pause(retry_after)
+                continue
+            raise TelegramError(f"{response.status_code}: {data.get('description')}")
+
+        raise TelegramError(f"Rate limited, chat {chat_id}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+notifier = TelegramNotifier(
+    settings.telegram_bot_token,
+    settings.telegram_api_url,
+    settings.telegram_global_rate / max(settings.telegram_senders, 1),
+    settings.telegram_chat_rate,
+)
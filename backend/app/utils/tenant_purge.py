@@ -0,0 +1,106 @@
+"""
+Удаление УК со всеми данными (POST /api/superadmin/companies/{id}/purge).
+
+Обычный DELETE УК - один оператор, остальное делают ON DELETE в БД. Для очень
+больших УК это одна длинная транзакция, поэтому есть фоновая задача: она
+удаляет заявки, в том числе архивные (история - каскадом), отвязывает жильцов и удаляет дома
+пачками по PURGE_BATCH_SIZE строк с коммитом после каждой пачки, а саму УК -
+последней, вместе с её размещением и строкой-справочником в шарде default.
+Заявки жильцов УК без company_id (УК была удалена раньше, строки до
+появления колонки) удаляются тоже. Повтор задачи после сбоя продолжает с
+того места, где она остановилась.
+
+Ключ dedupe_key не даёт поставить второе удаление, пока первое ждёт или
+выполняется; ключ завершённой или упавшей задачи освобождается при новой
+постановке, так что удаление можно повторить.
+"""
+from typing import Tuple
+
+from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import DEFAULT_SHARD, shards
+from app.models.company import Company
+from app.models.house import House
+from app.models.user import User
+from app.models.request import Request
+from app.models.archive import ArchivedRequest
+from app.utils.address_index import address_index
+from app.models.job import Job, JobStatus
+from app.utils.cache import response_cache, COMPANIES, HOUSES
+from app.utils.invalidation import bus, SHARD_PLACEMENTS
+from app.utils.sla import sla_scheduler
+from app.worker import enqueue
+
+PURGE_TASK = "purge_company"
+PURGE_BATCH_SIZE = 1000
+
+
+async def queue_purge(db: AsyncSession, company_id: int) -> Tuple[int, JobStatus]:
+    """
+    Поставить удаление УК в очередь; (id задачи, статус): pending - поставлена
+    или уже ждёт, running - уже выполняется. Коммит - за вызывающим.
+    """
+    dedupe_key = f"{PURGE_TASK}:{company_id}"
+    await db.execute(
+        update(Job)
+        .where(Job.dedupe_key == dedupe_key, Job.status.in_([JobStatus.DONE, JobStatus.FAILED]))
+        .values(dedupe_key=None)
+    )
+    await enqueue(db, PURGE_TASK, {"company_id": company_id}, dedupe_key=dedupe_key)
+    return (await db.execute(select(Job.id, Job.status).where(Job.dedupe_key == dedupe_key))).one()
+
+
+async def _delete_batches(db: AsyncSession, model, *conditions) -> int:
+    deleted = 0
+    while True:
+        ids = (await db.execute(select(model.id).where(*conditions).limit(PURGE_BATCH_SIZE))).scalars().all()
+        if not ids:
+            return deleted
+        await db.execute(delete(model).where(model.id.in_(ids)))
+        await db.commit()
+        deleted += len(ids)
+
+
+async def _detach_batches(db: AsyncSession, column, condition) -> int:
+    """Обнулить ссылку пользователей на УК или дом"""
+    detached = 0
+    while True:
+        ids = (await db.execute(select(User.id).where(condition).limit(PURGE_BATCH_SIZE))).scalars().all()
+        if not ids:
+            return detached
+        await db.execute(update(User).where(User.id.in_(ids)).values({column: None}))
+        await db.commit()
+        detached += len(ids)
+
+
+def _company_requests(model, company_id: int, houses, residents):
+    """Заявки УК: с её company_id или без УК, но из её дома или от её жильца"""
+    return or_(
+        model.company_id == company_id,
+        and_(model.company_id.is_(None), or_(model.house_id.in_(houses), model.user_id.in_(residents))),
+    )
+
+
+async def purge_company(db: AsyncSession, company_id: int):
+    houses = select(House.id).where(House.company_id == company_id)
+    residents = select(User.id).where(User.house_id.in_(houses))
+
+    requests = await _delete_batches(db, Request, _company_requests(Request, company_id, houses, residents))
+    requests += await _delete_batches(
+        db, ArchivedRequest, _company_requests(ArchivedRequest, company_id, houses, residents)
+    )
+    resident_count = await _detach_batches(db, User.house_id, User.house_id.in_(houses))
+    await _detach_batches(db, User.company_id, User.company_id == company_id)
+    house_count = await _delete_batches(db, House, House.company_id == company_id)
+
+    await db.execute(delete(Company).where(Company.id == company_id))
+    await db.commit()
+    if db.info["shard"] != DEFAULT_SHARD:
+        await shards.forget(company_id)
+        bus.publish(SHARD_PLACEMENTS)
+
+    address_index.remove_company(company_id)
+    await response_cache.invalidate(COMPANIES, HOUSES)
+    await sla_scheduler.reload()
+    print(f"PURGE: company {company_id}: {requests} requests, {house_count} houses, {resident_count} residents detached.")
@@ -0,0 +1,70 @@
+"""
+Фоновые задачи без внешнего брокера: очередь хранится в таблице jobs.
+
+Задача регистрируется декоратором @task и ставится в очередь через enqueue()
+в той же транзакции, что и изменение данных, - если обработчик запроса
+откатится, задача тоже не появится. Выполняет задачи воркер
+(python -m app.worker или встроенный в API-процесс, см. settings.worker_embedded).
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.job import Job, JobStatus
+
+Handler = Callable[[AsyncSession, dict], Awaitable[None]]
+
+
+@dataclass
+class TaskSpec:
+    name: str
+    handler: Handler
+    max_attempts: int = 5
+    concurrency: int = 5        # одновременно выполняемых задач этого типа на воркер
+    backoff: float = 10.0       # задержка перед повтором: backoff * 2^(попытка-1) секунд
+    every: Optional[int] = None  # период в секундах для периодических задач
+
+
+TASKS: Dict[str, TaskSpec] = {}
+
+
+def task(name: str, *, max_attempts: int = 5, concurrency: int = 5, backoff: float = 10.0,
+         every: Optional[int] = None):
+    """Зарегистрировать обработчик фоновой задачи"""
+    def decorator(handler: Handler) -> Handler:
+        TASKS[name] = TaskSpec(name, handler, max_attempts, concurrency, backoff, every)
+        return handler
+    return decorator
+
+
+async def enqueue(
+    db: AsyncSession,
+    name: str,
+    payload: Optional[dict] = None,
+    run_at: Optional[datetime] = None,
+    dedupe_key: Optional[str] = None,
+):
+    """
+    Поставить задачу в очередь. Коммит - за вызывающим.
+    С dedupe_key повторная постановка той же задачи игнорируется.
+    """
+    spec = TASKS.get(name)
+    values = {
+        "type": name,
+        "payload": payload or {},
+        "status": JobStatus.PENDING,
+        "max_attempts": spec.max_attempts if spec else 5,
+        "dedupe_key": dedupe_key,
+    }
+    if run_at:
+        values["run_at"] = run_at
+
+    if dedupe_key is None:
+        db.add(Job(**values))
+        return
+
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    await db.execute(insert(Job).values(**values).on_conflict_do_nothing(index_elements=[Job.dedupe_key]))
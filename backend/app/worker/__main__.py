@@ -0,0 +1,30 @@
+"""
+Отдельный процесс воркера фоновых задач:
+    python -m app.worker
+При запуске отдельного воркера встроенный в API можно отключить: WORKER_EMBEDDED=false
+"""
+import asyncio
+import signal
+
+from app.database import init_db, shards
+from app.worker.runner import Worker
+from app.utils.migration import schema_is_current
+from app.utils.telegram import notifier
+
+
+async def main():
+    # Миграции выполняет API; таблицы создаём, только если схема ещё не записана
+    if await schema_is_current():
+        await shards.load_placements()
+    else:
+        await init_db()
+    workers = [Worker(shard=shard) for shard in shards.names]
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: [worker.stop() for worker in workers])
+    await asyncio.gather(*(worker.run() for worker in workers))
+    await notifier.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
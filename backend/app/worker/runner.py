@@ -0,0 +1,225 @@
+"""
+Воркер фоновых задач.
+
+Захват задач: SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL), затем
+UPDATE ... WHERE status = 'pending' RETURNING - второй шаг делает захват
+безопасным и на SQLite, где блокировок строк нет, но запись сериализована.
+"""
+import asyncio
+import os
+import random
+import socket
+import time
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select, update, func
+
+from app.config import settings
+from app.database import DEFAULT_SHARD, shards
+from app.models.job import Job, JobStatus
+from app.worker import TASKS, TaskSpec, enqueue
+import app.worker.tasks  # noqa: F401 - регистрирует обработчики
+
+# Задача в статусе running без продления блокировки дольше этого срока считается брошенной (воркер упал)
+STALE_AFTER = timedelta(minutes=10)
+RECOVER_EVERY = 60.0
+# Как часто воркер продлевает locked_at своих выполняемых задач (сколько бы они ни шли)
+HEARTBEAT_EVERY = 60.0
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Worker:
+    def __init__(self, name: Optional[str] = None, concurrency: Optional[int] = None,
+                 poll_interval: Optional[float] = None, shard: str = DEFAULT_SHARD):
+        # Очередь задач у каждого шарда своя (таблица jobs в его БД): один воркер на шард
+        self.shard = shard
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}" + (f":{shard}" if shard != DEFAULT_SHARD else "")
+        self.concurrency = concurrency or settings.worker_concurrency
+        self.poll_interval = poll_interval or settings.worker_poll_interval
+        self._running: Dict[str, int] = defaultdict(int)
+        self._tasks: Set[asyncio.Task] = set()
+        self._job_ids: Set[int] = set()
+        self._periodic_slots: Dict[str, int] = {}
+        self._last_recover = 0.0
+        self._stop = asyncio.Event()
+        self._wakeup = asyncio.Event()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    async def run(self):
+        print(f"WORKER {self.name}: started, tasks: {', '.join(sorted(TASKS)) or '-'}")
+        heartbeat = asyncio.create_task(self._heartbeat())
+        while not self._stop.is_set():
+            try:
+                await self._schedule_periodic()
+                if time.monotonic() - self._last_recover > RECOVER_EVERY:
+                    await self._recover_stale()
+                    self._last_recover = time.monotonic()
+                claimed = await self._claim()
+            except Exception as e:
+                print(f"WORKER {self.name}: poll failed: {e}")
+                claimed = []
+
+            for job_id, job_type, payload, attempts, max_attempts in claimed:
+                self._running[job_type] += 1
+                self._job_ids.add(job_id)
+                t = asyncio.create_task(self._execute(job_id, TASKS[job_type], payload, attempts, max_attempts))
+                self._tasks.add(t)
+                t.add_done_callback(self._task_done)
+
+            if not claimed or len(self._tasks) >= self.concurrency:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        heartbeat.cancel()
+        print(f"WORKER {self.name}: stopped")
+
+    def _task_done(self, t: asyncio.Task):
+        self._tasks.discard(t)
+        self._wakeup.set()
+
+    def _free_slots(self) -> Dict[str, int]:
+        return {
+            name: spec.concurrency - self._running[name]
+            for name, spec in TASKS.items()
+            if spec.concurrency - self._running[name] > 0
+        }
+
+    async def _claim(self) -> List[tuple]:
+        free_total = self.concurrency - len(self._tasks)
+        slots = self._free_slots()
+        if free_total <= 0 or not slots:
+            return []
+
+        async with shards.session(self.shard) as db:
+            result = await db.execute(
+                select(Job.id, Job.type)
+                .where(Job.status == JobStatus.PENDING, Job.run_at <= func.now(), Job.type.in_(slots))
+                .order_by(Job.run_at)
+                .limit(free_total)
+                .with_for_update(skip_locked=True)
+            )
+            ids = []
+            for job_id, job_type in result.all():
+                if slots.get(job_type, 0) > 0:
+                    slots[job_type] -= 1
+                    ids.append(job_id)
+            if not ids:
+                await db.commit()
+                return []
+
+            result = await db.execute(
+                update(Job)
+                .where(Job.id.in_(ids), Job.status == JobStatus.PENDING)
+                .values(
+                    status=JobStatus.RUNNING,
+                    locked_by=self.name,
+                    locked_at=utcnow(),
+                    attempts=Job.attempts + 1,
+                )
+                .returning(Job.id, Job.type, Job.payload, Job.attempts, Job.max_attempts)
+            )
+            claimed = result.all()
+            await db.commit()
+            return claimed
+
+    async def _execute(self, job_id: int, spec: TaskSpec, payload: dict, attempts: int, max_attempts: int):
+        try:
+            async with shards.session(self.shard) as db:
+                await spec.handler(db, payload)
+            values = {"status": JobStatus.DONE, "last_error": None}
+        except Exception as e:
+            print(f"WORKER {self.name}: job {job_id} ({spec.name}) failed: {e}")
+            error = traceback.format_exc()[-4000:]
+            if attempts >= max_attempts:
+                values = {"status": JobStatus.FAILED, "last_error": error}
+            else:
+                delay = spec.backoff * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+                values = {
+                    "status": JobStatus.PENDING,
+                    "last_error": error,
+                    "run_at": utcnow() + timedelta(seconds=delay),
+                }
+        finally:
+            self._running[spec.name] -= 1
+            self._job_ids.discard(job_id)
+
+        try:
+            async with shards.session(self.shard) as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.locked_by == self.name)
+                    .values(locked_by=None, locked_at=None, **values)
+                )
+                await db.commit()
+        except Exception as e:
+            # Задача вернётся в очередь через _recover_stale
+            print(f"WORKER {self.name}: failed to save job {job_id} result: {e}")
+
+    async def _schedule_periodic(self):
+        """Поставить периодические задачи; dedupe_key не даёт нескольким воркерам задублировать их"""
+        now = time.time()
+        due = []
+        for name, spec in TASKS.items():
+            if not spec.every:
+                continue
+            slot = int(now // spec.every)
+            if self._periodic_slots.get(name) != slot:
+                due.append((name, slot))
+        if not due:
+            return
+
+        async with shards.session(self.shard) as db:
+            for name, slot in due:
+                await enqueue(db, name, dedupe_key=f"periodic:{name}:{slot}")
+            await db.commit()
+        for name, slot in due:
+            self._periodic_slots[name] = slot
+
+    async def _heartbeat(self):
+        """Продлевать блокировку выполняемых задач, чтобы долгие (purge_company и т.п.) не считались брошенными"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_EVERY)
+            if not self._job_ids:
+                continue
+            try:
+                async with shards.session(self.shard) as db:
+                    await db.execute(
+                        update(Job)
+                        .where(Job.id.in_(list(self._job_ids)), Job.locked_by == self.name)
+                        .values(locked_at=utcnow())
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"WORKER {self.name}: heartbeat failed: {e}")
+
+    async def _recover_stale(self):
+        """Вернуть брошенные задачи в очередь; исчерпавшие попытки (например, роняющие воркер) - в failed"""
+        stale = (Job.status == JobStatus.RUNNING, Job.locked_at < utcnow() - STALE_AFTER)
+        async with shards.session(self.shard) as db:
+            await db.execute(
+                update(Job)
+                .where(*stale, Job.attempts >= Job.max_attempts)
+                .values(status=JobStatus.FAILED, locked_by=None, locked_at=None,
+                        last_error="Воркер не завершил задачу: попытки исчерпаны")
+            )
+            await db.execute(
+                update(Job)
+                .where(*stale, Job.attempts < Job.max_attempts)
+                .values(status=JobStatus.PENDING, locked_by=None, locked_at=None)
+            )
+            await db.commit()
+
@@ -0,0 +1,96 @@
+"""Обработчики фоновых задач"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.job import Job, JobStatus
+from app.utils.rollups import refresh_rollups
+from app.utils.notifications import NOTIFY_TASK, send_status_notification
+from app.utils.broadcasts import FANOUT_TASK, SEND_TASK, fan_out, send_chunk, purge_deliveries
+from app.utils.sla import ESCALATION_TASK, send_escalation_notification
+from app.utils.idempotency import purge_expired_keys
+from app.utils.invalidation import purge_old_events
+from app.utils.tenant_purge import PURGE_TASK, purge_company
+from app.utils.archive import ARCHIVE_TASK, archive_requests
+from app.utils.migration import ensure_history_partitions
+from app.worker import task
+
+# Сколько хранить выполненные задачи
+FINISHED_JOBS_RETENTION = timedelta(days=7)
+
+
+if settings.rollup_interval_seconds > 0:
+    @task("refresh_rollups", concurrency=1, max_attempts=1, every=settings.rollup_interval_seconds)
+    async def refresh_rollups_task(db: AsyncSession, payload: dict):
+        """Обновить сводки для графиков (см. app/utils/rollups.py)"""
+        await refresh_rollups(db)
+
+
+if settings.archive_after_days > 0:
+    @task(ARCHIVE_TASK, concurrency=1, max_attempts=1, every=3600)
+    async def archive_requests_task(db: AsyncSession, payload: dict):
+        """Перенести старые закрытые заявки в архив (см. app/utils/archive.py)"""
+        await archive_requests(db)
+
+
+@task("create_history_partitions", concurrency=1, max_attempts=1, every=86400)
+async def create_history_partitions(db: AsyncSession, payload: dict):
+    """Создать секции request_history на месяцы вперёд (PostgreSQL)"""
+    if db.bind.dialect.name != "postgresql":
+        return
+    await ensure_history_partitions(await db.connection(), settings.history_partitions_ahead)
+    await db.commit()
+
+
+@task("purge_finished_jobs", concurrency=1, max_attempts=1, every=3600)
+async def purge_finished_jobs(db: AsyncSession, payload: dict):
+    """Удалить старые выполненные задачи и отметки об отправке их рассылок"""
+    cutoff = datetime.now(timezone.utc) - FINISHED_JOBS_RETENTION
+    await db.execute(delete(Job).where(Job.status == JobStatus.DONE, Job.updated_at < cutoff))
+    await purge_deliveries(db, cutoff)
+    await db.commit()
+
+
+@task(NOTIFY_TASK, concurrency=20, max_attempts=5, backoff=30.0)
+async def notify_request_status(db: AsyncSession, payload: dict):
+    """Уведомить жильца о смене статуса заявки"""
+    await send_status_notification(db, payload["request_id"])
+
+
+@task(FANOUT_TASK, concurrency=2, max_attempts=3)
+async def broadcast_fanout(db: AsyncSession, payload: dict):
+    """Разбить рассылку на пачки получателей"""
+    await fan_out(db, payload["broadcast_id"])
+
+
+@task(SEND_TASK, concurrency=4, max_attempts=3)
+async def broadcast_send(db: AsyncSession, payload: dict):
+    """Отправить пачку рассылки"""
+    await send_chunk(db, payload["broadcast_id"], payload["chat_ids"])
+
+
+@task(ESCALATION_TASK, concurrency=5, max_attempts=3, backoff=30.0)
+async def sla_escalation(db: AsyncSession, payload: dict):
+    """Сообщить сотрудникам УК о нарушении SLA"""
+    await send_escalation_notification(db, payload["request_id"], payload["minutes"])
+
+
+@task("purge_idempotency_keys", concurrency=1, max_attempts=1, every=3600)
+async def purge_idempotency_keys(db: AsyncSession, payload: dict):
+    """Удалить просроченные ключи идемпотентности (backend=db)"""
+    await purge_expired_keys(db)
+
+
+if settings.invalidation_backend == "db":
+    @task("purge_cache_events", concurrency=1, max_attempts=1, every=3600)
+    async def purge_cache_events(db: AsyncSession, payload: dict):
+        """Удалить старые события инвалидации кэшей"""
+        await purge_old_events(db)
+
+
+@task(PURGE_TASK, concurrency=1, max_attempts=3, backoff=60.0)
+async def purge_company_task(db: AsyncSession, payload: dict):
+    """Удалить УК со всеми заявками и домами пачками"""
+    await purge_company(db, payload["company_id"])
@@ -0,0 +1,67 @@
+"""
+Бенчмарки индекса адресов (GET /api/houses/suggest) на ADDRESS_INDEX_HOUSES домах
+(по умолчанию 300 000 в 1000 УК).
+
+Кроме сравнения с эталоном проверяется бюджет одной подсказки
+SUGGEST_BUDGET_MS (мс, лучший из замеров).
+"""
+import os
+import random
+
+import pytest
+
+from app.database import DEFAULT_SHARD
+from app.utils.address_index import AddressIndex
+
+HOUSES = int(os.getenv("ADDRESS_INDEX_HOUSES", "300000"))
+SUGGEST_BUDGET_MS = float(os.getenv("SUGGEST_BUDGET_MS", "5"))
+
+SYLLABLES = ["ле", "ни", "на", "пу", "шки", "ми", "ра", "со", "вет", "ска", "га", "ри", "ка", "ло", "мо", "ва", "бе", "за"]
+KINDS = ["ул.", "пр.", "пер.", "бульвар", "шоссе"]
+
+
+def make_houses(count: int):
+    rnd = random.Random(1)
+    streets = sorted({
+        "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))) + rnd.choice(["ская", "ова", "ина", ""])
+        for _ in range(4000)
+    })
+    return [
+        (DEFAULT_SHARD, house_id, rnd.randint(1, 1000),
+         f"г. Москва, {rnd.choice(KINDS)} {rnd.choice(streets)}, д. {rnd.randint(1, 200)}"
+         + (f" к. {rnd.randint(1, 5)}" if rnd.random() < 0.2 else ""))
+        for house_id in range(1, count + 1)
+    ]
+
+
+@pytest.fixture(scope="module")
+def houses():
+    return make_houses(HOUSES)
+
+
+@pytest.fixture(scope="module")
+def index(houses):
+    index = AddressIndex()
+    index.rebuild(houses)
+    return index
+
+
+def bench_address_index_rebuild(benchmark, houses):
+    index = AddressIndex()
+    benchmark.pedantic(index.rebuild, args=(houses,), rounds=1, iterations=1)
+    assert len(index) == HOUSES
+
+
+@pytest.mark.parametrize("q, company_id", [
+    ("л", None),
+    ("1", None),
+    ("ле", 7),
+    ("ул лен", None),
+    ("ми ра 12", None),
+    ("пушкна", None),
+], ids=["one-letter", "number", "company", "street", "three-tokens", "typo"])
+def bench_address_suggest(benchmark, index, q, company_id):
+    result = benchmark(index.suggest, q, company_id, 10)
+    assert all(company_id is None or house[2] == company_id for house in result)
+    best_ms = benchmark.stats.stats.min * 1000
+    assert best_ms < SUGGEST_BUDGET_MS, f"suggest({q!r}) {best_ms:.2f} ms, budget {SUGGEST_BUDGET_MS} ms"
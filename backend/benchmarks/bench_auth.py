@@ -0,0 +1,23 @@
+"""Бенчмарки авторизации: проверка init_data и JWT выполняются на каждом запросе"""
+from app.utils.auth import verify_telegram_data, create_access_token, decode_access_token
+
+
+def bench_verify_telegram_data(benchmark, init_data):
+    result = benchmark(verify_telegram_data, init_data)
+    assert result["id"] == 383094701
+
+
+def bench_verify_telegram_data_bad_hash(benchmark, init_data):
+    tampered = init_data.replace("ivan_petrov", "ivan_hacker")
+    assert benchmark(verify_telegram_data, tampered) is None
+
+
+def bench_create_access_token(benchmark):
+    token = benchmark(create_access_token, {"telegram_id": 383094701})
+    assert token.count(".") == 2
+
+
+def bench_decode_access_token(benchmark):
+    token = create_access_token({"telegram_id": 383094701})
+    payload = benchmark(decode_access_token, token)
+    assert payload["telegram_id"] == 383094701
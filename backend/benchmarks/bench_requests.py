@@ -0,0 +1,26 @@
+"""Бенчмарки сериализации заявок и проверки FSM"""
+from app.models import Request, RequestStatus
+from app.routers.requests import request_to_response
+
+
+def bench_request_to_response(benchmark, request_with_history):
+    response = benchmark(request_to_response, request_with_history)
+    assert response.user_address == "ул. Ленина, д. 10"
+    assert len(response.history) == 4
+
+
+def bench_request_to_response_page(benchmark, request_with_history):
+    """Страница списка заявок по умолчанию (limit=50)"""
+    page = [request_with_history] * 50
+    items = benchmark(lambda: [request_to_response(r) for r in page])
+    assert len(items) == 50
+
+
+def bench_can_transition_to(benchmark):
+    requests = [Request(status=s) for s in RequestStatus]
+
+    def check_all():
+        return [r.can_transition_to(s) for r in requests for s in RequestStatus]
+
+    result = benchmark(check_all)
+    assert result.count(True) == 17
@@ -0,0 +1,70 @@
+"""Бенчмарки валидации и сериализации Pydantic-схем из app/schemas"""
+from datetime import datetime
+
+from app.models import Company, House
+from app.schemas import (
+    UserResponse, UserUpdate, CompanyResponse, HouseResponse,
+    RequestCreate, RequestStatusUpdate, RequestResponse,
+)
+from app.schemas.company import CompanyListResponse
+from app.schemas.house import HouseListResponse
+from app.schemas.request import RequestListResponse
+
+
+def bench_request_create_validate(benchmark):
+    payload = {
+        "category": "plumbing",
+        "title": "Течёт кран на кухне",
+        "description": "Подтекает смеситель, под раковиной лужа.",
+    }
+    data = benchmark(RequestCreate.model_validate, payload)
+    assert data.is_paid == 0
+
+
+def bench_request_status_update_validate(benchmark):
+    data = benchmark(RequestStatusUpdate.model_validate, {"status": "in_progress", "comment": "Мастер выехал"})
+    assert data.status.value == "in_progress"
+
+
+def bench_user_update_validate(benchmark):
+    data = benchmark(UserUpdate.model_validate, {"phone": "+79991234567", "house_id": 1, "apartment": "45"})
+    assert data.house_id == 1
+
+
+def bench_user_response_from_orm(benchmark, resident):
+    response = benchmark(UserResponse.model_validate, resident)
+    assert response.telegram_id == 383094701
+
+
+def bench_request_response_from_orm(benchmark, request_with_history):
+    response = benchmark(RequestResponse.model_validate, request_with_history)
+    assert len(response.history) == 4
+
+
+def bench_request_list_response_dump(benchmark, request_with_history):
+    """Сериализация страницы списка заявок в JSON, как в ответе API"""
+    item = RequestResponse.model_validate(request_with_history)
+    page = RequestListResponse(items=[item] * 50, total=1000)
+    body = benchmark(page.model_dump_json)
+    assert body.startswith('{"items":')
+
+
+def bench_company_list_response_dump(benchmark):
+    company = CompanyResponse.model_validate(Company(id=1, name="УК Комфорт", created_at=datetime.now()))
+    page = CompanyListResponse(items=[company] * 100, total=100)
+    body = benchmark(page.model_dump_json)
+    assert '"house_count":0' in body
+
+
+def bench_house_list_response_from_orm(benchmark):
+    now = datetime.now()
+    houses = [
+        House(id=i, company_id=1, address=f"ул. Ленина, д. {i}", apartment_count=120, created_at=now)
+        for i in range(100)
+    ]
+
+    def build():
+        return HouseListResponse(items=[HouseResponse.model_validate(h) for h in houses], total=len(houses))
+
+    page = benchmark(build)
+    assert len(page.items) == 100
@@ -0,0 +1,169 @@
+"""
+Бенчмарки холодного старта: импорт приложения и lifespan на уже мигрированной БД.
+Каждый замер - отдельный процесс python, как при запуске нового контейнера.
+
+Кроме сравнения с эталоном проверяются бюджеты (мс, переопределяются через окружение):
+- STARTUP_IMPORT_BUDGET_MS - собственное время импорта app.main по -X importtime:
+  модули приложения и их зависимости, без FastAPI/SQLAlchemy/pydantic и stdlib;
+- STARTUP_LIFESPAN_BUDGET_MS - старт lifespan, когда версия схемы в БД актуальна,
+  в том числе на БД с STARTUP_SEED_HOUSES домами и открытыми заявками под SLA:
+  индекс адресов и таймеры SLA загружаются фоном и на старт не влияют.
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+IMPORT_BUDGET_MS = int(os.getenv("STARTUP_IMPORT_BUDGET_MS", "500"))
+LIFESPAN_BUDGET_MS = int(os.getenv("STARTUP_LIFESPAN_BUDGET_MS", "300"))
+SEED_HOUSES = int(os.getenv("STARTUP_SEED_HOUSES", "100000"))
+
+# Фреймворк: его импорт - общая цена любого процесса API, бюджетом не ограничивается
+FRAMEWORK = {
+    "fastapi", "starlette", "pydantic", "pydantic_core", "pydantic_settings", "sqlalchemy", "aiosqlite",
+    "anyio", "sniffio", "idna", "greenlet", "typing_extensions", "typing_inspection", "annotated_types",
+    "annotated_doc", "dotenv",
+}
+# Нужны только при работе конкретных функций: импортируются при первом использовании
+LAZY_MODULES = ["httpx", "openpyxl", "asyncpg", "aiogram", "telegram", "redis"]
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LIFESPAN_SCRIPT = textwrap.dedent("""
+    import asyncio, time
+    from app.main import app
+
+    async def main():
+        started = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            print(f"LIFESPAN_MS={(time.perf_counter() - started) * 1000:.1f}")
+
+    asyncio.run(main())
+""")
+
+
+SEED_SCRIPT = textwrap.dedent("""
+    import asyncio, sys
+    from sqlalchemy import insert
+    from app.database import AsyncSessionLocal
+    from app.models import Company, House, User, Request, RequestCategory, RequestStatus
+    from app.models.sla import SlaPolicy
+
+    async def main(houses):
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Company), [{"id": i, "name": f"УК {i}"} for i in range(1, 101)])
+            await db.execute(insert(House), [
+                {"id": i, "company_id": i % 100 + 1, "address": f"ул. Улица {i // 50}, д. {i % 50 + 1}"}
+                for i in range(1, houses + 1)
+            ])
+            await db.execute(insert(User), [{"id": 1, "telegram_id": 1}])
+            await db.execute(insert(Request), [
+                {"user_id": 1, "company_id": i % 100 + 1, "category": RequestCategory.PLUMBING,
+                 "title": "Течёт кран", "status": RequestStatus.NEW}
+                for i in range(houses // 2)
+            ])
+            db.add(SlaPolicy(status=RequestStatus.NEW, deadline_minutes=60 * 24))
+            await db.commit()
+
+    asyncio.run(main(int(sys.argv[1])))
+""")
+
+# Вход в lifespan, затем ожидание фоновой загрузки индекса адресов
+WARM_UP_SCRIPT = textwrap.dedent("""
+    import asyncio, time
+    from app.main import app
+    from app.utils.address_index import address_index
+
+    async def main():
+        started = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            print(f"LIFESPAN_MS={(time.perf_counter() - started) * 1000:.1f}")
+            while not address_index.ready:
+                await asyncio.sleep(0.01)
+            print(f"WARM_UP_MS={(time.perf_counter() - started) * 1000:.1f} INDEXED={len(address_index)}")
+
+    asyncio.run(main())
+""")
+
+
+def run_python(args, env=None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=dict(os.environ, DEBUG="false", **(env or {})),
+        capture_output=True, text=True, check=True,
+    )
+
+
+def own_import_ms(importtime_log: str) -> float:
+    """Сумма собственного времени модулей из поддерева app.main, кроме фреймворка и stdlib"""
+    rows = [line[len("import time:"):].split("|") for line in importtime_log.splitlines()
+            if line.startswith("import time:") and "self [us]" not in line]
+    # Вывод -X importtime - обход в обратном порядке: поддерево модуля стоит перед ним
+    end = next(i for i, (_, _, name) in enumerate(rows) if name.strip() == "app.main")
+    start = end
+    while start > 0 and rows[start - 1][2].startswith("   "):
+        start -= 1
+    total = 0
+    for self_us, _, name in rows[start:end + 1]:
+        top = name.strip().split(".")[0]
+        if top not in FRAMEWORK and top not in sys.stdlib_module_names:
+            total += int(self_us)
+    return total / 1000
+
+
+def bench_import_app(benchmark):
+    check = f"import sys; print([m for m in {LAZY_MODULES!r} if m in sys.modules])"
+
+    own_times = []
+
+    def run():
+        result = run_python(["-X", "importtime", "-c", f"import app.main; {check}"])
+        own_times.append(own_import_ms(result.stderr))
+        return result
+
+    result = benchmark.pedantic(run, rounds=3, iterations=1)
+    assert result.stdout.strip() == "[]", f"imported at startup: {result.stdout.strip()}"
+    # Лучший из замеров: на общей машине отдельные прогоны бывают медленнее из-за соседей
+    own = min(own_times)
+    assert own < IMPORT_BUDGET_MS, f"app.main imports in {own:.0f} ms, budget {IMPORT_BUDGET_MS} ms"
+
+
+@pytest.fixture
+def migrated_database(tmp_path):
+    env = {"DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path / 'startup.db'}", "WORKER_EMBEDDED": "false"}
+    output = run_python(["-c", LIFESPAN_SCRIPT], env).stdout
+    assert "AUTO-MIGRATION FINISHED." in output
+    return env
+
+
+def bench_lifespan_current_schema(benchmark, migrated_database):
+    lifespan_times = []
+
+    def run():
+        output = run_python(["-c", LIFESPAN_SCRIPT], migrated_database).stdout
+        assert "STARTING AUTO-MIGRATION" not in output
+        lifespan_times.append(float(output.split("LIFESPAN_MS=")[1].split()[0]))
+
+    benchmark.pedantic(run, rounds=3, iterations=1)
+    lifespan_ms = min(lifespan_times)
+    assert lifespan_ms < LIFESPAN_BUDGET_MS, f"lifespan startup {lifespan_ms:.0f} ms, budget {LIFESPAN_BUDGET_MS} ms"
+
+
+@pytest.fixture
+def seeded_database(migrated_database):
+    run_python(["-c", SEED_SCRIPT, str(SEED_HOUSES)], migrated_database)
+    return migrated_database
+
+
+def bench_lifespan_seeded_database(benchmark, seeded_database):
+    lifespan_times = []
+
+    def run():
+        output = run_python(["-c", WARM_UP_SCRIPT], seeded_database).stdout
+        assert f"INDEXED={SEED_HOUSES}" in output
+        lifespan_times.append(float(output.split("LIFESPAN_MS=")[1].split()[0]))
+
+    benchmark.pedantic(run, rounds=3, iterations=1)
+    lifespan_ms = min(lifespan_times)
+    assert lifespan_ms < LIFESPAN_BUDGET_MS, f"lifespan startup {lifespan_ms:.0f} ms, budget {LIFESPAN_BUDGET_MS} ms"
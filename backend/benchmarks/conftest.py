@@ -0,0 +1,113 @@
+"""
+Общие фикстуры для микробенчмарков.
+
+Все объекты собираются в памяти, без обращения к БД: меряем только
+стоимость чистого Python-кода, который выполняется на каждом запросе к API.
+"""
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import pytest
+from pytest_benchmark.utils import parse_compare_fail
+
+from app.config import settings
+from app.models import Company, House, User, UserRole, Request, RequestHistory, RequestStatus, RequestCategory
+
+# Допустимый рост среднего времени относительно сохранённого эталона, %
+MAX_REGRESSION = int(os.getenv("BENCHMARK_MAX_REGRESSION", "15"))
+
+
+def pytest_sessionstart(session):
+    """При --benchmark-compare без явного --benchmark-compare-fail включаем порог по умолчанию"""
+    bs = session.config._benchmarksession
+    if bs.compare and not bs.compare_fail:
+        bs.compare_fail = [parse_compare_fail(f"mean:{MAX_REGRESSION}%")]
+
+
+def sign_init_data(fields: dict, bot_token: str) -> str:
+    """Собрать init_data с корректной подписью, как это делает Telegram"""
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields = dict(fields, hash=hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest())
+    return urlencode(fields)
+
+
+@pytest.fixture
+def init_data() -> str:
+    user = {
+        "id": 383094701,
+        "first_name": "Иван",
+        "last_name": "Петров",
+        "username": "ivan_petrov",
+        "language_code": "ru",
+        "allows_write_to_pm": True,
+    }
+    return sign_init_data(
+        {
+            "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+            "user": json.dumps(user, ensure_ascii=False, separators=(",", ":")),
+            "auth_date": str(int(datetime.now().timestamp())),
+        },
+        settings.telegram_bot_token,
+    )
+
+
+@pytest.fixture
+def resident() -> User:
+    now = datetime.now()
+    company = Company(id=1, name="УК Комфорт", created_at=now)
+    house = House(id=1, company_id=1, address="ул. Ленина, д. 10", apartment_count=120, created_at=now)
+    house.company = company
+    user = User(
+        id=1,
+        telegram_id=383094701,
+        username="ivan_petrov",
+        first_name="Иван",
+        last_name="Петров",
+        phone="+79991234567",
+        house_id=1,
+        apartment="45",
+        role=UserRole.RESIDENT,
+        created_at=now,
+        updated_at=now,
+    )
+    user.house = house
+    return user
+
+
+@pytest.fixture
+def request_with_history(resident: User) -> Request:
+    """Заявка, прошедшая типичный путь NEW -> ACCEPTED -> IN_PROGRESS -> COMPLETED"""
+    created = datetime.now() - timedelta(days=2)
+    request = Request(
+        id=1,
+        user_id=resident.id,
+        category=RequestCategory.PLUMBING,
+        title="Течёт кран на кухне",
+        description="Подтекает смеситель, под раковиной лужа. Дома после 18:00.",
+        status=RequestStatus.COMPLETED,
+        priority=0,
+        is_paid=0,
+        payment_status=None,
+        created_at=created,
+        updated_at=created + timedelta(hours=30),
+    )
+    request.user = resident
+    path = [None, RequestStatus.NEW, RequestStatus.ACCEPTED, RequestStatus.IN_PROGRESS, RequestStatus.COMPLETED]
+    request.history = [
+        RequestHistory(
+            id=i + 1,
+            request_id=request.id,
+            old_status=old,
+            new_status=new,
+            comment="Заявка создана" if old is None else None,
+            changed_by=resident.id,
+            created_at=created + timedelta(hours=i * 10),
+        )
+        for i, (old, new) in enumerate(zip(path, path[1:]))
+    ]
+    return request
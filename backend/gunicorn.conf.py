@@ -0,0 +1,71 @@
+"""
+Несколько процессов API на одном узле:
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Приложение загружается в мастере (preload_app), там же один раз выполняются
+create_all и миграции (если версия схемы в БД устарела); воркеры только
+поднимают свои кэши и соединения.
+Воркеры перезапускаются по очереди после max_requests запросов (с разбросом),
+при остановке дожидаются текущих запросов graceful_timeout секунд.
+
+Число воркеров (WEB_CONCURRENCY) по умолчанию небольшое и не зависит от числа CPU:
+- PostgreSQL: каждый воркер держит свой пул, до 15 соединений на шард
+  (pool_size 5 + max_overflow 10); воркеры x 15 x число контейнеров должно
+  оставаться ниже max_connections сервера (по умолчанию 100). По умолчанию 2.
+- SQLite: писатель один на процесс (app/utils/sqlite.py), воркеры разных
+  процессов спорили бы за блокировку файла. По умолчанию 1.
+
+Кэши в памяти процессов согласуются через таблицу cache_events
+(INVALIDATION_BACKEND=db), ключи идемпотентности хранятся в БД
+(IDEMPOTENCY_BACKEND=db).
+
+Лимиты, которые считаются в каждом процессе отдельно:
+- лимиты запросов (RATE_LIMITS) при RATE_LIMIT_BACKEND=memory - на узле с N
+  воркерами до N-кратного превышения; RATE_LIMIT_BACKEND=redis - общие;
+- лимит отправки Telegram (TELEGRAM_GLOBAL_RATE): сообщения отправляют
+  встроенные воркеры фоновых задач, поэтому при WORKER_EMBEDDED=true лимит
+  делится на число воркеров (TELEGRAM_SENDERS). Если контейнеров несколько -
+  задайте TELEGRAM_SENDERS как общее число процессов или отправляйте из одного
+  отдельного python -m app.worker (WORKER_EMBEDDED=false у API).
+IP клиента берётся из X-Forwarded-For, если запрос пришёл от FORWARDED_ALLOW_IPS.
+"""
+import asyncio
+import os
+
+SQLITE = os.getenv("DATABASE_URL", "sqlite").startswith("sqlite")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY") or (1 if SQLITE else 2))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+max_requests = int(os.getenv("MAX_REQUESTS") or 10000)
+max_requests_jitter = max_requests // 10
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+# Прокси, которым uvicorn верит X-Forwarded-For (за прокси PaaS - "*")
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# До загрузки приложения (preload): настройки читаются при импорте app.config
+if workers > 1:
+    os.environ.setdefault("INVALIDATION_BACKEND", "db")
+    os.environ.setdefault("IDEMPOTENCY_BACKEND", "db")
+    if os.getenv("WORKER_EMBEDDED", "true").lower() not in ("false", "0"):
+        os.environ.setdefault("TELEGRAM_SENDERS", str(workers))
+
+
+def on_starting(server):
+    """Таблицы и миграции - один раз в мастере, до fork воркеров"""
+    from app.config import settings
+    from app.database import shards
+    from app.utils.migration import ensure_schema
+
+    async def startup():
+        await ensure_schema()
+        # Соединения, открытые в мастере, не должны достаться воркерам после fork
+        await shards.dispose()
+
+    if settings.migrate_on_startup:
+        asyncio.run(startup())
+        settings.migrate_on_startup = False
@@ -0,0 +1,43 @@
+"""
+Перевод request_history в таблицу, секционированную по месяцам (PostgreSQL).
+
+При старте API большая история не копируется (HISTORY_INLINE_ROWS в
+app/utils/migration.py), а переводится этим скриптом: строки копируются
+пачками, каждая в своей транзакции, пока приложение работает. Прерванный
+запуск можно повторить - он продолжит с места остановки. В конце запись в
+историю блокируется на время копирования остатка и переименования таблиц.
+
+Запуск:
+    python -m scripts.partition_history                      # шард default
+    python -m scripts.partition_history --shard b --batch-size 5000 --pause 0.5
+"""
+import argparse
+import asyncio
+import sys
+
+from app.config import settings
+from app.database import DEFAULT_SHARD, shards
+from app.utils.migration import HISTORY_COPY_BATCH, partition_request_history
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shard", default=DEFAULT_SHARD, choices=shards.names, help="шард (по умолчанию default)")
+    parser.add_argument("--batch-size", type=int, default=HISTORY_COPY_BATCH, help="строк в одной транзакции")
+    parser.add_argument("--pause", type=float, default=0.0, help="пауза между пачками, секунд")
+    args = parser.parse_args()
+
+    shard_engine = shards.engines[args.shard]
+    if shard_engine.dialect.name != "postgresql":
+        sys.exit("Секционирование истории - только для PostgreSQL")
+    try:
+        if await partition_request_history(shard_engine, settings.history_partitions_ahead, args.batch_size, args.pause):
+            print("request_history переведена в секционированную таблицу; следующий старт API запишет версию схемы.")
+        else:
+            print("request_history уже секционирована.")
+    finally:
+        await shard_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
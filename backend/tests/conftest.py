@@ -0,0 +1,141 @@
+"""
+Общие фикстуры тестов.
+
+Настройки приложения читаются при импорте app.config, поэтому окружение
+задаётся здесь, до первого импорта app: временная SQLite-база (или пустая
+БД из TEST_DATABASE_URL, например PostgreSQL), без встроенного воркера и
+SLA-таймеров, уведомления без задержки схлопывания.
+Схема создаётся один раз на сессию; каждый тест заводит свою УК с домом,
+жильцом и диспетчером (фикстура tenant), поэтому тесты не мешают друг другу.
+"""
+import os
+import shutil
+import tempfile
+import uuid
+from dataclasses import dataclass
+
+_DB_DIR = tempfile.mkdtemp(prefix="uk-requests-tests-")
+os.environ.update(
+    DATABASE_URL=os.getenv("TEST_DATABASE_URL", f"sqlite+aiosqlite:///{_DB_DIR}/test.db"),
+    SHARDS="{}",
+    DEBUG="false",
+    WORKER_EMBEDDED="false",
+    MIGRATE_ON_STARTUP="false",
+    SLA_ENABLED="false",
+    TELEGRAM_BOT_TOKEN="123456:TEST",
+    NOTIFY_COALESCE_SECONDS="0",
+)
+
+import httpx
+import pytest
+
+from app.database import Base, _create_engine, _sessionmaker, shards
+from app.main import app
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.models import Company, House, User, UserRole
+from app.utils.auth import create_access_token, token_claims
+from app.utils.migration import ensure_schema
+
+
+@dataclass
+class Tenant:
+    company: Company
+    house: House
+    resident: User
+    dispatcher: User
+    resident_headers: dict
+    dispatcher_headers: dict
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def schema():
+    await ensure_schema()
+    yield
+    for engine in shards.engines.values():
+        await engine.dispose()
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+async def client():
+    # Без lifespan: воркер, прогрев индексов и шина инвалидации тестам не нужны
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.fixture
+async def tenant() -> Tenant:
+    """УК с домом, жильцом этого дома и диспетчером УК"""
+    async with shards.session() as db:
+        company = Company(name="УК Комфорт")
+        db.add(company)
+        await db.flush()
+        house = House(company_id=company.id, address=f"ул. Ленина, д. {company.id}", apartment_count=120)
+        db.add(house)
+        await db.flush()
+        # telegram_id после уже занятых: test_query_plans заполняет БД синтетическими пользователями
+        telegram_id = (await db.execute(select(func.coalesce(func.max(User.telegram_id), 0)))).scalar()
+        resident = User(telegram_id=telegram_id + 1, first_name="Иван", role=UserRole.RESIDENT,
+                        house_id=house.id, apartment="45")
+        dispatcher = User(telegram_id=telegram_id + 2, first_name="Ольга", role=UserRole.DISPATCHER,
+                          company_id=company.id)
+        db.add_all([resident, dispatcher])
+        await db.commit()
+        headers = {}
+        for user in (resident, dispatcher):
+            token = create_access_token(await token_claims(db, user))
+            headers[user.id] = {"Authorization": f"Bearer {token}"}
+    return Tenant(company, house, resident, dispatcher, headers[resident.id], headers[dispatcher.id])
+
+
+@pytest.fixture
+async def super_admin_headers() -> dict:
+    """Заголовок с токеном суперадмина"""
+    async with shards.session() as db:
+        telegram_id = (await db.execute(select(func.coalesce(func.max(User.telegram_id), 0)))).scalar()
+        admin = User(telegram_id=telegram_id + 1, first_name="Админ", role=UserRole.SUPER_ADMIN)
+        db.add(admin)
+        await db.commit()
+        token = create_access_token(await token_claims(db, admin))
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+async def second_shard(monkeypatch):
+    """
+    Дополнительный шард "b" на время теста: отдельная SQLite-база или, на PostgreSQL,
+    отдельная схема той же БД. УК размещаются на нём через API суперадмина (поле shard).
+    """
+    name = "b"
+    default = shards.engines["default"]
+    schema = None
+    if default.dialect.name == "postgresql":
+        schema = f"shard_{uuid.uuid4().hex[:8]}"
+        async with default.begin() as conn:
+            await conn.execute(text(f"CREATE SCHEMA {schema};"))
+        shard_engine, reader = create_async_engine(
+            default.url, connect_args={"server_settings": {"search_path": schema}}
+        ), None
+    else:
+        shard_engine, reader = _create_engine(f"sqlite+aiosqlite:///{_DB_DIR}/{name}-{uuid.uuid4().hex[:8]}.db")
+    async with shard_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    monkeypatch.setitem(shards.engines, name, shard_engine)
+    monkeypatch.setitem(shards.sessionmakers, name, _sessionmaker(shard_engine, name, reader))
+    if reader:
+        monkeypatch.setitem(shards.readers, name, reader)
+    monkeypatch.setattr(shards, "placements", dict(shards.placements))
+    yield name
+
+    async with shards.session() as db:
+        await db.execute(text("DELETE FROM company_shards WHERE shard = :shard"), {"shard": name})
+        await db.commit()
+    await shard_engine.dispose()
+    if reader:
+        await reader.dispose()
+    if schema:
+        async with default.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE;"))
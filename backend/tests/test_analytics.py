@@ -0,0 +1,70 @@
+"""
+SLA-аналитика (app/utils/analytics.py): заявка считается в УК и доме, откуда
+подана, а не в текущих УК и доме жильца; диспетчер - тот, кто принял заявку первым.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func
+
+from app.database import engine, shards
+from app.models import Company, House, User, UserRole, Request, RequestHistory, RequestStatus, RequestCategory
+from app.utils.analytics import sla_report
+
+# Период, в который не попадают заявки других тестов
+PERIOD_START = datetime(2001, 3, 1, tzinfo=timezone.utc)
+
+
+def _bound(value: datetime) -> datetime:
+    return value if engine.dialect.name == "postgresql" else value.replace(tzinfo=None)
+
+
+async def test_report_uses_request_company_and_first_acceptor(tenant):
+    created = PERIOD_START + timedelta(days=1)
+    async with shards.session() as db:
+        telegram_id = (await db.execute(select(func.max(User.telegram_id)))).scalar()
+        # Второй диспетчер с большим id: min(changed_by) выбрал бы первого
+        first_acceptor = User(telegram_id=telegram_id + 1, first_name="Пётр", role=UserRole.DISPATCHER,
+                              company_id=tenant.company.id)
+        db.add(first_acceptor)
+        await db.flush()
+
+        request = Request(user_id=tenant.resident.id, company_id=tenant.company.id, house_id=tenant.house.id,
+                          category=RequestCategory.PLUMBING, title="Течёт кран", status=RequestStatus.ACCEPTED,
+                          created_at=created)
+        db.add(request)
+        await db.flush()
+        db.add_all([
+            RequestHistory(request_id=request.id, new_status=RequestStatus.NEW, changed_by=tenant.resident.id,
+                           created_at=created),
+            RequestHistory(request_id=request.id, old_status=RequestStatus.NEW, new_status=RequestStatus.ACCEPTED,
+                           changed_by=first_acceptor.id, created_at=created + timedelta(hours=1)),
+            RequestHistory(request_id=request.id, old_status=RequestStatus.ACCEPTED, new_status=RequestStatus.NEW,
+                           changed_by=first_acceptor.id, created_at=created + timedelta(hours=2)),
+            RequestHistory(request_id=request.id, old_status=RequestStatus.NEW, new_status=RequestStatus.ACCEPTED,
+                           changed_by=tenant.dispatcher.id, created_at=created + timedelta(hours=3)),
+        ])
+
+        # Жилец переехал в дом другой УК после подачи заявки
+        other = Company(name="УК Новая")
+        db.add(other)
+        await db.flush()
+        other_house = House(company_id=other.id, address=f"ул. Мира, д. {other.id}")
+        db.add(other_house)
+        await db.flush()
+        resident = await db.get(User, tenant.resident.id)
+        resident.house_id = other_house.id
+        await db.commit()
+
+    date_from, date_to = _bound(PERIOD_START), _bound(PERIOD_START + timedelta(days=30))
+    async with shards.session() as db:
+        by_company = await sla_report(db, date_from, date_to, "company")
+        by_other = await sla_report(db, date_from, date_to, "company", company_id=other.id)
+        by_house = await sla_report(db, date_from, date_to, "house")
+        by_dispatcher = await sla_report(db, date_from, date_to, "dispatcher")
+
+    assert [(g["key"], g["requests"]) for g in by_company["groups"]] == [(tenant.company.id, 1)]
+    assert by_other["groups"] == []
+    assert [(g["key"], g["label"]) for g in by_house["groups"]] == [(tenant.house.id, tenant.house.address)]
+    [group] = by_dispatcher["groups"]
+    assert (group["key"], group["label"]) == (first_acceptor.id, "Пётр")
+    assert group["time_to_accept"]["p50"] == 1.0
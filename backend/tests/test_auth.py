@@ -0,0 +1,68 @@
+"""
+Перенос жильца в шард УК выбранного дома (PATCH /api/auth/me, auth._move_resident):
+при сбое записи в любом из шардов жилец остаётся ровно в одном шарде.
+"""
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import shards
+from app.models import User, UserRole
+
+
+@pytest.fixture
+async def other_house(client, second_shard, super_admin_headers) -> dict:
+    """Дом УК на втором шарде: {"house_id", "house_company_id"}"""
+    response = await client.post(
+        "/api/superadmin/companies", json={"name": "УК Соседняя", "shard": second_shard}, headers=super_admin_headers
+    )
+    company_id = response.json()["id"]
+    response = await client.post(
+        "/api/superadmin/houses", json={"company_id": company_id, "address": "ул. Новая, д. 1"},
+        headers=super_admin_headers,
+    )
+    return {"house_id": response.json()["id"], "house_company_id": company_id}
+
+
+async def _shards_of(telegram_id: int):
+    async def find(db):
+        return (await db.execute(select(User.house_id).where(User.telegram_id == telegram_id))).scalar()
+
+    return {shard: house_id for shard, house_id in await shards.fan_out(find) if house_id is not None}
+
+
+async def test_move_resident(client, tenant, other_house, second_shard):
+    response = await client.patch("/api/auth/me", json=other_house, headers=tenant.resident_headers)
+
+    assert response.status_code == 200
+    assert "X-Access-Token" in response.headers
+    assert await _shards_of(tenant.resident.telegram_id) == {second_shard: other_house["house_id"]}
+
+
+async def test_move_fails_on_target(client, tenant, other_house, second_shard):
+    # Строка с тем же telegram_id в целевом шарде: INSERT нарушит уникальность
+    async with shards.session(second_shard) as db:
+        db.add(User(telegram_id=tenant.resident.telegram_id, role=UserRole.RESIDENT))
+        await db.commit()
+
+    response = await client.patch("/api/auth/me", json=other_house, headers=tenant.resident_headers)
+
+    assert response.status_code == 409
+    async with shards.session() as db:
+        assert (await db.get(User, tenant.resident.id)).house_id == tenant.house.id
+
+
+async def test_move_fails_on_source(client, tenant, other_house, monkeypatch):
+    commit = AsyncSession.commit
+
+    async def lost_connection(self):
+        if self.info["shard"] == "default" and any(isinstance(obj, User) for obj in self.deleted):
+            raise ConnectionError("соединение потеряно")
+        return await commit(self)
+
+    monkeypatch.setattr(AsyncSession, "commit", lost_connection)
+    with pytest.raises(ConnectionError):
+        await client.patch("/api/auth/me", json=other_house, headers=tenant.resident_headers)
+    monkeypatch.setattr(AsyncSession, "commit", commit)
+
+    assert await _shards_of(tenant.resident.telegram_id) == {"default": tenant.house.id}
@@ -0,0 +1,68 @@
+"""
+CSV-импорт домов и жильцов (POST /api/superadmin/import): строки пишутся в шард
+своей УК, жилец, который уже есть в другом шарде, не дублируется.
+"""
+from sqlalchemy import select
+
+from app.database import shards
+from app.models import House, User
+
+
+async def _import(client, headers, csv: str):
+    response = await client.post(
+        "/api/superadmin/import", files={"file": ("import.csv", csv.encode(), "text/csv")}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def _create_company(client, headers, name: str, shard: str) -> int:
+    response = await client.post("/api/superadmin/companies", json={"name": name, "shard": shard}, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+async def test_import_rows_and_errors(client, tenant, super_admin_headers):
+    telegram_id = tenant.dispatcher.telegram_id + 1000
+    report = await _import(client, super_admin_headers, (
+        "company_id;address;apartment_count;telegram_id;first_name;apartment\n"
+        f"{tenant.company.id};ул. Импортная, д. 1;40;{telegram_id};Анна;12\n"
+        f"{tenant.company.id};ул. Импортная, д. 1;;;;\n"
+        f"999999;ул. Чужая, д. 1;;;;\n"
+        f"нет;ул. Чужая, д. 2;;;;\n"
+    ))
+
+    assert (report["rows"], report["houses"], report["residents"]) == (4, 1, 1)
+    assert [error["row"] for error in report["errors"]] == [4, 5]
+    async with shards.session() as db:
+        user = (await db.execute(select(User).where(User.telegram_id == telegram_id))).scalar_one()
+        house = await db.get(House, user.house_id)
+    assert (house.address, house.apartment_count, user.apartment) == ("ул. Импортная, д. 1", 40, "12")
+
+
+async def test_import_rejects_user_from_other_shard(client, second_shard, super_admin_headers):
+    first = await _create_company(client, super_admin_headers, "УК Первая", "default")
+    second = await _create_company(client, super_admin_headers, "УК Вторая", second_shard)
+    async with shards.session() as db:
+        telegram_id = (await db.execute(select(User.telegram_id).order_by(User.telegram_id.desc()))).first()[0] + 1
+
+    report = await _import(client, super_admin_headers, (
+        "company_id;address;telegram_id;first_name\n"
+        f"{first};ул. Шардовая, д. 1;{telegram_id};Анна\n"
+    ))
+    assert (report["residents"], report["error_count"]) == (1, 0)
+
+    report = await _import(client, super_admin_headers, (
+        "company_id;address;telegram_id;first_name\n"
+        f"{second};ул. Шардовая, д. 2;{telegram_id};Анна\n"
+        f"{second};ул. Шардовая, д. 3;;\n"
+    ))
+    assert report["residents"] == 0
+    assert report["errors"] == [
+        {"row": 2, "error": f"Пользователь с telegram_id {telegram_id} уже есть в шарде default"}
+    ]
+    async with shards.session(second_shard) as db:
+        assert (await db.execute(select(User).where(User.telegram_id == telegram_id))).first() is None
+        addresses = (await db.execute(select(House.address).where(House.company_id == second))).scalars().all()
+    assert addresses == ["ул. Шардовая, д. 3"]
+    assert await shards.shard_for_user(telegram_id) == "default"
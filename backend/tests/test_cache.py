@@ -0,0 +1,65 @@
+"""
+Двухуровневый кэш ответов: два экземпляра ResponseCache - два процесса API
+с общим Redis (fakeredis). Доставку события шиной другому процессу
+заменяет вызов его подписчика _bump.
+"""
+import uuid
+
+import pytest
+
+from app.utils.cache import ResponseCache, RedisCacheStore, HOUSES
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis_url(monkeypatch):
+    import redis.asyncio
+    monkeypatch.setattr(redis.asyncio, "from_url", fakeredis.FakeAsyncRedis.from_url)
+    # Отдельный фейковый сервер на тест
+    return f"redis://{uuid.uuid4().hex}:6379/0"
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        return f'{{"version": {self.calls}}}'.encode()
+
+
+async def test_shared_tier_serves_other_process(redis_url):
+    first = ResponseCache(100, 60, RedisCacheStore(redis_url))
+    second = ResponseCache(100, 60, RedisCacheStore(redis_url))
+    loader = Loader()
+
+    assert await first.get_or_load(HOUSES, ("list", None, 0, 100), loader) == b'{"version": 1}'
+    assert await second.get_or_load(HOUSES, ("list", None, 0, 100), loader) == b'{"version": 1}'
+    assert loader.calls == 1
+
+
+async def test_invalidate_skips_stale_shared_entries(redis_url):
+    first = ResponseCache(100, 60, RedisCacheStore(redis_url))
+    second = ResponseCache(100, 60, RedisCacheStore(redis_url))
+    loader = Loader()
+    key = ("get", "default", 1)
+
+    await first.get_or_load(HOUSES, key, loader)
+    await second.get_or_load(HOUSES, key, loader)
+
+    await first.invalidate(HOUSES)
+    second._bump([HOUSES])  # событие шины дошло до второго процесса
+
+    assert await second.get_or_load(HOUSES, key, loader) == b'{"version": 2}'
+    assert await first.get_or_load(HOUSES, key, loader) == b'{"version": 2}'
+    assert loader.calls == 2
+
+
+async def test_redis_unavailable_falls_back_to_loader():
+    cache = ResponseCache(100, 60, RedisCacheStore("redis://127.0.0.1:1/0"))
+    loader = Loader()
+
+    assert await cache.get_or_load(HOUSES, ("list", None, 0, 100), loader) == b'{"version": 1}'
+    await cache.invalidate(HOUSES)
+    assert await cache.get_or_load(HOUSES, ("list", None, 0, 100), loader) == b'{"version": 2}'
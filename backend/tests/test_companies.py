@@ -0,0 +1,23 @@
+"""
+Число домов в ответах /api/companies считается в шарде УК, а не в шарде запроса.
+"""
+
+
+async def test_house_count_from_company_shard(client, second_shard, super_admin_headers):
+    response = await client.post(
+        "/api/superadmin/companies", json={"name": "УК Дальняя", "shard": second_shard}, headers=super_admin_headers
+    )
+    company_id = response.json()["id"]
+    for number in (1, 2):
+        response = await client.post(
+            "/api/superadmin/houses", json={"company_id": company_id, "address": f"ул. Дальняя, д. {number}"},
+            headers=super_admin_headers,
+        )
+        assert response.status_code == 201
+
+    response = await client.get(f"/api/companies/{company_id}")
+    assert response.json()["house_count"] == 2
+
+    response = await client.get("/api/companies", params={"limit": 10000})
+    [company] = [c for c in response.json()["items"] if c["id"] == company_id]
+    assert company["house_count"] == 2
@@ -0,0 +1,120 @@
+"""
+Перевод request_history в секционированную таблицу пачками (PostgreSQL,
+TEST_DATABASE_URL): прерванный перевод продолжается, строки, записанные
+приложением между запусками, и каскадные удаления не теряются.
+
+Схема создаётся в отдельной схеме PostgreSQL, чтобы таблица была обычной,
+как в БД до секционирования.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import Base, engine
+from app.models import Company, House, User, UserRole, Request, RequestHistory, RequestStatus, RequestCategory
+from app.utils import migration
+
+pytestmark = pytest.mark.skipif(engine.dialect.name != "postgresql", reason="секционирование - только PostgreSQL")
+
+REQUESTS = 300
+
+
+@pytest.fixture
+async def plain_engine():
+    schema = f"history_{uuid.uuid4().hex[:8]}"
+    async with engine.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA {schema};"))
+    schema_engine = create_async_engine(engine.url, connect_args={"server_settings": {"search_path": schema}})
+    async with schema_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield schema_engine
+    await schema_engine.dispose()
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA {schema} CASCADE;"))
+
+
+async def _seed(conn):
+    now = datetime.now(timezone.utc)
+    await conn.execute(insert(Company), [{"id": 1, "name": "УК"}])
+    await conn.execute(insert(House), [{"id": 1, "company_id": 1, "address": "ул. Ленина, д. 1"}])
+    await conn.execute(insert(User), [{"id": 1, "telegram_id": 1, "role": UserRole.RESIDENT, "house_id": 1}])
+    await conn.execute(insert(Request), [
+        {"id": i, "user_id": 1, "company_id": 1, "category": RequestCategory.PLUMBING, "title": f"Заявка {i}",
+         "status": RequestStatus.ACCEPTED, "created_at": now - timedelta(days=2 * i)}
+        for i in range(1, REQUESTS + 1)
+    ])
+    await conn.execute(insert(RequestHistory), [
+        {"request_id": i, "old_status": old, "new_status": new, "changed_by": 1,
+         "created_at": now - timedelta(days=2 * i) + timedelta(hours=step)}
+        for i in range(1, REQUESTS + 1)
+        for step, (old, new) in enumerate([(None, RequestStatus.NEW), (RequestStatus.NEW, RequestStatus.ACCEPTED)])
+    ])
+
+
+async def _history_ids(conn):
+    return set((await conn.execute(select(RequestHistory.id))).scalars().all())
+
+
+async def test_batched_conversion_resumes(plain_engine, monkeypatch):
+    async with plain_engine.begin() as conn:
+        await _seed(conn)
+
+    # Первый запуск обрывается после трёх пачек
+    copy_batch = migration._copy_history_batch
+    calls = 0
+
+    async def interrupted(conn, after, batch_size):
+        nonlocal calls
+        calls += 1
+        if calls > 3:
+            raise RuntimeError("прервано")
+        return await copy_batch(conn, after, batch_size)
+
+    monkeypatch.setattr(migration, "_copy_history_batch", interrupted)
+    with pytest.raises(RuntimeError):
+        await migration.partition_request_history(plain_engine, months_ahead=2, batch_size=100)
+    monkeypatch.setattr(migration, "_copy_history_batch", copy_batch)
+
+    async with plain_engine.begin() as conn:
+        assert not await migration._history_partitioned(conn)
+        assert (await conn.execute(text(f"SELECT count(*) FROM {migration.HISTORY_COPY};"))).scalar() == 300
+        # Приложение работает дальше: новые записи истории и удаление уже скопированной заявки
+        await conn.execute(insert(RequestHistory), [
+            {"request_id": 2, "old_status": RequestStatus.ACCEPTED, "new_status": RequestStatus.IN_PROGRESS}
+        ])
+        await conn.execute(delete(Request).where(Request.id == 1))
+        expected = await _history_ids(conn)
+
+    assert await migration.partition_request_history(plain_engine, months_ahead=2, batch_size=100)
+
+    async with plain_engine.begin() as conn:
+        assert await migration._history_partitioned(conn)
+        assert await _history_ids(conn) == expected
+        assert len(expected) == 2 * REQUESTS - 2 + 1
+
+        # Последовательность id и внешние ключи перешли к новой таблице
+        new_id = (await conn.execute(
+            insert(RequestHistory)
+            .values(request_id=3, old_status=RequestStatus.ACCEPTED, new_status=RequestStatus.COMPLETED)
+            .returning(RequestHistory.id)
+        )).scalar()
+        assert new_id > max(expected)
+        await conn.execute(delete(Request).where(Request.id == 3))
+        remaining = (await conn.execute(
+            select(func.count()).select_from(RequestHistory).where(RequestHistory.request_id == 3)
+        )).scalar()
+        assert remaining == 0
+
+        indexes = set((await conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'request_history' AND schemaname = current_schema();"
+        ))).scalars().all())
+        assert {"request_history_pkey", "ix_request_history_request"} <= indexes
+        partitions = (await conn.execute(text(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = 'request_history'::regclass;"
+        ))).scalar()
+        assert partitions > 20  # месяцы за два года истории, будущие и default
+
+    assert not await migration.partition_request_history(plain_engine, months_ahead=2)
@@ -0,0 +1,34 @@
+"""
+Адрес дома уникален в пределах УК: создание и переименование в уже занятый
+адрес отвечают 409, а не 500 от нарушения uq_houses_company_address.
+"""
+
+async def test_duplicate_address_conflict(client, tenant):
+    response = await client.post("/api/houses", json={"company_id": tenant.company.id, "address": tenant.house.address})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Дом с таким адресом в этой УК уже существует"
+
+    response = await client.post("/api/houses", json={"company_id": tenant.company.id, "address": "ул. Мира, д. 7"})
+    assert response.status_code == 201
+    response = await client.patch(f"/api/houses/{response.json()['id']}", json={"address": tenant.house.address})
+    assert response.status_code == 409
+
+
+async def test_superadmin_duplicate_address_conflict(client, tenant, super_admin_headers):
+    response = await client.post(
+        "/api/superadmin/houses", json={"company_id": tenant.company.id, "address": tenant.house.address},
+        headers=super_admin_headers,
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Дом с таким адресом в этой УК уже существует"
+
+    response = await client.post(
+        "/api/superadmin/houses", json={"company_id": tenant.company.id, "address": "ул. Мира, д. 8"},
+        headers=super_admin_headers,
+    )
+    assert response.status_code == 201
+    response = await client.patch(
+        f"/api/superadmin/houses/{response.json()['id']}?shard=default", json={"address": tenant.house.address},
+        headers=super_admin_headers,
+    )
+    assert response.status_code == 409
@@ -0,0 +1,100 @@
+"""
+Стартовая миграция (app/utils/migration.py). На SQLite шаги только для
+PostgreSQL (секции request_history) не мешают ей пройти без пропусков, версия
+схемы записывается, и следующий старт пропускает create_all и миграцию.
+Уникальный индекс адресов домов создаётся и на БД, где адреса уже дублируются.
+"""
+import uuid
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import Base, engine
+from app.models import Company, House
+from app.utils.migration import ensure_schema, run_auto_migration, stale_shards
+
+sqlite_only = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="миграция SQLite")
+
+
+@sqlite_only
+async def test_sqlite_migration_completes(capsys):
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM schema_version;"))
+
+    await ensure_schema()
+
+    assert "AUTO-MIGRATION FINISHED." in capsys.readouterr().out
+    assert await stale_shards() == []
+    async with engine.connect() as conn:
+        index = (await conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'ix_request_history_request';"
+        ))).scalar()
+    assert index == "ix_request_history_request"
+
+
+@sqlite_only
+async def test_current_schema_skips_migration(capsys):
+    await ensure_schema()
+    capsys.readouterr()
+
+    await ensure_schema()
+
+    output = capsys.readouterr().out
+    assert "schema is up to date" in output
+    assert "STARTING AUTO-MIGRATION" not in output
+
+
+@pytest.fixture
+async def legacy_engine(tmp_path):
+    """Отдельная БД со схемой моделей, но без уникального индекса (company_id, address)"""
+    if engine.dialect.name == "postgresql":
+        schema = f"legacy_{uuid.uuid4().hex[:8]}"
+        async with engine.begin() as conn:
+            await conn.execute(text(f"CREATE SCHEMA {schema};"))
+        legacy = create_async_engine(engine.url, connect_args={"server_settings": {"search_path": schema}})
+        async with legacy.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text("ALTER TABLE houses DROP CONSTRAINT uq_houses_company_address;"))
+    else:
+        schema = None
+        legacy = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/legacy.db")
+        async with legacy.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            # Ограничение SQLite не удалить: пересоздаём таблицу без него
+            await conn.execute(text("DROP TABLE houses;"))
+            await conn.execute(text(
+                "CREATE TABLE houses (id INTEGER PRIMARY KEY, company_id INTEGER NOT NULL, "
+                "address VARCHAR(500) NOT NULL, apartment_count INTEGER, created_at DATETIME);"
+            ))
+    yield legacy
+    await legacy.dispose()
+    if schema:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE;"))
+
+
+async def test_duplicate_addresses_renamed_before_unique_index(legacy_engine):
+    async with legacy_engine.begin() as conn:
+        await conn.execute(insert(Company), [{"id": 1, "name": "УК"}, {"id": 2, "name": "УК 2"}])
+        await conn.execute(text(
+            "INSERT INTO houses (id, company_id, address) VALUES "
+            "(1, 1, 'ул. Ленина, д. 1'), (2, 1, 'ул. Ленина, д. 1'), (3, 1, 'ул. Ленина, д. 1'), "
+            "(4, 2, 'ул. Ленина, д. 1'), (5, 1, 'ул. Мира, д. 2');"
+        ))
+
+    await run_auto_migration(legacy_engine, "default")
+
+    async with legacy_engine.begin() as conn:
+        addresses = dict((await conn.execute(select(House.id, House.address).order_by(House.id))).all())
+    assert addresses == {
+        1: "ул. Ленина, д. 1",
+        2: "ул. Ленина, д. 1 (дубль 2)",
+        3: "ул. Ленина, д. 1 (дубль 3)",
+        4: "ул. Ленина, д. 1",
+        5: "ул. Мира, д. 2",
+    }
+    with pytest.raises(IntegrityError):
+        async with legacy_engine.begin() as conn:
+            await conn.execute(text("INSERT INTO houses (company_id, address) VALUES (1, 'ул. Мира, д. 2');"))
@@ -0,0 +1,253 @@
+"""
+Планы горячих запросов: EXPLAIN каждого запроса фильтрации из
+routers/requests.py, houses.py, companies.py и superadmin.py на синтетических
+данных. Тест падает, если в плане есть последовательное сканирование
+(Seq Scan в PostgreSQL, SCAN без индекса в SQLite) большой таблицы - от
+LARGE_TABLE_ROWS строк: маленькую таблицу планировщик вправе читать целиком.
+
+Объём данных - QUERY_PLANS_REQUESTS заявок (по умолчанию 20 000); планы
+PostgreSQL проверяются на пустой БД из TEST_DATABASE_URL, на объёме ближе к
+боевому:
+    TEST_DATABASE_URL=postgresql://localhost/plans_test QUERY_PLANS_REQUESTS=200000 \
+        pytest tests/test_query_plans.py
+"""
+import json
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import pytest
+from sqlalchemy import select, func, insert, text
+from sqlalchemy.engine import Row
+
+from app.database import engine
+from app.models import (
+    Company, House, User, UserRole, Request, RequestHistory, RequestStatus, RequestCategory, Incident
+)
+from app.routers.requests import list_queries
+
+SEED_REQUESTS = int(os.getenv("QUERY_PLANS_REQUESTS", "20000"))
+
+# Таблицы (и секции истории) меньше этого читать целиком нормально
+LARGE_TABLE_ROWS = 10000
+
+SEED_BATCH_SIZE = 5000
+HOUSES_PER_COMPANY = 10
+REQUESTS_PER_RESIDENT = 4
+
+
+async def _insert_batches(conn, model, rows):
+    for start in range(0, len(rows), SEED_BATCH_SIZE):
+        await conn.execute(insert(model), rows[start:start + SEED_BATCH_SIZE])
+
+
+async def seed(request_count: int):
+    """Заполнить БД: УК, дома, жильцы, сотрудники, заявки с историей за два года"""
+    rnd = random.Random(42)
+    now = datetime.now(timezone.utc)
+    residents = max(request_count // REQUESTS_PER_RESIDENT, 1)
+    houses = max(residents // 50, 1)
+    companies = max(houses // HOUSES_PER_COMPANY, 1)
+
+    async with engine.begin() as conn:
+        base_company = (await conn.execute(select(func.coalesce(func.max(Company.id), 0)))).scalar()
+        base_house = (await conn.execute(select(func.coalesce(func.max(House.id), 0)))).scalar()
+        base_user = (await conn.execute(select(func.coalesce(func.max(User.id), 0)))).scalar()
+        base_request = (await conn.execute(select(func.coalesce(func.max(Request.id), 0)))).scalar()
+        base_telegram = (await conn.execute(select(func.coalesce(func.max(User.telegram_id), 0)))).scalar()
+
+        await _insert_batches(conn, Company, [
+            {"id": base_company + i + 1, "name": f"УК {base_company + i + 1}"} for i in range(companies)
+        ])
+        await _insert_batches(conn, House, [
+            {"id": base_house + i + 1, "company_id": base_company + i % companies + 1,
+             "address": f"ул. Синтетическая, д. {base_house + i + 1}"}
+            for i in range(houses)
+        ])
+        await _insert_batches(conn, User, [
+            {"id": base_user + i + 1, "telegram_id": base_telegram + i + 1, "role": UserRole.RESIDENT,
+             "house_id": base_house + i % houses + 1, "apartment": str(i % 300 + 1), "first_name": f"Жилец {i}"}
+            for i in range(residents)
+        ])
+        await _insert_batches(conn, User, [
+            {"id": base_user + residents + i + 1, "telegram_id": base_telegram + residents + i + 1,
+             "role": UserRole.DISPATCHER, "company_id": base_company + i + 1}
+            for i in range(companies)
+        ])
+
+        statuses = list(RequestStatus)
+        requests, history = [], []
+        for i in range(request_count):
+            user_index = i % residents
+            created = now - timedelta(minutes=rnd.randrange(60 * 24 * 730))
+            status = rnd.choice(statuses)
+            requests.append({
+                "id": base_request + i + 1,
+                "user_id": base_user + user_index + 1,
+                "company_id": base_company + (user_index % houses) % companies + 1,
+                "house_id": base_house + user_index % houses + 1,
+                "category": rnd.choice(list(RequestCategory)),
+                "title": f"Заявка {i}",
+                "status": status,
+                "status_changed_at": created,
+                "created_at": created,
+                "updated_at": created,
+            })
+            history.append({"request_id": base_request + i + 1, "old_status": None,
+                            "new_status": RequestStatus.NEW, "created_at": created})
+            if status != RequestStatus.NEW:
+                history.append({"request_id": base_request + i + 1, "old_status": RequestStatus.NEW,
+                                "new_status": status, "created_at": created + timedelta(hours=1)})
+        await _insert_batches(conn, Request, requests)
+        await _insert_batches(conn, RequestHistory, history)
+
+        if conn.dialect.name == "postgresql":
+            # id заданы явно: сдвигаем последовательности, иначе следующие INSERT других тестов упадут
+            for table in ("companies", "houses", "users", "requests"):
+                await conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+                ))
+        await conn.execute(text("ANALYZE;"))
+
+
+@dataclass
+class Sample:
+    """Реальные id из БД для параметров запросов"""
+    dialect: str
+    resident: Row
+    dispatcher: Row
+    request_ids: List[int]
+
+    @property
+    def resident_user(self) -> User:
+        return User(id=self.resident.id, role=UserRole.RESIDENT, house_id=self.resident.house_id)
+
+    @property
+    def staff_user(self) -> User:
+        return User(id=self.dispatcher.id, role=UserRole.DISPATCHER, company_id=self.dispatcher.company_id)
+
+    @property
+    def super_admin(self) -> User:
+        return User(id=0, role=UserRole.SUPER_ADMIN)
+
+    @property
+    def month_ago(self) -> datetime:
+        month_ago = datetime.now(timezone.utc) - timedelta(days=30)
+        return month_ago if self.dialect == "postgresql" else month_ago.replace(tzinfo=None)
+
+    def requests_list(self, user: User, status=None):
+        """(страница, количество) списка заявок, как их строит GET /requests"""
+        page, count, _ = list_queries(Request, user, status, None, None, self.dialect)
+        return page.limit(50), count
+
+
+# Название -> запрос в том виде, как его строит роутер
+HOT_QUERIES = {
+    "requests: жилец (страница)": lambda s: s.requests_list(s.resident_user)[0],
+    "requests: жилец (количество)": lambda s: s.requests_list(s.resident_user)[1],
+    "requests: УК (страница)": lambda s: s.requests_list(s.staff_user)[0],
+    "requests: УК (количество)": lambda s: s.requests_list(s.staff_user)[1],
+    "requests: УК + статус (страница)": lambda s: s.requests_list(s.staff_user, RequestStatus.NEW)[0],
+    "requests: УК + статус (количество)": lambda s: s.requests_list(s.staff_user, RequestStatus.NEW)[1],
+    "requests: суперадмин + статус (страница)": lambda s: s.requests_list(s.super_admin, RequestStatus.IN_PROGRESS)[0],
+    "requests: суперадмин + статус (количество)": lambda s: s.requests_list(s.super_admin, RequestStatus.IN_PROGRESS)[1],
+    "requests: суперадмин (страница)": lambda s: s.requests_list(s.super_admin)[0],
+    # Без "суперадмин (количество)": count(*) без фильтра по определению читает всю таблицу
+    "requests: история (selectinload)": lambda s: (
+        select(RequestHistory).where(RequestHistory.request_id.in_(s.request_ids)).order_by(RequestHistory.created_at)
+    ),
+    "requests: выгрузка за месяц": lambda s: (
+        select(Request).where(Request.created_at >= s.month_ago).order_by(Request.created_at, Request.id)
+    ),
+    "requests: claim-next": lambda s: (
+        select(Request.id)
+        .where(Request.company_id == s.dispatcher.company_id, Request.assignee_id.is_(None),
+               Request.status == RequestStatus.NEW)
+        .order_by(Request.priority.desc(), Request.created_at).limit(1)
+    ),
+    "incidents: поиск кластера": lambda s: (
+        select(Incident)
+        .where(Incident.house_id == s.resident.house_id, Incident.category == RequestCategory.PLUMBING,
+               Incident.last_request_at >= s.month_ago)
+        .order_by(Incident.last_request_at.desc()).limit(5)
+    ),
+    "houses: дома УК": lambda s: (
+        select(House).where(House.company_id == s.dispatcher.company_id).order_by(House.address).limit(100)
+    ),
+    "houses: количество домов УК": lambda s: (
+        select(func.count(House.id)).where(House.company_id == s.dispatcher.company_id)
+    ),
+    "companies: число домов на странице": lambda s: (
+        select(House.company_id, func.count(House.id))
+        .where(House.company_id.in_([s.dispatcher.company_id])).group_by(House.company_id)
+    ),
+    "superadmin: сотрудники УК": lambda s: (
+        select(User).where(User.company_id == s.dispatcher.company_id).order_by(User.id)
+    ),
+    "superadmin: жильцы дома": lambda s: (
+        select(func.count(User.id)).where(User.house_id == s.resident.house_id)
+    ),
+    "superadmin: заявки по статусу": lambda s: (
+        select(func.count(Request.id)).where(Request.status == RequestStatus.NEW)
+    ),
+}
+
+
+def _postgres_seq_scans(plan: dict):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from _postgres_seq_scans(child)
+
+
+async def _sqlite_seq_scans(conn, sql: str) -> List[str]:
+    tables = []
+    for row in await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+        detail = row[-1]
+        # "SCAN requests" - полный проход; "SCAN requests USING INDEX ..." - проход по индексу
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            tables.append(detail.split()[-1] if detail.startswith("SCAN TABLE ") else detail.split()[1])
+    return tables
+
+
+async def _is_large(conn, table: str) -> bool:
+    return (await conn.execute(text(f"SELECT count(*) FROM {table}"))).scalar() >= LARGE_TABLE_ROWS
+
+
+async def seq_scans(conn, sql: str) -> List[str]:
+    """Большие таблицы, которые план читает последовательным сканированием"""
+    if conn.dialect.name == "postgresql":
+        raw = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+        tables = list(_postgres_seq_scans(plan))
+    else:
+        tables = await _sqlite_seq_scans(conn, sql)
+    return [table for table in tables if await _is_large(conn, table)]
+
+
+@pytest.fixture(scope="module")
+async def sample() -> Sample:
+    await seed(SEED_REQUESTS)
+    async with engine.connect() as conn:
+        resident = (await conn.execute(
+            select(User.id, User.house_id).where(User.role == UserRole.RESIDENT, User.house_id.is_not(None)).limit(1)
+        )).first()
+        dispatcher = (await conn.execute(
+            select(User.id, User.company_id)
+            .where(User.role == UserRole.DISPATCHER, User.company_id.is_not(None)).limit(1)
+        )).first()
+        request_ids = (await conn.execute(
+            select(Request.id).order_by(Request.created_at.desc()).limit(50)
+        )).scalars().all()
+        return Sample(conn.dialect.name, resident, dispatcher, list(request_ids))
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+async def test_no_seq_scan(sample: Sample, name: str):
+    async with engine.connect() as conn:
+        query = HOT_QUERIES[name](sample)
+        sql = str(query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+        tables = await seq_scans(conn, sql)
+    assert not tables, f"{name}: seq scan on {', '.join(tables)}"
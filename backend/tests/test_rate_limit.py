@@ -0,0 +1,23 @@
+"""
+Лимиты запросов (RateLimitMiddleware): лимит company считается по УК из токена,
+у жильца это tenant_id (УК его дома), у сотрудника - company_id.
+"""
+import httpx
+from starlette.responses import PlainTextResponse
+
+from app.utils.rate_limit import RateLimitMiddleware
+
+
+async def _ok(scope, receive, send):
+    await PlainTextResponse("ok")(scope, receive, send)
+
+
+async def test_resident_counts_against_company_limit(tenant):
+    limited = RateLimitMiddleware(_ok, {"/api": "company:2/minute"})
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=limited), base_url="http://test") as client:
+        first = await client.get("/api/requests", headers=tenant.resident_headers)
+        second = await client.get("/api/requests", headers=tenant.resident_headers)
+        # Диспетчер той же УК делит с жильцом один счётчик
+        third = await client.get("/api/requests", headers=tenant.dispatcher_headers)
+
+    assert [first.status_code, second.status_code, third.status_code] == [200, 200, 429]
@@ -0,0 +1,53 @@
+"""
+Сводки по заявкам (app/utils/rollups.py): счётчики идут в УК и дом заявки,
+а не в текущий дом жильца; большая пачка групп пишется несколькими INSERT.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func
+
+from app.database import shards
+from app.models import (
+    Company, House, User, Request, RequestHistory, RequestStatus, RequestCategory, RequestRollupHourly
+)
+from app.utils import rollups
+
+HOURS = 7
+
+
+async def test_rollup_keeps_request_house(tenant, monkeypatch):
+    # История других тестов - обычными пачками, до уменьшения размера INSERT
+    async with shards.session() as db:
+        await rollups.refresh_rollups(db)
+    monkeypatch.setattr(rollups, "ROLLUP_INSERT_ROWS", 2)
+    created = datetime(2002, 5, 1, 8, tzinfo=timezone.utc)
+    async with shards.session() as db:
+        request = Request(user_id=tenant.resident.id, company_id=tenant.company.id, house_id=tenant.house.id,
+                          category=RequestCategory.ELECTRICAL, title="Нет света", created_at=created)
+        db.add(request)
+        await db.flush()
+        db.add_all([
+            RequestHistory(request_id=request.id, new_status=RequestStatus.NEW, created_at=created + timedelta(hours=i))
+            for i in range(HOURS)
+        ])
+        # Жилец переехал в дом другой УК
+        other = Company(name="УК Новая")
+        db.add(other)
+        await db.flush()
+        other_house = House(company_id=other.id, address=f"ул. Мира, д. {other.id}")
+        db.add(other_house)
+        await db.flush()
+        resident = await db.get(User, tenant.resident.id)
+        resident.house_id = other_house.id
+        await db.commit()
+
+    async with shards.session() as db:
+        await rollups.refresh_rollups(db)
+
+        rows = (await db.execute(
+            select(RequestRollupHourly.company_id, RequestRollupHourly.house_id,
+                   func.count(), func.sum(RequestRollupHourly.count))
+            .where(RequestRollupHourly.company_id.in_([tenant.company.id, other.id]))
+            .group_by(RequestRollupHourly.company_id, RequestRollupHourly.house_id)
+        )).all()
+    assert rows == [(tenant.company.id, tenant.house.id, HOURS, HOURS)]
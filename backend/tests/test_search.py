@@ -0,0 +1,49 @@
+"""Поиск заявок диспетчером (GET /api/requests?q=)"""
+import pytest
+from sqlalchemy import text
+
+from app.database import engine
+
+
+@pytest.fixture(scope="module", autouse=True)
+async def search_available():
+    if engine.dialect.name == "postgresql":
+        async with engine.connect() as conn:
+            trgm = (await conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))).scalar()
+        if not trgm:
+            pytest.skip("поиск PostgreSQL требует расширения pg_trgm")
+
+
+async def _create(client, tenant, title: str) -> int:
+    response = await client.post(
+        "/api/requests", json={"category": "plumbing", "title": title}, headers=tenant.resident_headers
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+async def _search(client, tenant, q: str):
+    response = await client.get("/api/requests", params={"q": q}, headers=tenant.dispatcher_headers)
+    assert response.status_code == 200
+    return [item["id"] for item in response.json()["items"]]
+
+
+@pytest.mark.parametrize("q", ["течь", "Течь", "ТЕЧЬ", "тЕЧЬ ПОДВАЛЕ"])
+async def test_cyrillic_query_ignores_case(client, tenant, q):
+    request_id = await _create(client, tenant, "Течь в подвале")
+    await _create(client, tenant, "Не работает лифт")
+
+    assert await _search(client, tenant, q) == [request_id]
+
+
+@pytest.mark.skipif(engine.dialect.name != "sqlite", reason="ё -> е нормализует поиск SQLite")
+async def test_yo_matches_e(client, tenant):
+    request_id = await _create(client, tenant, "Течёт кран")
+
+    assert await _search(client, tenant, "ТЕЧЕТ") == [request_id]
+
+
+async def test_resident_name_search(client, tenant):
+    request_id = await _create(client, tenant, "Не закрывается дверь")
+
+    assert request_id in await _search(client, tenant, "ИВАН")
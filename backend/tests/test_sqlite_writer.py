@@ -0,0 +1,96 @@
+"""
+Одна пишущая connection SQLite на процесс (app/utils/sqlite.py): одновременные
+записи встают в очередь, а вторая пишущая сессия в той же задаче сразу получает
+ошибку вместо ожидания самой себя.
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine, get_db, shards
+from app.models import Company, Request
+from app.utils import idempotency
+from app.utils.idempotency import DbIdempotencyStore, IdempotentRoute
+from app.utils.sqlite import WriterBusyError
+
+pytestmark = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="очередь писателя - режим SQLite")
+
+
+async def test_concurrent_writes_queue_on_writer(client, tenant):
+    async def create(i: int):
+        response = await client.post(
+            "/api/requests", json={"category": "plumbing", "title": f"Протечка {i}"}, headers=tenant.resident_headers
+        )
+        return response.status_code
+
+    statuses = await asyncio.gather(*(create(i) for i in range(20)))
+
+    assert statuses == [201] * 20
+    async with shards.session() as db:
+        count = (await db.execute(select(func.count(Request.id)).where(Request.user_id == tenant.resident.id))).scalar()
+    assert count == 20
+
+
+async def test_concurrent_sessions_in_separate_tasks(tenant):
+    async def rename(i: int):
+        async with shards.session() as db:
+            company = await db.get(Company, tenant.company.id)
+            company.description = f"Обновление {i}"
+            await asyncio.sleep(0.01)  # транзакция держит писателя, остальные ждут
+            await db.commit()
+
+    await asyncio.wait_for(asyncio.gather(*(rename(i) for i in range(10))), timeout=10)
+
+
+async def test_second_writer_session_in_task_fails_fast(tenant):
+    async with shards.session() as first, shards.session() as second:
+        company = await first.get(Company, tenant.company.id)
+        company.description = "Первая сессия"
+        await first.flush()
+
+        second.add(Company(name="Вторая сессия"))
+        with pytest.raises(WriterBusyError):
+            await asyncio.wait_for(second.flush(), timeout=5)
+        await second.rollback()
+        await first.commit()
+
+    # После коммита первой сессии писать может любая
+    async with shards.session() as db:
+        db.add(Company(name="После коммита"))
+        await db.commit()
+
+
+@pytest.fixture
+def db_idempotency(monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", DbIdempotencyStore(ttl=60))
+
+
+@pytest.fixture
+def failing_app():
+    """Обработчик пишет и падает, не закоммитив: IdempotentRoute освобождает ключ своей сессией"""
+    router = APIRouter(route_class=IdempotentRoute)
+
+    @router.post("/companies")
+    async def create_then_fail(db: AsyncSession = Depends(get_db)):
+        db.add(Company(name="Не сохранится"))
+        await db.flush()
+        raise HTTPException(status_code=409, detail="Конфликт")
+
+    test_app = FastAPI()
+    test_app.include_router(router)
+    return test_app
+
+
+async def test_idempotency_key_after_uncommitted_write(db_idempotency, failing_app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=failing_app), base_url="http://test") as c:
+        for _ in range(2):
+            # Ключ освобождён: повтор выполняется заново, а не получает 409 "ещё выполняется"
+            response = await asyncio.wait_for(
+                c.post("/companies", headers={"Idempotency-Key": "k-1"}), timeout=5
+            )
+            assert response.status_code == 409
+            assert response.json()["detail"] == "Конфликт"
@@ -0,0 +1,235 @@
+"""
+Уведомления через Telegram Bot API против локального фейкового сервера.
+
+Фейковый Bot API - Starlette-приложение под uvicorn на свободном порту;
+на него указывает api_url отправителя, как settings.telegram_api_url в бою.
+"""
+import asyncio
+import time
+from collections import Counter
+
+import pytest
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request as HttpRequest
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.database import shards
+from app.models import Broadcast, BroadcastStatus, RequestStatus
+from app.utils.broadcasts import SEND_PARALLELISM, send_chunk
+from app.utils.telegram import TelegramError, TelegramNotifier, notifier
+from app.worker.runner import Worker
+
+TOKEN = "123456:TEST"
+
+
+class FakeBotApi:
+    """Принимает sendMessage, запоминает сообщения; по заказу отвечает 429 или ошибкой"""
+
+    def __init__(self):
+        self.messages = []
+        self.calls = 0
+        self.rate_limited = 0  # сколько следующих вызовов ответить 429
+        self.retry_after = 1
+        self.error = None  # (код, описание) для всех вызовов
+        self.url = ""
+        self.app = Starlette(routes=[Route("/bot{token}/sendMessage", self.send_message, methods=["POST"])])
+
+    async def send_message(self, request: HttpRequest):
+        self.calls += 1
+        if request.path_params["token"] != TOKEN:
+            return JSONResponse({"ok": False, "error_code": 401, "description": "Unauthorized"}, 401)
+        if self.error:
+            code, description = self.error
+            return JSONResponse({"ok": False, "error_code": code, "description": description}, code)
+        if self.rate_limited:
+            self.rate_limited -= 1
+            return JSONResponse({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, 429)
+        body = await request.json()
+        self.messages.append(body)
+        return JSONResponse({
+            "ok": True,
+            "result": {"message_id": len(self.messages), "chat": {"id": body["chat_id"]}, "text": body["text"]},
+        })
+
+
+@pytest.fixture
+async def bot_api():
+    fake = FakeBotApi()
+    server = uvicorn.Server(uvicorn.Config(fake.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    fake.url = f"http://127.0.0.1:{port}"
+    yield fake
+    server.should_exit = True
+    await serving
+
+
+@pytest.fixture
+async def sender(bot_api):
+    sender = TelegramNotifier(TOKEN, bot_api.url, global_rate=100.0, chat_rate=100.0)
+    yield sender
+    await sender.close()
+
+
+async def test_send_message(bot_api, sender):
+    result = await sender.send_message(42, "Заявка #1 «Течёт кран»\nСтатус: <b>В работе</b>")
+
+    assert result["chat"]["id"] == 42
+    assert bot_api.messages == [
+        {"chat_id": 42, "text": "Заявка #1 «Течёт кран»\nСтатус: <b>В работе</b>", "parse_mode": "HTML"}
+    ]
+
+
+async def test_retry_after_pauses_and_retries(bot_api, sender):
+    bot_api.rate_limited = 1
+
+    started = time.monotonic()
+    await sender.send_message(42, "Статус: <b>Выполнена</b>")
+
+    assert bot_api.calls == 2
+    assert len(bot_api.messages) == 1
+    assert time.monotonic() - started >= bot_api.retry_after
+
+
+async def test_gives_up_after_retries(bot_api, sender):
+    bot_api.rate_limited = 10
+
+    with pytest.raises(TelegramError, match="Rate limited"):
+        await sender.send_message(42, "Статус: <b>Выполнена</b>", retries=2)
+    assert bot_api.calls == 2
+    assert bot_api.messages == []
+
+
+async def test_api_error_is_not_retried(bot_api, sender):
+    bot_api.error = (403, "Forbidden: bot was blocked by the user")
+
+    with pytest.raises(TelegramError, match="403"):
+        await sender.send_message(42, "Статус: <b>Выполнена</b>")
+    assert bot_api.calls == 1
+
+
+async def test_chat_rate_limit(bot_api):
+    sender = TelegramNotifier(TOKEN, bot_api.url, global_rate=100.0, chat_rate=10.0)
+    try:
+        started = time.monotonic()
+        await asyncio.gather(*(sender.send_message(chat_id, "a") for chat_id in (1, 2, 3)))
+        other_chats = time.monotonic() - started
+
+        started = time.monotonic()
+        await asyncio.gather(*(sender.send_message(7, "b") for _ in range(3)))
+        one_chat = time.monotonic() - started
+    finally:
+        await sender.close()
+
+    assert len(bot_api.messages) == 6
+    assert other_chats < 0.1
+    # Первое сообщение в чат сразу, следующие - по одному в 1/chat_rate секунды
+    assert one_chat >= 0.18
+
+
+async def run_worker_until(condition, timeout: float = 10.0):
+    worker = Worker(poll_interval=0.05)
+    running = asyncio.create_task(worker.run())
+    try:
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+    finally:
+        worker.stop()
+        await running
+
+
+async def test_status_change_notifies_resident(bot_api, client, tenant, monkeypatch):
+    """Смена статуса диспетчером -> задача в очереди -> сообщение жильцу через Bot API"""
+    monkeypatch.setattr(notifier, "api_url", bot_api.url)
+    monkeypatch.setattr(notifier, "token", TOKEN)
+
+    response = await client.post(
+        "/api/requests", json={"category": "plumbing", "title": "Течёт кран"}, headers=tenant.resident_headers
+    )
+    assert response.status_code == 201
+    request_id = response.json()["id"]
+
+    # Два перехода подряд, пока воркер не запущен: одна задача и одно сообщение с последним статусом
+    for new_status in (RequestStatus.ACCEPTED, RequestStatus.IN_PROGRESS):
+        response = await client.post(
+            f"/api/requests/{request_id}/status", json={"status": new_status.value}, headers=tenant.dispatcher_headers
+        )
+        assert response.status_code == 200
+
+    await run_worker_until(lambda: bot_api.messages)
+
+    assert len(bot_api.messages) == 1
+    message = bot_api.messages[0]
+    assert message["chat_id"] == tenant.resident.telegram_id
+    assert f"Заявка #{request_id} «Течёт кран»" in message["text"]
+    assert "<b>В работе</b>" in message["text"]
+
+
+async def test_resident_own_transition_is_not_notified(bot_api, client, tenant, monkeypatch):
+    monkeypatch.setattr(notifier, "api_url", bot_api.url)
+    monkeypatch.setattr(notifier, "token", TOKEN)
+
+    response = await client.post(
+        "/api/requests", json={"category": "plumbing", "title": "Не работает лифт"}, headers=tenant.resident_headers
+    )
+    request_id = response.json()["id"]
+    response = await client.post(
+        f"/api/requests/{request_id}/status", json={"status": RequestStatus.CANCELLED.value},
+        headers=tenant.resident_headers,
+    )
+    assert response.status_code == 200
+
+    await run_worker_until(lambda: bot_api.calls, timeout=1.0)
+
+    assert bot_api.calls == 0
+
+
+async def test_broadcast_chunk_retry_skips_delivered(bot_api, tenant, monkeypatch):
+    """Пачка рассылки упала посреди отправки: повтор задачи не шлёт сообщение уже получившим"""
+    monkeypatch.setattr(notifier, "api_url", bot_api.url)
+    monkeypatch.setattr(notifier, "token", TOKEN)
+    chat_ids = [900000 + i for i in range(SEND_PARALLELISM * 2 + 10)]
+    crash_at = SEND_PARALLELISM + 5
+    async with shards.session() as db:
+        broadcast = Broadcast(company_id=tenant.company.id, text="Отключение воды", status=BroadcastStatus.SENDING,
+                              total=len(chat_ids))
+        db.add(broadcast)
+        await db.commit()
+        broadcast_id = broadcast.id
+
+    send_message = notifier.send_message
+    calls = 0
+
+    async def crashing(chat_id, text, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == crash_at:
+            raise asyncio.CancelledError()  # воркер остановлен посреди пачки
+        return await send_message(chat_id, text, **kwargs)
+
+    monkeypatch.setattr(notifier, "send_message", crashing)
+    async with shards.session() as db:
+        with pytest.raises(asyncio.CancelledError):
+            await send_chunk(db, broadcast_id, chat_ids)
+    monkeypatch.setattr(notifier, "send_message", send_message)
+
+    async with shards.session() as db:
+        await send_chunk(db, broadcast_id, chat_ids)
+        broadcast = await db.get(Broadcast, broadcast_id)
+        assert (broadcast.sent, broadcast.failed, broadcast.status) == (len(chat_ids), 0, BroadcastStatus.DONE)
+
+    received = Counter(message["chat_id"] for message in bot_api.messages)
+    assert set(received) == set(chat_ids)
+    # Сохранённая до сбоя группа не повторяется; задвоиться могла только прерванная
+    assert all(received[chat_id] == 1 for chat_id in chat_ids[:SEND_PARALLELISM])
+    assert all(received[chat_id] == 1 for chat_id in chat_ids[SEND_PARALLELISM * 2:])
@@ -0,0 +1,101 @@
+"""
+Фоновое удаление УК (app/utils/tenant_purge.py): после задачи от УК ничего не
+остаётся ни в одном шарде, включая её размещение и заявки без company_id;
+упавшее удаление можно поставить снова.
+"""
+import asyncio
+
+from sqlalchemy import select, func, text
+
+from app.database import DEFAULT_SHARD, shards
+from app.models import Company, House, User, UserRole, Request, RequestCategory, RequestStatus, ArchivedRequest, Job, JobStatus
+from app.utils.auth import create_access_token, token_claims
+from app.utils.tenant_purge import PURGE_TASK
+from app.worker.runner import Worker
+
+
+async def _run_purge(shard: str, job_id: int, timeout: float = 10.0):
+    worker = Worker(poll_interval=0.05, shard=shard)
+    running = asyncio.create_task(worker.run())
+    try:
+        for _ in range(int(timeout / 0.05)):
+            async with shards.session(shard) as db:
+                if (await db.get(Job, job_id)).status in (JobStatus.DONE, JobStatus.FAILED):
+                    break
+            await asyncio.sleep(0.05)
+    finally:
+        worker.stop()
+        await running
+
+
+async def test_purge_leaves_nothing_on_any_shard(client, second_shard, super_admin_headers):
+    response = await client.post(
+        "/api/superadmin/companies", json={"name": "УК Удаляемая", "shard": second_shard}, headers=super_admin_headers
+    )
+    company_id = response.json()["id"]
+    response = await client.post(
+        "/api/superadmin/houses", json={"company_id": company_id, "address": "ул. Сносная, д. 1"},
+        headers=super_admin_headers,
+    )
+    house_id = response.json()["id"]
+
+    async with shards.session(second_shard) as db:
+        telegram_id = (await db.execute(select(func.coalesce(func.max(User.telegram_id), 0)))).scalar() + 10**9
+        resident = User(telegram_id=telegram_id, first_name="Жилец", role=UserRole.RESIDENT, house_id=house_id)
+        db.add(resident)
+        await db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(await token_claims(db, resident))}"}
+
+    response = await client.post("/api/requests", json={"category": "plumbing", "title": "Течёт"}, headers=headers)
+    assert response.status_code == 201
+    async with shards.session(second_shard) as db:
+        # Заявка без УК: например, создана до появления requests.company_id
+        db.add(Request(user_id=resident.id, company_id=None, category=RequestCategory.OTHER, title="Старая"))
+        db.add(ArchivedRequest(id=10**6, user_id=resident.id, company_id=company_id,
+                               category=RequestCategory.OTHER, title="Архив", status=RequestStatus.COMPLETED))
+        await db.commit()
+
+    response = await client.post(f"/api/superadmin/companies/{company_id}/purge", headers=super_admin_headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "pending"
+    await _run_purge(second_shard, response.json()["job_id"])
+
+    for shard in shards.names:
+        async with shards.session(shard) as db:
+            assert await db.get(Company, company_id) is None, shard
+            placements = (await db.execute(
+                text("SELECT count(*) FROM company_shards WHERE company_id = :id"), {"id": company_id}
+            )).scalar()
+            assert placements == 0, shard
+            assert (await db.execute(select(House.id).where(House.company_id == company_id))).first() is None
+            for model in (Request, ArchivedRequest):
+                assert (await db.execute(select(model.id).where(model.company_id == company_id))).first() is None
+    async with shards.session(second_shard) as db:
+        for model in (Request, ArchivedRequest):
+            assert (await db.execute(select(model.id).where(model.user_id == resident.id))).first() is None
+        assert (await db.get(User, resident.id)).house_id is None
+    assert shards.shard_for_company(company_id) == DEFAULT_SHARD
+
+
+async def test_failed_purge_can_be_queued_again(client, tenant, super_admin_headers):
+    url = f"/api/superadmin/companies/{tenant.company.id}/purge"
+    first = (await client.post(url, headers=super_admin_headers)).json()
+    # Повтор, пока задача ждёт, - та же задача
+    assert (await client.post(url, headers=super_admin_headers)).json() == first
+
+    async with shards.session() as db:
+        job = await db.get(Job, first["job_id"])
+        job.status = JobStatus.FAILED
+        await db.commit()
+
+    second = (await client.post(url, headers=super_admin_headers)).json()
+    assert second["status"] == "pending"
+    assert second["job_id"] != first["job_id"]
+    async with shards.session() as db:
+        jobs = (await db.execute(
+            select(Job.status).where(Job.type == PURGE_TASK, Job.payload["company_id"].as_integer() == tenant.company.id)
+        )).scalars().all()
+        assert sorted(jobs) == sorted([JobStatus.FAILED, JobStatus.PENDING])
+        # Не оставляем задачу воркерам других тестов
+        (await db.get(Job, second["job_id"])).status = JobStatus.DONE
+        await db.commit()
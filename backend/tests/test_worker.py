@@ -0,0 +1,34 @@
+"""
+Возврат брошенных задач (Worker._recover_stale): задача, на которой воркер
+упал, не перезапускается бесконечно - после max_attempts она уходит в failed.
+"""
+from app.database import shards
+from app.models.job import Job, JobStatus
+from app.worker.runner import STALE_AFTER, Worker, utcnow
+
+
+async def test_recover_stale_respects_max_attempts():
+    abandoned = utcnow() - STALE_AFTER * 2
+    async with shards.session() as db:
+        exhausted = Job(type="stale_test", payload={}, status=JobStatus.RUNNING, attempts=3, max_attempts=3,
+                        locked_by="упавший воркер", locked_at=abandoned)
+        retry = Job(type="stale_test", payload={}, status=JobStatus.RUNNING, attempts=1, max_attempts=3,
+                    locked_by="упавший воркер", locked_at=abandoned)
+        alive = Job(type="stale_test", payload={}, status=JobStatus.RUNNING, attempts=3, max_attempts=3,
+                    locked_by="живой воркер", locked_at=utcnow())
+        db.add_all([exhausted, retry, alive])
+        await db.commit()
+        ids = exhausted.id, retry.id, alive.id
+
+    await Worker(poll_interval=0.05)._recover_stale()
+
+    async with shards.session() as db:
+        exhausted, retry, alive = [await db.get(Job, job_id) for job_id in ids]
+        assert exhausted.status == JobStatus.FAILED
+        assert exhausted.locked_by is None and exhausted.last_error
+        assert retry.status == JobStatus.PENDING
+        assert retry.locked_by is None
+        assert alive.status == JobStatus.RUNNING
+        for job in (exhausted, retry, alive):
+            await db.delete(job)
+        await db.commit()
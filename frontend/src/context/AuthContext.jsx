@@ -76,6 +76,12 @@ export function AuthProvider({ children }) {
     const updateProfile = async (data) => {
         try {
             const response = await api.patch('/auth/me', data)
+            // Дом другой УК: сервер выдаёт новый токен
+            const token = response.headers['x-access-token']
+            if (token) {
+                localStorage.setItem('token', token)
+                api.defaults.headers.common['Authorization'] = `Bearer ${token}`
+            }
             setUser(response.data)
             return response.data
         } catch (err) {
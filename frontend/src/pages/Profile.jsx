@@ -76,6 +76,7 @@ export default function Profile() {
         try {
             await updateProfile({
                 house_id: selectedHouse ? parseInt(selectedHouse) : null,
+                house_company_id: selectedHouse && selectedCompany ? parseInt(selectedCompany) : null,
                 apartment: apartment.trim() || null,
                 phone: phone.trim() || null
             })